@@ -0,0 +1,460 @@
+"""
+KANA — бинарный пакет анимаций: все BVH разбираются один раз, вращения суставов переводятся
+в кватернионы и квантуются в int16, клипы лежат в одном файле с индексом.
+
+Формат: MAGIC, версия и длина индекса (BUNDLE_HEADER), JSON-индекс, затем с границы 8 байт — данные
+клипов (смещения в индексе — от начала данных, выровнены по 8 байт). Клип — подряд идущие дорожки
+`keys × 4` int16 (x, y, z, w · 32767); неизменные дорожки хранятся одним ключом. Каналы позиции не пишутся
+ни у одного сустава: аватар играет только вращения (запасной разбор BVH на фронтенде отбрасывает их так же).
+
+Пакет кэшируется на диске (KANA_ANIMATION_BUNDLE) и пересобирается, когда набор BVH или их mtime/размер
+меняются; разбираются только изменённые файлы.
+
+    python animations.py [--dir DIR] [--out PATH]   # собрать заранее
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ANIMATION_DIR = os.getenv("KANA_ANIMATION_DIR", os.path.join(os.path.dirname(BACKEND_DIR), "animation"))
+BUNDLE_PATH = os.getenv("KANA_ANIMATION_BUNDLE", os.path.join(BACKEND_DIR, ".cache", "animations.kanim"))
+CHECK_INTERVAL_SEC = float(os.getenv("KANA_ANIMATION_CHECK_SEC", "5"))
+
+MAGIC = b"KANAANIM"
+VERSION = 1
+BUNDLE_HEADER = struct.Struct("<8sII")  # magic, версия, длина JSON-индекса
+QUANT = 32767
+ALIGN = 8
+
+# Имена суставов BVH, отличающиеся от костей VRM (в комплекте совпадают; остальные — как есть)
+BONE_MAP = {"Hips": "hips"}
+
+
+def _qmul(a, b):
+    """Hamilton product of (N, 4) xyzw quaternion arrays (three.js multiplyQuaternions)."""
+    ax, ay, az, aw = a.T
+    bx, by, bz, bw = b.T
+    return np.stack((
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+        aw * bw - ax * bx - ay * by - az * bz,
+    ), axis=1)
+
+
+def euler_to_quat(angles_deg, axes):
+    """Rotation channels in file order -> (N, 4) quaternions, composed like three.js BVHLoader."""
+    q = np.zeros((angles_deg.shape[0], 4))
+    q[:, 3] = 1.0
+    for column, axis in zip(angles_deg.T, axes):
+        half = np.radians(column) / 2.0
+        r = np.zeros_like(q)
+        r[:, "XYZ".index(axis)] = np.sin(half)
+        r[:, 3] = np.cos(half)
+        q = _qmul(q, r)
+    # Соседние ключи в одной полусфере: q и -q — одно вращение, а квантование и сжатие выигрывают
+    flips = np.einsum("ij,ij->i", q[1:], q[:-1]) < 0
+    signs = np.concatenate(([1.0], np.cumprod(np.where(flips, -1.0, 1.0))))
+    return q * signs[:, None]
+
+
+def _parse_hierarchy(lines):
+    joints = []
+    for line in lines:
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] in ("ROOT", "JOINT") and len(parts) > 1:
+            joints.append((parts[1], []))
+        elif parts[0] == "CHANNELS" and joints:
+            joints[-1][1].extend(parts[2:2 + int(parts[1])])
+    return joints
+
+
+def _parse_timing(lines):
+    frame_count, frame_time = 0, 1 / 30
+    for line in lines:
+        key, _, value = line.partition(":")
+        if key.strip() == "Frames":
+            frame_count = int(value)
+        elif key.strip() == "Frame Time":
+            frame_time = float(value)
+    return frame_count, frame_time
+
+
+def read_header(path):
+    """Return (joints, frame_count, frame_time) without reading the motion data."""
+    head = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip() == "MOTION":
+                timing = [next(f, ""), next(f, "")]
+                return _parse_hierarchy(head), *_parse_timing(timing)
+            head.append(line)
+    raise ValueError(f"{path}: no MOTION section")
+
+
+def parse_bvh(path):
+    """Return (joints, frame_time, frames) where joints is [(name, channels)] and frames is (N, channels)."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    head, sep, motion = text.partition("MOTION")
+    if not sep:
+        raise ValueError(f"{path}: no MOTION section")
+    joints = _parse_hierarchy(head.splitlines())
+    lines = motion.lstrip().split("\n", 2)
+    frame_count, frame_time = _parse_timing(lines[:2])
+    body = lines[2] if len(lines) > 2 else ""
+    width = sum(len(ch) for _, ch in joints)
+    values = np.array(body.split(), dtype=np.float64)
+    frame_count = min(frame_count, values.size // width) if width else 0
+    return joints, frame_time, values[:frame_count * width].reshape(frame_count, width)
+
+
+def compile_clip(path):
+    """Parse one BVH file into (meta, payload bytes) of retargeted, quantized rotation tracks ([bone, keys]).
+
+    Position channels are dropped for every joint, not only the root; the BVH fallback in AvatarViewer does the same."""
+    joints, frame_time, frames = parse_bvh(path)
+    tracks, chunks = [], []
+    column = 0
+    for name, channels in joints:
+        cols = range(column, column + len(channels))
+        column += len(channels)
+        rot = [(c, ch[0]) for c, ch in zip(cols, channels) if ch.endswith("rotation")]
+        if not rot or not len(frames):
+            continue
+        q = euler_to_quat(frames[:, [c for c, _ in rot]], [axis for _, axis in rot])
+        qi = np.round(q * QUANT).astype("<i2")
+        if (qi == qi[0]).all():
+            qi = qi[:1]
+        tracks.append([BONE_MAP.get(name, name), int(qi.shape[0])])
+        chunks.append(qi.tobytes())
+    count = int(frames.shape[0])
+    meta = {
+        "frames": count,
+        "frame_time": frame_time,
+        "duration": round(max(count - 1, 0) * frame_time, 6),
+        "tracks": tracks,
+    }
+    return meta, b"".join(chunks)
+
+
+def scan(directory):
+    """{file name: (mtime_ns, size)} of the BVH files in a directory."""
+    found = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(".bvh") and entry.is_file():
+                st = entry.stat()
+                found[entry.name] = (st.st_mtime_ns, st.st_size)
+    return found
+
+
+def source_digest(files):
+    return hashlib.sha1(json.dumps(sorted(files.items())).encode()).hexdigest()[:20]
+
+
+def build(directory=ANIMATION_DIR, files=None, compiled=None):
+    """Compile every *.bvh in the directory into bundle bytes.
+
+    `compiled` ({file: (stat key, meta, data)}) is reused for unchanged files and updated in place,
+    so a rebuild after editing one animation only parses that file.
+    """
+    files = scan(directory) if files is None else files
+    compiled = {} if compiled is None else compiled
+    for file in set(compiled) - set(files):
+        del compiled[file]
+    index = {"version": VERSION, "quant": QUANT, "source": source_digest(files), "bones": [], "clips": {}}
+    payloads = []
+    offset = 0
+    for file in sorted(files):
+        cached = compiled.get(file)
+        if cached is None or cached[0] != files[file]:
+            try:
+                meta, data = compile_clip(os.path.join(directory, file))
+            except (OSError, ValueError) as e:
+                print(f"[KANA] Skipping animation {file}: {e}")
+                continue
+            cached = compiled[file] = (files[file], meta, data)
+        _, meta, data = cached
+        if meta["tracks"]:
+            # В индексе кости — номера в общей таблице пакета
+            for bone, _ in meta["tracks"]:
+                if bone not in index["bones"]:
+                    index["bones"].append(bone)
+            meta = dict(meta, offset=offset, length=len(data),
+                        tracks=[[index["bones"].index(bone), keys] for bone, keys in meta["tracks"]])
+            index["clips"][os.path.splitext(file)[0]] = meta
+            payloads.append(_pad(data))
+            offset += len(payloads[-1])
+
+    raw = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    return _pad(BUNDLE_HEADER.pack(MAGIC, VERSION, len(raw)) + raw) + b"".join(payloads)
+
+
+def _pad(data):
+    return data + b"\0" * (-len(data) % ALIGN)
+
+
+def read_index(data):
+    """Parse the bundle header; the index gains `data_offset`, the absolute start of clip data."""
+    magic, version, length = BUNDLE_HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a KANA animation bundle of this version")
+    index = json.loads(bytes(data[BUNDLE_HEADER.size:BUNDLE_HEADER.size + length]))
+    index["data_offset"] = BUNDLE_HEADER.size + length + (-(BUNDLE_HEADER.size + length) % ALIGN)
+    return index
+
+
+class AnimationBundle:
+    """Disk-cached bundle with lazily built gzip variants; safe to call from worker threads."""
+
+    def __init__(self, directory=ANIMATION_DIR, path=BUNDLE_PATH):
+        self.directory = directory
+        self.path = path
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._compiled = {}
+        self.data = None
+        self.index = None
+        self.etag = None
+        self.build_ms = None
+        self.builds = 0
+        self._clips = {}
+        self._gzip = {}
+
+    def get(self):
+        """Return self with fresh data, rebuilding if any BVH was added, changed or removed."""
+        with self._lock:
+            now = time.monotonic()
+            if self.data is not None and now - self._checked < CHECK_INTERVAL_SEC:
+                return self
+            self._checked = now
+            try:
+                files = scan(self.directory)
+            except OSError:
+                files = {}
+            if self.index is None or self.index.get("source") != source_digest(files):
+                self._load(files)
+            return self
+
+    def _load(self, files):
+        data = None
+        if self.data is None:
+            # Пакет с диска годится, если собран из тех же файлов
+            try:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+                if read_index(data).get("source") != source_digest(files):
+                    data = None
+            except (OSError, ValueError):
+                data = None
+        if data is None:
+            t0 = time.perf_counter()
+            data = build(self.directory, files, self._compiled)
+            self.build_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+            self.builds += 1
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"[KANA] Could not cache animation bundle: {e}")
+            print(f"[KANA] Animation bundle built: {len(data) / 1024:.0f} KiB in {self.build_ms} ms")
+        self.data = data
+        self.index = read_index(data)
+        self.etag = '"' + hashlib.sha1(data).hexdigest()[:20] + '"'
+        view, base = memoryview(data), self.index["data_offset"]
+        self._clips = {
+            name: view[base + m["offset"]:base + m["offset"] + m["length"]] for name, m in self.index["clips"].items()
+        }
+        self._gzip = {}
+
+    def clip(self, name):
+        """Zero-copy view of one clip's track data, or None."""
+        return self._clips.get(name)
+
+    def compressed(self, name=None):
+        """gzip of the whole bundle (name=None) or of one clip, computed once per build."""
+        with self._lock:
+            cached = self._gzip.get(name)
+            if cached is None:
+                raw = self.data if name is None else self._clips[name]
+                cached = self._gzip[name] = gzip.compress(raw, compresslevel=6, mtime=0)
+            return cached
+
+    def stats(self):
+        return {
+            "clips": len(self.index["clips"]) if self.index else 0,
+            "bytes": len(self.data) if self.data else 0,
+            "build_ms": self.build_ms,
+            "builds": self.builds,
+            "etag": self.etag,
+        }
+
+
+# Категории по префиксу имени файла; остальное — эмоции (метки GoEmotions) или other
+PREFIX_CATEGORIES = ("action", "dance", "exercise", "hitarea", "kneel", "laying", "reaction", "sit")
+EMOTIONS = (
+    "admiration", "amusement", "anger", "annoyance", "approval", "caring", "confusion", "curiosity",
+    "desire", "disappointment", "disapproval", "disgust", "embarrassment", "excitement", "fear",
+    "gratitude", "grief", "joy", "love", "nervousness", "optimism", "pride", "realization", "relief",
+    "remorse", "sadness", "surprise", "neutral",
+)
+# Опечатки в именах файлов комплекта
+NAME_FIXES = {"nervousnes": "nervousness", "disaproval": "disapproval"}
+
+
+def classify(name):
+    """Clip name -> (category, group, emotion or None, numeric suffix or None)."""
+    stem = name.rstrip("0123456789")
+    suffix = int(name[len(stem):]) if len(stem) < len(name) else None
+    group = NAME_FIXES.get(stem.rstrip("_"), stem.rstrip("_")) or name
+    prefix = group.split("_", 1)[0]
+    if "_" in stem and prefix in PREFIX_CATEGORIES:
+        return prefix, group, None, suffix
+    if prefix in EMOTIONS:
+        return "emotion", group, prefix, suffix
+    return "other", group, None, suffix
+
+
+class AnimationCatalog:
+    """Metadata of every clip from BVH headers only, rescanned incrementally by mtime and size.
+
+    The JSON body and its gzip are rendered once per change; `get()` is cheap to call per request.
+    """
+
+    def __init__(self, directory=ANIMATION_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._headers = {}  # file -> (stat key, header entry)
+        self.body = None
+        self.gzip_body = None
+        self.etag = None
+        self.scans = 0
+        self.parsed = 0
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.body is not None and now - self._checked < CHECK_INTERVAL_SEC:
+                return self
+            self._checked = now
+            try:
+                files = scan(self.directory)
+            except OSError:
+                files = {}
+            self.scans += 1
+            changed = self.body is None or set(files) != set(self._headers)
+            for file in set(self._headers) - set(files):
+                del self._headers[file]
+            for file, key in files.items():
+                cached = self._headers.get(file)
+                if cached and cached[0] == key:
+                    continue
+                try:
+                    joints, frames, frame_time = read_header(os.path.join(self.directory, file))
+                except (OSError, ValueError) as e:
+                    print(f"[KANA] Skipping animation {file}: {e}")
+                    self._headers.pop(file, None)
+                    continue
+                bones = [BONE_MAP.get(n, n) for n, ch in joints if any(c.endswith("rotation") for c in ch)]
+                self._headers[file] = (key, {"frames": frames, "frame_time": frame_time, "bones": bones})
+                self.parsed += 1
+                changed = True
+            if changed:
+                self._render()
+            return self
+
+    def _render(self):
+        clips = []
+        for file in sorted(self._headers):
+            name = os.path.splitext(file)[0]
+            header = self._headers[file][1]
+            category, group, emotion, suffix = classify(name)
+            clips.append(dict(
+                name=name,
+                category=category,
+                group=group,
+                emotion=emotion,
+                suffix=suffix,
+                frames=header["frames"],
+                frame_time=header["frame_time"],
+                duration=round(max(header["frames"] - 1, 0) * header["frame_time"], 6),
+                bones=header["bones"],
+            ))
+        # Варианты внутри группы: без номера — первый, дальше по возрастанию номера (joy, joy2, joy3)
+        groups, categories = {}, {}
+        for clip in sorted(clips, key=lambda c: (c["group"], c["suffix"] or 0, c["name"])):
+            groups.setdefault(clip["group"], []).append(clip["name"])
+            clip["variant"] = len(groups[clip["group"]])
+            categories.setdefault(clip["category"], []).append(clip["name"])
+        for clip in clips:
+            del clip["suffix"]
+        catalog = {"clips": clips, "groups": groups, "categories": categories}
+        self.body = json.dumps(catalog, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=6, mtime=0)
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+
+    def stats(self):
+        return {
+            "clips": len(self._headers),
+            "bytes": len(self.body) if self.body else 0,
+            "scans": self.scans,
+            "parsed_headers": self.parsed,
+            "etag": self.etag,
+        }
+
+
+def parse_range(header, size):
+    """Single `bytes=` range -> (start, end_exclusive); None to serve everything; ValueError if unsatisfiable."""
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise ValueError(header)
+            return max(size - length, 0), size
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        raise ValueError(header)
+    if start >= size or end <= start:
+        raise ValueError(header)
+    return start, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the KANA animation bundle from BVH files")
+    parser.add_argument("--dir", default=ANIMATION_DIR)
+    parser.add_argument("--out", default=BUNDLE_PATH)
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    data = build(args.dir)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "wb") as f:
+        f.write(data)
+    index = read_index(data)
+    sources = sum(os.path.getsize(os.path.join(args.dir, n)) for n in os.listdir(args.dir) if n.lower().endswith(".bvh"))
+    print(f"{args.out}: {len(index['clips'])} clips, {len(data) / 1024:.0f} KiB"
+          f" (BVH {sources / 2**20:.1f} MiB, gzip {len(gzip.compress(data)) / 1024:.0f} KiB)"
+          f" in {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
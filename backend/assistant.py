@@ -4,14 +4,23 @@ KANA MVP — минимальный ассистент: Gemini Live API, гол
 import asyncio
 import os
 import sys
+import threading
 import time
 import struct
 import math
 
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-import pyaudio
+
+import audio_io
+from cues import CUES_ENABLED, CueEngine
+from denoise import NoiseSuppressor
+from devices import DeviceRegistry
+from lipsync import LIPSYNC_ENABLED, LipSync
+import live
+import metrics
+from metrics import TurnTimer
+import recorder
+from vad import VAD_ENABLED, SPEECH_START, SPEECH_END, VoiceActivityGate
 
 if sys.version_info < (3, 11, 0):
     import taskgroup
@@ -19,50 +28,109 @@ if sys.version_info < (3, 11, 0):
     asyncio.TaskGroup = taskgroup.TaskGroup
     asyncio.ExceptionGroup = exceptiongroup.ExceptionGroup
 
-# Load .env from backend/, then KANA/, then current dir
+# Load .env from backend/, then KANA/, then current dir (each file once)
 _backend_dir = os.path.dirname(os.path.abspath(__file__))
-_load_env_backend = os.path.join(_backend_dir, ".env")
-_load_env_root = os.path.join(_backend_dir, "..", ".env")
-if os.path.isfile(_load_env_backend):
-    load_dotenv(_load_env_backend)
-if os.path.isfile(_load_env_root):
-    load_dotenv(_load_env_root)
-load_dotenv()
-client = genai.Client(http_options={"api_version": "v1beta"}, api_key=os.getenv("GEMINI_API_KEY"))
-
-FORMAT = pyaudio.paInt16
+_env_loaded = set()
+for _env_path in (os.path.join(_backend_dir, ".env"), os.path.join(_backend_dir, "..", ".env"), os.path.join(os.getcwd(), ".env")):
+    _env_path = os.path.realpath(_env_path)
+    if _env_path not in _env_loaded and os.path.isfile(_env_path):
+        load_dotenv(_env_path)
+        _env_loaded.add(_env_path)
+
+FORMAT = audio_io.PA_INT16
 CHANNELS = 1
 SEND_SAMPLE_RATE = 16000
 RECEIVE_SAMPLE_RATE = 24000
 CHUNK_SIZE = 1024
 MODEL = "models/gemini-2.5-flash-native-audio-preview-12-2025"
+# Нативно-аудио модель текстом не отвечает — текстовым сессиям нужна своя Live-модель
+TEXT_MODEL = os.getenv("KANA_TEXT_MODEL", "models/gemini-live-2.5-flash-preview")
+CONTEXT_TURNS = int(os.getenv("KANA_CONTEXT_TURNS", "40"))  # реплик истории при переходе с текста на голос
 CONNECT_TIMEOUT_SEC = 30
+PLAYBACK_QUEUE_MAX = int(os.getenv("KANA_PLAYBACK_QUEUE_MAX", "256"))  # чанков ответа в очереди воспроизведения
 
-pya = pyaudio.PyAudio()
-
-config = types.LiveConnectConfig(
-    response_modalities=["AUDIO"],
-    output_audio_transcription={},
-    input_audio_transcription={},
-    system_instruction=(
-        "Отвечай по-русски. "
-        "Тебя зовут KANA, ты умный ассистент программиста, говоря о себе используй женскийц род. "
-        "У тебя остроумный и обаятельный характер. "
-        "Твой создатель — Serjok, и ты обращаешься к нему как ты. "
-        "Отвечая, используй полные и лаконичные предложения "
-        "У тебя весёлый характер."
-    ),
-    speech_config=types.SpeechConfig(
-        voice_config=types.VoiceConfig(
-            prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="Kore")
-        ),
-        language_code="ru-RU",
-    ),
+# Тяжёлое (google-genai) создаётся при первом обращении, один раз на процесс; хост PyAudio — в audio_io
+_init_lock = threading.Lock()
+_client = None
+_config = None
+_text_config = None
+
+
+def get_client():
+    """Shared genai.Client; None for the fake Live backend when no key is set."""
+    global _client
+    if _client is None and (live.needs_api_key() or os.getenv("GEMINI_API_KEY")):
+        with _init_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(http_options={"api_version": "v1beta"}, api_key=os.getenv("GEMINI_API_KEY"))
+    return _client
+
+
+devices = DeviceRegistry(audio_io.pyaudio_host, rehost=audio_io.rehost, executor=audio_io.EXECUTOR)
+
+
+SYSTEM_INSTRUCTION = (
+    "Отвечай по-русски. "
+    "Тебя зовут KANA, ты умный ассистент программиста, говоря о себе используй женскийц род. "
+    "У тебя остроумный и обаятельный характер. "
+    "Твой создатель — Serjok, и ты обращаешься к нему как ты. "
+    "Отвечая, используй полные и лаконичные предложения "
+    "У тебя весёлый характер."
 )
 
 
+def get_config():
+    global _config
+    if _config is None:
+        with _init_lock:
+            if _config is None:
+                _config = _build_config()
+    return _config
+
+
+def get_text_config():
+    """LiveConnectConfig of text-only sessions: TEXT modality, no speech synthesis or transcription."""
+    global _text_config
+    if _text_config is None:
+        with _init_lock:
+            if _text_config is None:
+                from google.genai import types
+                _text_config = types.LiveConnectConfig(
+                    response_modalities=["TEXT"],
+                    system_instruction=SYSTEM_INSTRUCTION,
+                    session_resumption=types.SessionResumptionConfig(),
+                )
+    return _text_config
+
+
+def _build_config():
+    from google.genai import types
+    return types.LiveConnectConfig(
+        response_modalities=["AUDIO"],
+        output_audio_transcription={},
+        input_audio_transcription={},
+        system_instruction=SYSTEM_INSTRUCTION,
+        speech_config=types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="Kore")
+            ),
+            language_code="ru-RU",
+        ),
+        session_resumption=types.SessionResumptionConfig(),
+    )
+
+
+class _Stopped(Exception):
+    """Raised inside the TaskGroup to cancel the session tasks on stop()."""
+
+
 class AssistantLoop:
-    """Один цикл: микрофон -> Gemini -> ответ (аудио + транскрипция). Без инструментов."""
+    """Один цикл: микрофон -> Gemini -> ответ (аудио + транскрипция). Без инструментов.
+
+    text_only=True — текстовый чат: ни микрофона, ни динамика, ответ — поток текстовых дельт.
+    context — реплики истории, которыми засевается новая сессия (переход с текста на голос).
+    """
 
     def __init__(
         self,
@@ -71,95 +139,263 @@ class AssistantLoop:
         on_error=None,
         on_ready=None,
         on_stopped=None,
+        on_interrupted=None,
+        on_cue=None,
+        on_lipsync=None,
         input_device_index=None,
         input_device_name=None,
         output_device_index=None,
         output_device_name=None,
+        vad=VAD_ENABLED,
+        vad_barge_in=False,
+        noise_suppression=False,
+        session_pool=None,
+        name="default",
+        audio_input=None,
+        audio_output=None,
+        record=recorder.RECORD_ALL,
+        cues=CUES_ENABLED,
+        lipsync=LIPSYNC_ENABLED,
+        transcript=None,
+        text_only=False,
+        context=None,
     ):
         self.on_audio_data = on_audio_data
         self.on_transcription = on_transcription
         self.on_error = on_error
         self.on_ready = on_ready
         self.on_stopped = on_stopped
+        self.on_interrupted = on_interrupted
+        self.on_cue = on_cue
+        self.on_lipsync = on_lipsync
         self.input_device_index = input_device_index
         self.input_device_name = input_device_name
         self.output_device_index = output_device_index
         self.output_device_name = output_device_name
+        self.audio_input = audio_input or audio_io.INPUT
+        self.audio_output = audio_output or audio_io.OUTPUT
+        audio_io.parse_spec(self.audio_input)
+        audio_io.parse_spec(self.audio_output)
+        self.text_only = text_only
+        self.context = context or []
+        self.vad = VoiceActivityGate(SEND_SAMPLE_RATE, CHUNK_SIZE) if vad and not text_only else None
+        self.vad_barge_in = vad_barge_in
+        self.denoiser = NoiseSuppressor(CHUNK_SIZE) if noise_suppression and not text_only else None
+        self.session_pool = session_pool
+        self.name = name
+        self.turns = TurnTimer(name)
+        self.record = record
+        self.recorder = None
+        self.cues = CueEngine(self._cue) if cues and on_cue else None
+        self.lipsync = LipSync(RECEIVE_SAMPLE_RATE) if lipsync and on_lipsync and not text_only else None
+        # TranscriptStore: дельты уходят клиентам пачками через него, а не по одной
+        self.transcript = transcript
+        self.resume_handle = None
 
         self.audio_in_queue = None
         self.out_queue = None
         self.paused = False
         self.session = None
         self.stop_event = asyncio.Event()
+        self.connected = asyncio.Event()
         self.audio_stream = None
+        self.capture = None
+        self.playback = None
+
+        # Каждый чанк ответа помечен номером хода; чанки ходов < _min_playable_turn не играются
+        self.turn_id = 0
+        self._min_playable_turn = 0
+        self.interruptions = 0
+        self.playback_overflow = 0  # чанков ответа выброшено: воспроизведение не успевало
 
         self._last_input_transcription = ""
         self._last_output_transcription = ""
 
     def set_paused(self, paused):
         self.paused = paused
+        if self.capture:
+            self.capture.set_paused(paused)
+        if paused and self.vad and self.vad.speaking:
+            self.vad.reset()
+            self._queue_upstream({"audio_stream_end": True})
 
     def stop(self):
         self.stop_event.set()
 
+    def interrupt(self, reason="server"):
+        """Barge-in: drop queued and buffered reply audio of the current turn and notify clients."""
+        self._min_playable_turn = self.turn_id + 1
+        self.interruptions += 1
+        if self.recorder:
+            self.recorder.event("interrupted", reason=reason, turn=self.turn_id)
+        dropped = 0
+        if self.audio_in_queue:
+            while not self.audio_in_queue.empty():
+                self.audio_in_queue.get_nowait()
+                dropped += 1
+        dropped_bytes = self.playback.flush() if self.playback else 0
+        if self.lipsync:
+            self.lipsync.flush()
+        if self.on_interrupted:
+            self.on_interrupted({
+                "turn": self.turn_id,
+                "reason": reason,
+                "dropped_chunks": dropped,
+                "dropped_ms": round(dropped_bytes / (RECEIVE_SAMPLE_RATE * 2 / 1000)),
+            })
+
+    def _transcription(self, sender, delta):
+        if self.transcript:
+            self.transcript.delta(sender, delta, self.turn_id)
+        elif self.on_transcription:
+            self.on_transcription({"sender": sender, "text": delta})
+
+    def _cue(self, cue):
+        if self.recorder:
+            self.recorder.event("animation_cue", **cue)
+        self.on_cue(cue)
+
+    def stats(self):
+        return {
+            "mode": "text" if self.text_only else "voice",
+            "turn": self.turn_id,
+            "resumable": self.resume_handle is not None,
+            "last_turn": self.turns.snapshot(),
+            "queues": {
+                "out": self.out_queue.qsize() if self.out_queue else 0,
+                "audio_in": self.audio_in_queue.qsize() if self.audio_in_queue else 0,
+                "audio_in_overflow": self.playback_overflow,
+            },
+            "interruptions": self.interruptions,
+            "capture": self.capture.stats() if self.capture else None,
+            "playback": self.playback.stats() if self.playback else None,
+            "vad": self.vad.stats() if self.vad else None,
+            "denoise": self.denoiser.stats() if self.denoiser else None,
+            "recording": self.recorder.stats() if self.recorder else None,
+            "cues": self.cues.stats() if self.cues else None,
+            "lipsync": self.lipsync.stats() if self.lipsync else None,
+            "transcript": self.transcript.stats() if self.transcript else None,
+        }
+
+    async def send_text(self, text):
+        """Typed user input: starts a turn (for latency metrics and the recording) and sends it.
+
+        Waits for the connection when the session is still connecting (the first message of a
+        text session starts it)."""
+        if self.session is None:
+            try:
+                await asyncio.wait_for(self.connected.wait(), timeout=CONNECT_TIMEOUT_SEC)
+            except asyncio.TimeoutError:
+                # str(TimeoutError()) пуст — клиенту нужен понятный текст
+                raise asyncio.TimeoutError(f"KANA is not connected (no session after {CONNECT_TIMEOUT_SEC:.0f} s), message not sent") from None
+        self.turns.user_speech()
+        if self.recorder:
+            self.recorder.event("user_input", text=text)
+        if self.cues:
+            self.cues.feed("User", text, self.turn_id, final=True)
+        if self.transcript:
+            self.transcript.record("User", text, self.turn_id)
+        await self.session.send(input=text, end_of_turn=True)
+
     async def send_realtime(self):
         try:
             while True:
                 msg = await self.out_queue.get()
                 if self.session:
                     try:
+                        if msg.get("audio_stream_end"):
+                            # Речь закончилась и поток глушится VAD — просим сервер сбросить буфер
+                            if hasattr(self.session, "send_realtime_input"):
+                                await self.session.send_realtime_input(audio_stream_end=True)
+                            continue
                         await self.session.send(input=msg, end_of_turn=False)
                     except Exception as e:
                         print(f"[KANA] send_realtime error: {e}")
         except asyncio.CancelledError:
             raise
 
+    def _queue_upstream(self, msg):
+        if not self.out_queue:
+            return
+        try:
+            self.out_queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            try:
+                self.out_queue.get_nowait()
+                self.out_queue.put_nowait(msg)
+            except Exception:
+                pass
+
+    def _queue_playback(self, data):
+        """Enqueue a reply chunk without waiting: receive_audio must keep reading (interrupted, transcripts).
+
+        When playback falls behind and the queue is full, the oldest queued chunks are dropped so the
+        newest audio of the current turn still gets in."""
+        item = (self.turn_id, data)
+        while True:
+            try:
+                self.audio_in_queue.put_nowait(item)
+                return
+            except asyncio.QueueFull:
+                self.audio_in_queue.get_nowait()
+                self.playback_overflow += 1
+
+    def _reply_playing(self):
+        if self.audio_in_queue and not self.audio_in_queue.empty():
+            return True
+        return bool(self.playback and self.playback.depth_ms() > 0)
+
+    def push_audio(self, data):
+        """Mic PCM from the browser (audio_input=browser); ignored for other sources."""
+        if self.capture and hasattr(self.capture, "push"):
+            self.capture.push(data)
+
     async def listen_audio(self):
-        mic_info = pya.get_default_input_device_info()
-        resolved = self.input_device_index if self.input_device_index is not None else mic_info["index"]
-        if self.input_device_name:
-            for i in range(pya.get_device_count()):
-                try:
-                    info = pya.get_device_info_by_index(i)
-                    if info["maxInputChannels"] > 0 and self.input_device_name.lower() in info.get("name", "").lower():
-                        resolved = i
-                        break
-                except Exception:
-                    continue
+        kind, _ = audio_io.parse_spec(self.audio_input)
+        # Первый запрос устройств перечисляет их в PortAudio — тоже вне цикла событий
+        resolved = (
+            await audio_io.to_thread("device_resolve", devices.resolve_input, self.input_device_index, self.input_device_name)
+            if kind == "device" else None
+        )
 
         try:
-            self.audio_stream = await asyncio.to_thread(
-                pya.open,
-                format=FORMAT,
-                channels=CHANNELS,
-                rate=SEND_SAMPLE_RATE,
-                input=True,
-                input_device_index=resolved,
-                frames_per_buffer=CHUNK_SIZE,
+            self.capture = await audio_io.open_source(
+                self.audio_input, SEND_SAMPLE_RATE, CHUNK_SIZE, device_index=resolved, fmt=FORMAT, channels=CHANNELS
             )
-        except OSError as e:
+        except (OSError, ValueError) as e:
             print(f"[KANA] Mic open failed: {e}")
-            self.audio_stream = None
+            self.capture = None
             return
+        if not self.capture:
+            return
+        self.capture.set_paused(self.paused)
+        self.audio_stream = self.capture.stream
 
-        kwargs = {"exception_on_overflow": False} if __debug__ else {}
         while True:
-            if self.paused:
-                await asyncio.sleep(0.1)
-                continue
             try:
-                if not self.audio_stream:
+                if not self.capture:
                     break
-                data = await asyncio.to_thread(self.audio_stream.read, CHUNK_SIZE, **kwargs)
-                if self.out_queue:
-                    try:
-                        await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
-                    except asyncio.QueueFull:
-                        try:
-                            self.out_queue.get_nowait()
-                            await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
-                        except Exception:
-                            pass
+                data = await self.capture.read_frame()
+                if data is not None and self.recorder:
+                    self.recorder.mic(data)
+                if data is None:
+                    # Файл кончился или браузер отключился — закрываем реплику
+                    print(f"[KANA] Audio input ended ({self.audio_input})")
+                    self._queue_upstream({"audio_stream_end": True})
+                    break
+                if self.denoiser:
+                    silence = None if not self.vad else not self.vad.speaking
+                    data = self.denoiser.process(data, silence=silence)
+                if self.vad:
+                    frames, event = self.vad.process(data)
+                    if event == SPEECH_START and self.vad_barge_in and self._reply_playing():
+                        self.interrupt("vad")
+                    for frame in frames:
+                        self._queue_upstream({"data": frame, "mime_type": "audio/pcm"})
+                    if event == SPEECH_END:
+                        self._queue_upstream({"audio_stream_end": True})
+                else:
+                    self._queue_upstream({"data": data, "mime_type": "audio/pcm"})
             except asyncio.CancelledError:
                 raise
             except Exception as e:
@@ -176,33 +412,74 @@ class AssistantLoop:
             try:
                 turn = self.session.receive()
                 async for response in turn:
-                    if response.data:
-                        self.audio_in_queue.put_nowait(response.data)
+                    if self.text_only:
+                        # Текстовая модальность: части ответа уже дельты
+                        text = response.text
+                        if text:
+                            self.turns.mark("model_text")
+                            if self.recorder:
+                                self.recorder.transcript("KANA", text)
+                            self._transcription("KANA", text)
+                            if self.cues:
+                                self.cues.feed("KANA", text, self.turn_id)
+                    elif response.data:
+                        if self.recorder:
+                            self.recorder.model_audio(response.data)
+                        if self.turn_id >= self._min_playable_turn:
+                            self.turns.mark("model_audio")
+                            self._queue_playback(response.data)
 
                     if response.server_content:
+                        if response.server_content.interrupted:
+                            self.interrupt("server")
                         if response.server_content.input_transcription and response.server_content.input_transcription.text:
                             t = response.server_content.input_transcription.text
                             if t != self._last_input_transcription:
                                 delta = t[len(self._last_input_transcription):] if t.startswith(self._last_input_transcription) else t
                                 self._last_input_transcription = t
-                                if delta and self.on_transcription:
-                                    self.on_transcription({"sender": "User", "text": delta})
+                                self.turns.user_speech()
+                                if delta and self.recorder:
+                                    self.recorder.transcript("User", delta)
+                                if delta:
+                                    self._transcription("User", delta)
+                                if delta and self.cues:
+                                    self.cues.feed("User", delta, self.turn_id)
                         if response.server_content.output_transcription and response.server_content.output_transcription.text:
                             t = response.server_content.output_transcription.text
                             if t != self._last_output_transcription:
                                 delta = t[len(self._last_output_transcription):] if t.startswith(self._last_output_transcription) else t
                                 self._last_output_transcription = t
-                                if delta and self.on_transcription:
-                                    self.on_transcription({"sender": "KANA", "text": delta})
+                                if delta and self.recorder:
+                                    self.recorder.transcript("KANA", delta)
+                                if delta:
+                                    self._transcription("KANA", delta)
+                                if delta and self.cues:
+                                    self.cues.feed("KANA", delta, self.turn_id)
+
+                    update = getattr(response, "session_resumption_update", None)
+                    if update and update.resumable and update.new_handle:
+                        self.resume_handle = update.new_handle
+                    if getattr(response, "go_away", None):
+                        print(f"[KANA] Server will close the session soon (time left: {response.go_away.time_left})")
 
                     if response.tool_call:
                         pass  # MVP: игнорируем инструменты
 
-                while not self.audio_in_queue.empty():
-                    self.audio_in_queue.get_nowait()
+                # Конец хода: недоигранный хвост не сбрасываем — это делает только interrupt()
+                if self.cues:
+                    self.cues.end_turn()
+                if self.transcript:
+                    self.transcript.end_turn()
+                if self.recorder:
+                    self.recorder.event("turn_complete", turn=self.turn_id)
+                self.turn_id += 1
+                self.turns.turn_complete()
             except asyncio.CancelledError:
                 raise
             except Exception as e:
+                if live.connection_closed(e):
+                    # Соединение оборвалось — пусть run() переподключится (с возобновлением по handle)
+                    raise
                 print(f"[KANA] receive_audio: {e}")
                 if self.on_error:
                     self.on_error(str(e))
@@ -211,67 +488,92 @@ class AssistantLoop:
                     break
 
     async def play_audio(self):
-        stream = None
-        pya_instance = pyaudio.PyAudio()
-        resolved_output = self.output_device_index
-        if resolved_output is None and self.output_device_name:
-            for i in range(pya_instance.get_device_count()):
-                try:
-                    info = pya_instance.get_device_info_by_index(i)
-                    if info["maxOutputChannels"] > 0 and self.output_device_name.lower() in info.get("name", "").lower():
-                        resolved_output = i
-                        break
-                except Exception:
-                    continue
+        kind, _ = audio_io.parse_spec(self.audio_output)
+        resolved_output = (
+            await audio_io.to_thread("device_resolve", devices.resolve_output, self.output_device_index, self.output_device_name)
+            if kind == "device" else None
+        )
         try:
-            stream = await asyncio.to_thread(
-                pya_instance.open,
-                format=FORMAT,
-                channels=CHANNELS,
-                rate=RECEIVE_SAMPLE_RATE,
-                output=True,
-                output_device_index=resolved_output,
+            self.playback = await audio_io.open_sink(
+                self.audio_output, RECEIVE_SAMPLE_RATE, device_index=resolved_output, fmt=FORMAT, channels=CHANNELS
             )
         except Exception as e:
-            print(f"[KANA] Speaker open failed (device {resolved_output}): {e}")
-            if resolved_output is not None:
+            print(f"[KANA] Speaker open failed ({self.audio_output}, device {resolved_output}): {e}")
+            self.playback = None
+            if kind == "device" and resolved_output is not None:
                 try:
-                    stream = await asyncio.to_thread(
-                        pya_instance.open,
-                        format=FORMAT,
-                        channels=CHANNELS,
-                        rate=RECEIVE_SAMPLE_RATE,
-                        output=True,
-                        output_device_index=None,
-                    )
+                    self.playback = await audio_io.open_sink("device", RECEIVE_SAMPLE_RATE, fmt=FORMAT, channels=CHANNELS)
                     print("[KANA] Using default output device")
                 except Exception as e2:
                     print(f"[KANA] Default device also failed: {e2}")
-                    stream = None
+                    self.playback = None
 
         try:
             while True:
                 try:
-                    bytestream = await self.audio_in_queue.get()
+                    turn_id, bytestream = await self.audio_in_queue.get()
+                    if turn_id < self._min_playable_turn:
+                        continue  # ход прерван — чанк устарел
                     if self.on_audio_data:
                         self.on_audio_data(bytestream)
-                    if stream:
-                        await asyncio.to_thread(stream.write, bytestream)
+                    # Чанк зазвучит после того, что уже в буфере вывода
+                    ahead = self.playback.depth_ms() / 1000.0 if self.playback else 0.0
+                    if self.lipsync:
+                        self.lipsync.push(bytestream, ahead)
+                    if self.playback:
+                        # Отметка — момент начала звучания по глубине приёмника, а не постановка в очередь
+                        self.turns.mark("playback", delay=ahead)
+                        await self.playback.write(bytestream)
                 except asyncio.CancelledError:
                     raise
                 except Exception as e:
                     print(f"[KANA] play_audio: {e}")
                     await asyncio.sleep(0.1)
         finally:
-            if stream:
-                try:
-                    stream.close()
-                except Exception:
-                    pass
+            if self.playback:
+                self.playback.close()
+                self.playback = None
+
+    async def lipsync_loop(self):
+        async for frame in self.lipsync.frames():
+            self.on_lipsync(frame)
+
+    async def _connect(self):
+        """Resume by handle if we have one, else take a warm pooled session, else connect fresh."""
+        model, config = (TEXT_MODEL, get_text_config) if self.text_only else (MODEL, get_config)
+        if (_text_config if self.text_only else _config) is None:
+            # Первый запуск до окончания прогрева сервера: импорт google-genai — не в цикле событий
+            await metrics.to_thread("genai_init", lambda: (get_client(), config()))
+        if self.resume_handle:
+            print("[KANA] Resuming Gemini Live session...")
             try:
-                pya_instance.terminate()
-            except Exception:
-                pass
+                conn = await live.open_session(get_client(), model, live.with_resumption(config(), self.resume_handle), CONNECT_TIMEOUT_SEC)
+                live.stats.record_resume(True)
+                return conn
+            except asyncio.TimeoutError:
+                live.stats.record_resume(False)
+                raise
+            except Exception as e:
+                print(f"[KANA] Resume failed, starting a new session: {e}")
+                live.stats.record_resume(False)
+                self.resume_handle = None
+        if self.session_pool and not self.text_only:
+            # В пуле — сессии с аудио-конфигом
+            conn = self.session_pool.claim()
+            if conn:
+                print(f"[KANA] Using warm Gemini Live session ({conn.age:.0f}s old)")
+                return conn
+        print("[KANA] Connecting to Gemini Live...")
+        return await live.open_session(get_client(), model, live.with_resumption(config()), CONNECT_TIMEOUT_SEC)
+
+    async def _send_context(self):
+        """Seed a fresh session with earlier turns so the conversation continues after a mode switch."""
+        from google.genai import types
+        turns = [
+            types.Content(role="user" if r["sender"] == "User" else "model", parts=[types.Part(text=r["text"])])
+            for r in self.context[-CONTEXT_TURNS:]
+        ]
+        await self.session.send_client_content(turns=turns, turn_complete=False)
 
     def _user_message(self, e):
         err_str = str(e)
@@ -305,7 +607,7 @@ class AssistantLoop:
         return f"Ошибка подключения к Gemini: {raw}"
 
     async def run(self, start_message=None):
-        if not os.getenv("GEMINI_API_KEY"):
+        if live.needs_api_key() and not os.getenv("GEMINI_API_KEY"):
             if self.on_error:
                 self.on_error(
                     "Не задан GEMINI_API_KEY. Создайте ключ на https://aistudio.google.com/apikey и добавьте в .env: GEMINI_API_KEY=ваш_ключ"
@@ -314,35 +616,59 @@ class AssistantLoop:
                 self.on_stopped()
             return
 
+        if self.record and recorder.RECORD_DIR:
+            self.recorder = recorder.Recorder(recorder.RECORD_DIR, self.name, meta={
+                "mic_rate": SEND_SAMPLE_RATE,
+                "mic_frame_size": CHUNK_SIZE,
+                "model_rate": RECEIVE_SAMPLE_RATE,
+                "audio_input": self.audio_input,
+                "vad": self.vad is not None,
+                "noise_suppression": self.denoiser is not None,
+            })
+            print(f"[KANA] Recording session to {self.recorder.path}")
+
+        backoff = live.Backoff()
         while not self.stop_event.is_set():
             will_retry = False
             try:
-                print("[KANA] Connecting to Gemini Live...")
-                connect_coro = client.aio.live.connect(model=MODEL, config=config)
-                session = await asyncio.wait_for(
-                    connect_coro.__aenter__(),
-                    timeout=CONNECT_TIMEOUT_SEC,
-                )
+                conn = await self._connect()
+                backoff.reset()
                 try:
                     async with asyncio.TaskGroup() as tg:
-                        self.session = session
-                        self.audio_in_queue = asyncio.Queue()
+                        self.session = conn.session
+                        self.audio_in_queue = asyncio.Queue(maxsize=PLAYBACK_QUEUE_MAX)
                         self.out_queue = asyncio.Queue(maxsize=10)
+                        if self.context and not conn.resumed:
+                            await self._send_context()
+                        self.connected.set()
 
                         if self.on_ready:
                             self.on_ready()
 
-                        tg.create_task(self.send_realtime())
-                        tg.create_task(self.listen_audio())
                         tg.create_task(self.receive_audio())
-                        tg.create_task(self.play_audio())
-
-                        if start_message:
+                        if not self.text_only:
+                            tg.create_task(self.send_realtime())
+                            tg.create_task(self.listen_audio())
+                            tg.create_task(self.play_audio())
+                        if self.lipsync:
+                            tg.create_task(self.lipsync_loop())
+
+                        if start_message and not conn.resumed:
                             await self.session.send(input=start_message, end_of_turn=True)
 
                         await self.stop_event.wait()
+                        # Выходим из TaskGroup: остальные задачи бесконечны, их отменит исключение
+                        raise _Stopped()
+                except Exception as eg:
+                    if not hasattr(eg, "split"):
+                        raise
+                    _, rest = eg.split(_Stopped)
+                    if rest is not None:
+                        raise rest
                 finally:
-                    await connect_coro.__aexit__(None, None, None)
+                    self.session = None
+                    self.connected.clear()
+                    await conn.close()
 
             except asyncio.TimeoutError:
                 print("[KANA] Connection timeout")
@@ -361,19 +687,27 @@ class AssistantLoop:
                     print(f"[KANA] Connection error: {e}")
                 if self.stop_event.is_set():
                     break
-                if self.on_error:
+                errors = e.exceptions if hasattr(e, "exceptions") else (e,)
+                resumable_drop = self.resume_handle and any(live.connection_closed(x) for x in errors)
+                if self.on_error and not resumable_drop:
                     self.on_error(self._user_message(e))
                 if "leaked" in err_str.lower() or "not implemented" in err_str.lower() or "not supported" in err_str.lower() or "not enabled" in err_str.lower():
                     break
                 will_retry = True
-                await asyncio.sleep(1)
+                delay = backoff.next()
+                print(f"[KANA] Reconnecting in {delay:.1f}s" + (" (resumable)" if self.resume_handle else ""))
+                await asyncio.sleep(delay)
 
             finally:
-                if getattr(self, "audio_stream", None):
-                    try:
-                        self.audio_stream.close()
-                    except Exception:
-                        pass
-                    self.audio_stream = None
+                if self.capture:
+                    self.capture.close()
+                    self.capture = None
+                self.audio_stream = None
                 if not will_retry and self.on_stopped:
                     self.on_stopped()
+        if self.transcript:
+            # Сессия остановлена посреди хода — недосказанное тоже остаётся в истории
+            self.transcript.end_turn()
+        if self.recorder:
+            await asyncio.wrap_future(self.recorder.close())
+            print(f"[KANA] Recording saved: {self.recorder.path}")
@@ -0,0 +1,870 @@
+"""
+KANA — звук через callback PortAudio: захват в кольцевой буфер без блокировок,
+воспроизведение из адаптивного джиттер-буфера с тишиной вместо блокировки при опустошении.
+Устройства открываются на родной частоте (KANA_DEVICE_RATE=native) и ресемплируются к частоте
+конвейера (resample.py); KANA_DEVICE_RATE=pipeline — открывать сразу на 16/24 кГц, как раньше.
+
+Источники и приёмники взаимозаменяемы (KANA_AUDIO_INPUT / KANA_AUDIO_OUTPUT или audio_input /
+audio_output в start_audio): device — PortAudio, browser — PCM через socket.io, file:<путь> — WAV
+или сырой PCM через mmap (только из окружения), null — без звука. Без устройств сервер не трогает PortAudio.
+
+Блокирующие вызовы PortAudio (инициализация, открытие и закрытие потоков, опрос устройств) идут через
+свой ограниченный пул KANA_AUDIO_THREADS с приоритетом KANA_AUDIO_THREAD_PRIORITY, а не через общий
+пул asyncio — их не задерживают чтение анимаций и журналов истории.
+"""
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from resample import Resampler
+
+# Значения констант PortAudio (paInt16, paContinue, paInputOverflow из pyaudio): модуль импортируется
+# и без PyAudio — сам pyaudio нужен только устройствам (null/browser/file работают без него)
+PA_INT16 = 8
+PA_CONTINUE = 0
+PA_INPUT_OVERFLOW = 2
+
+DEVICE_RATE = os.getenv("KANA_DEVICE_RATE", "native").strip().lower()
+AUDIO_THREADS = max(1, int(os.getenv("KANA_AUDIO_THREADS", "2")))
+AUDIO_THREAD_PRIORITY = os.getenv("KANA_AUDIO_THREAD_PRIORITY", "normal").strip().lower()  # normal|high|realtime
+# nice на POSIX (ниже нуля — нужны CAP_SYS_NICE/root) и THREAD_PRIORITY_* на Windows
+_NICE = {"normal": 0, "high": -5, "realtime": -15}
+_WIN_PRIORITY = {"normal": 0, "high": 2, "realtime": 15}
+_priority = {"applied": 0, "failed": None}
+
+
+def _set_thread_priority():
+    """Executor initializer: raise the worker's priority as far as the OS allows (best effort)."""
+    level = AUDIO_THREAD_PRIORITY if AUDIO_THREAD_PRIORITY in _NICE else "normal"
+    if level == "normal":
+        return
+    try:
+        if os.name == "nt":
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            if not kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _WIN_PRIORITY[level]):
+                raise OSError("SetThreadPriority failed")
+        else:
+            # На Linux nice действует на отдельный поток по его tid
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), _NICE[level])
+        _priority["applied"] += 1
+    except (OSError, AttributeError) as e:
+        if _priority["failed"] is None:
+            print(f"[KANA] Audio thread priority '{level}' not applied: {e}")
+        _priority["failed"] = str(e)
+
+
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=AUDIO_THREADS, thread_name_prefix="kana-audio", initializer=_set_thread_priority
+)
+
+
+async def to_thread(op, fn, *args, **kwargs):
+    """Run a blocking PortAudio call in the audio executor (timed like metrics.to_thread)."""
+    return await metrics.to_thread(op, fn, *args, executor=EXECUTOR, **kwargs)
+
+
+def executor_stats():
+    return {
+        "threads": AUDIO_THREADS,
+        "started": len(EXECUTOR._threads),
+        "queued": EXECUTOR._work_queue.qsize(),
+        "priority": AUDIO_THREAD_PRIORITY,
+        "priority_applied": _priority["applied"],
+        "priority_error": _priority["failed"],
+    }
+
+
+# Один экземпляр PyAudio на процесс. PortAudio перечисляет устройства только в Pa_Initialize, поэтому
+# подключённая гарнитура видна лишь после пересоздания хоста — а его можно пересоздать, только пока
+# ни один поток устройства не открыт и не открывается (_host_users)
+_host = None
+_host_lock = threading.Lock()
+_host_users = 0
+
+
+def _new_host():
+    import pyaudio
+    return pyaudio.PyAudio()
+
+
+def pyaudio_host():
+    """Shared PyAudio host (blocking: PortAudio probes every host API on init); created on first use."""
+    global _host
+    with _host_lock:
+        if _host is None:
+            _host = _new_host()
+        return _host
+
+
+def rehost():
+    """Re-create the PyAudio host so PortAudio re-enumerates devices (hot-plug).
+
+    Returns False, leaving the host alone, while a device stream is open or being opened.
+    """
+    global _host
+    with _host_lock:
+        if _host_users:
+            return False
+        if _host is not None:
+            _host.terminate()
+            _host = None
+        _host = _new_host()
+        return True
+
+
+def _acquire_host():
+    global _host, _host_users
+    with _host_lock:
+        if _host is None:
+            _host = _new_host()
+        _host_users += 1
+        return _host
+
+
+def _release_host():
+    global _host_users
+    with _host_lock:
+        _host_users = max(0, _host_users - 1)
+
+
+def _close_stream(stream):
+    try:
+        stream.stop_stream()
+    except Exception:
+        pass
+    try:
+        stream.close()
+    except Exception:
+        pass
+    finally:
+        _release_host()
+
+
+def native_rate(pya, device_index, output=False):
+    """Default sample rate of a PortAudio device (the one it runs without host-side conversion)."""
+    if device_index is None:
+        info = pya.get_default_output_device_info() if output else pya.get_default_input_device_info()
+    else:
+        info = pya.get_device_info_by_index(device_index)
+    return int(info["defaultSampleRate"])
+
+
+class RingBuffer:
+    """Preallocated single-producer/single-consumer byte ring.
+
+    The PortAudio callback thread only advances the write counter and the event loop
+    only advances the read counter, so no lock is needed. When the ring is full the
+    incoming data is dropped and write() reports how much was accepted.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._written = 0
+        self._read = 0
+
+    def available(self):
+        return self._written - self._read
+
+    def free(self):
+        return self.capacity - (self._written - self._read)
+
+    def write(self, data):
+        n = min(len(data), self.free())
+        if n <= 0:
+            return 0
+        pos = self._written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._view[pos:pos + first] = data[:first]
+        if n > first:
+            self._view[:n - first] = data[first:n]
+        self._written += n
+        return n
+
+    def read(self, n):
+        n = min(n, self.available())
+        pos = self._read % self.capacity
+        first = min(n, self.capacity - pos)
+        if n > first:
+            out = bytes(self._view[pos:]) + bytes(self._view[:n - first])
+        else:
+            out = bytes(self._view[pos:pos + n])
+        self._read += n
+        return out
+
+    def clear(self):
+        """Consumer-side reset: skip everything written so far."""
+        self._read = self._written
+
+
+class MicCapture:
+    """Callback-mode microphone stream that delivers fixed-size frames to the event loop.
+
+    With a device_rate other than rate the device runs at its own rate and read_frame()
+    resamples, so frames still have frame_size samples at rate.
+    """
+
+    def __init__(self, pya, device_index, rate, frame_size, fmt=PA_INT16, channels=1, buffer_frames=32, device_rate=None):
+        self.pya = pya
+        self.device_index = device_index
+        self.rate = rate
+        self.device_rate = device_rate or rate
+        self.frame_size = frame_size
+        self.format = fmt
+        self.channels = channels
+        self.frame_bytes = frame_size * channels * pya.get_sample_size(fmt)
+        self.device_frame_size = round(frame_size * self.device_rate / rate)
+        self.device_frame_bytes = self.device_frame_size * channels * pya.get_sample_size(fmt)
+        self.ring = RingBuffer(self.device_frame_bytes * buffer_frames)
+        self.resampler = Resampler(self.device_rate, rate) if self.device_rate != rate else None
+        self._resampled = bytearray()
+        self.stream = None
+
+        self._loop = None
+        self._frame_ready = asyncio.Event()
+        self._waiting = False
+        self._paused = False
+
+        self.frames = 0
+        self.overruns = 0
+        self.overrun_bytes = 0
+        self.input_overflows = 0
+
+    async def open(self):
+        self._loop = asyncio.get_running_loop()
+        self.stream = await to_thread(
+            "mic_open",
+            self.pya.open,
+            format=self.format,
+            channels=self.channels,
+            rate=self.device_rate,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.device_frame_size,
+            stream_callback=self._callback,
+        )
+        return self
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        # Поток PortAudio: только копия в кольцо и, при необходимости, одно пробуждение цикла
+        if status & PA_INPUT_OVERFLOW:
+            self.input_overflows += 1
+        if self._paused or not in_data:
+            return (None, PA_CONTINUE)
+        accepted = self.ring.write(in_data)
+        if accepted < len(in_data):
+            self.overruns += 1
+            self.overrun_bytes += len(in_data) - accepted
+        if self._waiting and self.ring.available() >= self.device_frame_bytes:
+            self._waiting = False
+            try:
+                self._loop.call_soon_threadsafe(self._frame_ready.set)
+            except RuntimeError:
+                pass  # event loop already closed
+        return (None, PA_CONTINUE)
+
+    async def _read_device_frame(self):
+        while self.ring.available() < self.device_frame_bytes:
+            self._frame_ready.clear()
+            self._waiting = True
+            if self.ring.available() >= self.device_frame_bytes:
+                self._waiting = False
+                break
+            await self._frame_ready.wait()
+        return self.ring.read(self.device_frame_bytes)
+
+    async def read_frame(self):
+        """Wait for one full frame and return it as bytes."""
+        if self.resampler is None:
+            frame = await self._read_device_frame()
+        else:
+            # Кадр устройства после ресемплинга может быть на отсчёт короче или длиннее — добираем
+            while len(self._resampled) < self.frame_bytes:
+                self._resampled += self.resampler.process(await self._read_device_frame())
+            frame = bytes(self._resampled[:self.frame_bytes])
+            del self._resampled[:self.frame_bytes]
+        self.frames += 1
+        return frame
+
+    def set_paused(self, paused):
+        """While paused the callback discards input; stale audio is dropped on resume."""
+        if self._paused and not paused:
+            self.ring.clear()
+            self._resampled.clear()
+            if self.resampler:
+                self.resampler.reset()
+        self._paused = paused
+
+    def close(self):
+        stream, self.stream = self.stream, None
+        if stream:
+            # stop_stream() ждёт, пока PortAudio доиграет буфер — не в цикле событий
+            EXECUTOR.submit(_close_stream, stream)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "overruns": self.overruns,
+            "overrun_bytes": self.overrun_bytes,
+            "input_overflows": self.input_overflows,
+            "device_rate": self.device_rate,
+            "buffered_bytes": self.ring.available(),
+            "capacity_bytes": self.ring.capacity,
+        }
+
+
+JITTER_TARGET_MS = int(os.getenv("KANA_JITTER_TARGET_MS", "60"))
+JITTER_MIN_MS = int(os.getenv("KANA_JITTER_MIN_MS", "20"))
+JITTER_MAX_MS = int(os.getenv("KANA_JITTER_MAX_MS", "2000"))
+JITTER_STEP_MS = 20
+JITTER_RELAX_SEC = 10.0  # без опустошений столько секунд — цель уменьшается на шаг
+PLAYBACK_FRAME_SIZE = 480  # 20 мс при 24 кГц
+
+
+class JitterBuffer:
+    """Preallocated playback buffer with an adaptive start threshold.
+
+    The event loop writes, the PortAudio callback reads. Reads never block: missing
+    samples are filled with silence and counted as an underrun, after which playback
+    waits for target depth again and the target grows by one step (up to the maximum).
+    """
+
+    def __init__(self, rate, sample_width=2, target_ms=JITTER_TARGET_MS, max_ms=JITTER_MAX_MS, min_ms=JITTER_MIN_MS):
+        self.bytes_per_ms = rate * sample_width / 1000.0
+        self.sample_width = sample_width
+        self.min_ms = min_ms
+        self.max_ms = max(max_ms, target_ms)
+        self.target_ms = target_ms
+        self.capacity = self._ms_to_bytes(self.max_ms)
+        self._buf = bytearray(self.capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._priming = True
+        self._primed_wait = 0
+        self._stable_bytes = 0
+
+        self.underruns = 0
+        self.overruns = 0
+        self.played_bytes = 0
+        self.silence_bytes = 0
+        self.max_depth_bytes = 0
+
+    def _ms_to_bytes(self, ms):
+        n = int(ms * self.bytes_per_ms)
+        return n - n % self.sample_width
+
+    def depth_ms(self):
+        return self._size / self.bytes_per_ms
+
+    def space(self):
+        return self.capacity - self._size
+
+    def write(self, data):
+        """Append PCM; returns the number of bytes accepted (less than len(data) when full)."""
+        with self._lock:
+            n = min(len(data), self.capacity - self._size)
+            if n <= 0:
+                return 0
+            pos = (self._start + self._size) % self.capacity
+            first = min(n, self.capacity - pos)
+            self._view[pos:pos + first] = data[:first]
+            if n > first:
+                self._view[:n - first] = data[first:n]
+            self._size += n
+            if self._size > self.max_depth_bytes:
+                self.max_depth_bytes = self._size
+            return n
+
+    def read(self, n):
+        """Return exactly n bytes for the device, padding with silence when short."""
+        out = bytearray(n)
+        with self._lock:
+            target = self._ms_to_bytes(self.target_ms)
+            if self._priming:
+                # Не держим хвост реплики дольше цели: после target мс ожидания играем что есть
+                if self._size >= target or (self._size and self._primed_wait >= target):
+                    self._priming = False
+                    self._primed_wait = 0
+                else:
+                    if self._size:
+                        self._primed_wait += n
+                    self.silence_bytes += n
+                    return bytes(out)
+            take = min(n, self._size)
+            first = min(take, self.capacity - self._start)
+            out[:first] = self._view[self._start:self._start + first]
+            if take > first:
+                out[first:take] = self._view[:take - first]
+            self._start = (self._start + take) % self.capacity
+            self._size -= take
+            self.played_bytes += take
+            if take < n:
+                self.silence_bytes += n - take
+                self._priming = True
+                if take:
+                    # Данные кончились посреди воспроизведения — настоящее опустошение
+                    self.underruns += 1
+                    self.target_ms = min(self.max_ms, self.target_ms + JITTER_STEP_MS)
+                    self._stable_bytes = 0
+            else:
+                self._stable_bytes += n
+                if self._stable_bytes >= JITTER_RELAX_SEC * 1000 * self.bytes_per_ms:
+                    self._stable_bytes = 0
+                    self.target_ms = max(self.min_ms, self.target_ms - JITTER_STEP_MS)
+        return bytes(out)
+
+    def clear(self):
+        """Drop everything buffered; returns the number of bytes discarded."""
+        with self._lock:
+            dropped = self._size
+            self._start = 0
+            self._size = 0
+            self._priming = True
+            self._primed_wait = 0
+            return dropped
+
+    def stats(self):
+        return {
+            "depth_ms": round(self.depth_ms(), 1),
+            "target_ms": self.target_ms,
+            "max_ms": self.max_ms,
+            "max_depth_ms": round(self.max_depth_bytes / self.bytes_per_ms, 1),
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "played_ms": round(self.played_bytes / self.bytes_per_ms),
+            "silence_ms": round(self.silence_bytes / self.bytes_per_ms),
+        }
+
+
+class SpeakerPlayback:
+    """Callback-mode output stream pulling from a JitterBuffer.
+
+    With a device_rate other than rate, write() resamples before buffering; the jitter
+    buffer and the callback run at the device rate.
+    """
+
+    def __init__(self, pya, device_index, rate, fmt=PA_INT16, channels=1, frame_size=PLAYBACK_FRAME_SIZE, device_rate=None):
+        self.pya = pya
+        self.device_index = device_index
+        self.rate = rate
+        self.device_rate = device_rate or rate
+        self.format = fmt
+        self.channels = channels
+        self.frame_size = round(frame_size * self.device_rate / rate)
+        self.frame_bytes = self.frame_size * channels * pya.get_sample_size(fmt)
+        self.jitter = JitterBuffer(self.device_rate * channels, sample_width=pya.get_sample_size(fmt))
+        self.resampler = Resampler(rate, self.device_rate) if self.device_rate != rate else None
+        self.stream = None
+
+        self._loop = None
+        self._space = asyncio.Event()
+        self._waiting = False
+        self._epoch = 0
+
+    async def open(self):
+        self._loop = asyncio.get_running_loop()
+        self.stream = await to_thread(
+            "speaker_open",
+            self.pya.open,
+            format=self.format,
+            channels=self.channels,
+            rate=self.device_rate,
+            output=True,
+            output_device_index=self.device_index,
+            frames_per_buffer=self.frame_size,
+            stream_callback=self._callback,
+        )
+        return self
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        data = self.jitter.read(frame_count * self.channels * self.jitter.sample_width)
+        if self._waiting and self.jitter.space() >= self.frame_bytes:
+            self._waiting = False
+            try:
+                self._loop.call_soon_threadsafe(self._space.set)
+            except RuntimeError:
+                pass
+        return (data, PA_CONTINUE)
+
+    async def write(self, data):
+        """Queue PCM for playback; waits (without blocking the loop) while the buffer is full.
+
+        A flush() during the wait abandons the rest of the chunk.
+        """
+        epoch = self._epoch
+        if self.resampler:
+            data = self.resampler.process(data)
+        view = memoryview(data)
+        while view and epoch == self._epoch:
+            accepted = self.jitter.write(view)
+            view = view[accepted:]
+            if not view:
+                break
+            self.jitter.overruns += 1
+            self._space.clear()
+            self._waiting = True
+            if self.jitter.space() >= self.frame_bytes:
+                self._waiting = False
+                continue
+            await self._space.wait()
+
+    def flush(self):
+        """Discard buffered audio (barge-in); returns the number of bytes dropped."""
+        self._epoch += 1
+        self._space.set()
+        if self.resampler:
+            self.resampler.reset()
+        dropped = self.jitter.clear()
+        # Отчёт — в байтах частоты конвейера, как у остальных приёмников
+        return dropped * self.rate // self.device_rate if self.resampler else dropped
+
+    def close(self):
+        stream, self.stream = self.stream, None
+        if stream:
+            # stop_stream() ждёт, пока PortAudio доиграет буфер — не в цикле событий
+            EXECUTOR.submit(_close_stream, stream)
+
+    def depth_ms(self):
+        return self.jitter.depth_ms()
+
+    def stats(self):
+        return dict(self.jitter.stats(), device_rate=self.device_rate)
+
+
+INPUT = os.getenv("KANA_AUDIO_INPUT", "device")
+OUTPUT = os.getenv("KANA_AUDIO_OUTPUT", "device")
+# 0 — файл читается быстрее реального времени, а приёмник null не держит часы воспроизведения
+FILE_REALTIME = os.getenv("KANA_AUDIO_FILE_REALTIME", "1") != "0"
+CLIENT_CHOICES = ("device", "browser", "null")  # file: задаётся только окружением сервера
+BROWSER_BUFFER_FRAMES = 32
+
+
+def parse_spec(spec):
+    """'device' | 'browser' | 'null' | 'file:<path>' -> (kind, path)."""
+    spec = (spec or "device").strip()
+    if spec.startswith("file:"):
+        return "file", spec[5:]
+    kind = spec.lower()
+    if kind not in CLIENT_CHOICES:
+        raise ValueError(f"Unknown audio backend: {spec!r}")
+    return kind, None
+
+
+def _find_wav_data(buf):
+    """(offset, length, rate, channels, sample_width) of the data chunk in a RIFF/WAVE buffer."""
+    if len(buf) < 12 or buf[:4] != b"RIFF" or buf[8:12] != b"WAVE":
+        return None
+    pos, fmt = 12, None
+    while pos + 8 <= len(buf):
+        chunk_id, size = buf[pos:pos + 4], struct.unpack_from("<I", buf, pos + 4)[0]
+        if chunk_id == b"fmt ":
+            _, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", buf, pos + 8)
+            fmt = (rate, channels, bits // 8)
+        elif chunk_id == b"data" and fmt:
+            return (pos + 8, min(size, len(buf) - pos - 8)) + fmt
+        pos += 8 + size + (size & 1)
+    raise ValueError("WAV file has no fmt/data chunk")
+
+
+class FileSource:
+    """Mic stand-in reading int16 mono PCM from a WAV or raw file through mmap.
+
+    With realtime=True frames are paced at the capture rate; otherwise as fast as the
+    pipeline takes them (replays and benchmarks). read_frame() returns None at the end.
+    """
+
+    def __init__(self, path, rate, frame_size, realtime=None):
+        self.path = path
+        self.rate = rate
+        self.frame_size = frame_size
+        self.frame_bytes = frame_size * 2
+        self.realtime = FILE_REALTIME if realtime is None else realtime
+        self.stream = None
+        self._file = None
+        self._map = None
+        self._data = None
+        self._pos = 0
+        self._started = None
+        self._paused = False
+        self.frames = 0
+
+    async def open(self):
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._map = b""  # пустой файл
+        wav = _find_wav_data(self._map)
+        offset, length = 0, len(self._map)
+        if wav:
+            offset, length, rate, channels, width = wav
+            if (rate, channels, width) != (self.rate, 1, 2):
+                self.close()
+                raise ValueError(f"{self.path}: need {self.rate} Hz mono 16-bit, got {rate} Hz, {channels} ch, {8 * width}-bit")
+        self._data = memoryview(self._map)[offset:offset + length - length % 2]
+        return self
+
+    async def read_frame(self):
+        while True:
+            if self._pos >= len(self._data):
+                return None
+            if self.realtime:
+                now = time.monotonic()
+                if self._started is None:
+                    self._started = now - self.frames * self.frame_size / self.rate
+                due = self._started + self.frames * self.frame_size / self.rate
+                if due > now:
+                    await asyncio.sleep(due - now)
+            else:
+                # Без темпа всё равно уступаем циклу: иначе файл уходит за один шаг и очередь
+                # отправки (вытеснение старых) теряет всё, кроме хвоста
+                await asyncio.sleep(0)
+            frame = bytes(self._data[self._pos:self._pos + self.frame_bytes])
+            self._pos += self.frame_bytes
+            self.frames += 1
+            if self._paused:
+                if not self.realtime:
+                    await asyncio.sleep(self.frame_size / self.rate)
+                continue  # как у микрофона: на паузе вход теряется
+            if len(frame) < self.frame_bytes:
+                frame += bytes(self.frame_bytes - len(frame))
+            return frame
+
+    def set_paused(self, paused):
+        self._paused = paused
+
+    def close(self):
+        if self._data is not None:
+            self._data.release()
+            self._data = None
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        total = len(self._data) if self._data is not None else 0
+        return {"frames": self.frames, "position_bytes": min(self._pos, total), "length_bytes": total, "realtime": self.realtime}
+
+
+class BrowserSource:
+    """Mic PCM streamed up by the frontend (audio_input events), reframed into capture frames.
+
+    push() runs on the event loop; when the client sends faster than the pipeline reads, the
+    newest data is dropped and counted as an overrun, like MicCapture.
+    """
+
+    def __init__(self, rate, frame_size, buffer_frames=BROWSER_BUFFER_FRAMES):
+        self.rate = rate
+        self.frame_size = frame_size
+        self.frame_bytes = frame_size * 2
+        self.ring = RingBuffer(self.frame_bytes * buffer_frames)
+        self.stream = None
+        self._frame_ready = asyncio.Event()
+        self._paused = False
+        self._closed = False
+        self._odd = b""
+
+        self.frames = 0
+        self.pushed_bytes = 0
+        self.overruns = 0
+        self.overrun_bytes = 0
+
+    async def open(self):
+        return self
+
+    def push(self, data):
+        if self._closed or self._paused or not data:
+            return
+        data = self._odd + bytes(data)
+        cut = len(data) - len(data) % 2
+        data, self._odd = data[:cut], data[cut:]
+        self.pushed_bytes += len(data)
+        accepted = self.ring.write(data)
+        if accepted < len(data):
+            self.overruns += 1
+            self.overrun_bytes += len(data) - accepted
+        if self.ring.available() >= self.frame_bytes:
+            self._frame_ready.set()
+
+    async def read_frame(self):
+        while self.ring.available() < self.frame_bytes:
+            if self._closed:
+                return None
+            self._frame_ready.clear()
+            await self._frame_ready.wait()
+        self.frames += 1
+        return self.ring.read(self.frame_bytes)
+
+    def set_paused(self, paused):
+        if self._paused and not paused:
+            self.ring.clear()
+        self._paused = paused
+
+    def close(self):
+        self._closed = True
+        self._frame_ready.set()
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "pushed_bytes": self.pushed_bytes,
+            "overruns": self.overruns,
+            "overrun_bytes": self.overrun_bytes,
+            "buffered_bytes": self.ring.available(),
+        }
+
+
+class NullSink:
+    """Playback without a device: audio is consumed on a virtual real-time clock.
+
+    The clock keeps depth_ms() (used for barge-in) close to what a real speaker or the
+    browser is still playing; write() waits once more than max_ms is queued ahead.
+    With realtime=False audio is discarded immediately.
+    """
+
+    def __init__(self, rate, sample_width=2, max_ms=JITTER_MAX_MS, realtime=True):
+        self.bytes_per_ms = rate * sample_width / 1000.0
+        self.max_ms = max_ms
+        self.realtime = realtime
+        self._play_until = 0.0
+        self._epoch = 0
+        self._flushed = asyncio.Event()
+        self.played_bytes = 0
+        self.dropped_bytes = 0
+
+    async def open(self):
+        return self
+
+    def depth_ms(self):
+        return max(0.0, self._play_until - time.monotonic()) * 1000.0
+
+    async def write(self, data):
+        self.played_bytes += len(data)
+        if not self.realtime:
+            return
+        now = time.monotonic()
+        self._play_until = max(self._play_until, now) + len(data) / self.bytes_per_ms / 1000.0
+        ahead = self._play_until - now - self.max_ms / 1000.0
+        if ahead > 0:
+            epoch = self._epoch
+            self._flushed.clear()
+            try:
+                await asyncio.wait_for(self._flushed.wait(), timeout=ahead)
+            except asyncio.TimeoutError:
+                pass
+            if epoch != self._epoch:
+                return
+
+    def flush(self):
+        dropped = int(self.depth_ms() * self.bytes_per_ms)
+        dropped -= dropped % 2
+        self._play_until = 0.0
+        self._epoch += 1
+        self._flushed.set()
+        self.dropped_bytes += dropped
+        return dropped
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        return {
+            "depth_ms": round(self.depth_ms(), 1),
+            "played_ms": round(self.played_bytes / self.bytes_per_ms),
+            "dropped_ms": round(self.dropped_bytes / self.bytes_per_ms),
+            "underruns": 0,
+        }
+
+
+class WavFileSink:
+    """Writes the reply audio to a WAV file instead of a speaker (no pacing)."""
+
+    def __init__(self, path, rate, sample_width=2):
+        self.path = path
+        self.rate = rate
+        self.sample_width = sample_width
+        self._wav = None
+        self.written_bytes = 0
+
+    async def open(self):
+        self._wav = wave.open(self.path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(self.sample_width)
+        self._wav.setframerate(self.rate)
+        return self
+
+    def depth_ms(self):
+        return 0.0
+
+    async def write(self, data):
+        if self._wav:
+            self._wav.writeframesraw(data)
+            self.written_bytes += len(data)
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        wav, self._wav = self._wav, None
+        if wav:
+            wav.close()
+
+    def stats(self):
+        return {"path": self.path, "written_ms": round(self.written_bytes / (self.rate * self.sample_width / 1000.0)), "underruns": 0}
+
+
+async def open_source(spec, rate, frame_size, device_index=None, fmt=PA_INT16, channels=1):
+    """Opened capture source for spec, or None for 'null'."""
+    kind, path = parse_spec(spec)
+    if kind == "null":
+        return None
+    if kind == "browser":
+        return await BrowserSource(rate, frame_size).open()
+    if kind == "file":
+        return await FileSource(path, rate, frame_size).open()
+    pya = await to_thread("pyaudio_init", _acquire_host)
+    try:
+        device_rate = await _device_rate(pya, device_index, rate, output=False)
+        return await MicCapture(pya, device_index, rate, frame_size, fmt=fmt, channels=channels, device_rate=device_rate).open()
+    except BaseException:
+        _release_host()  # открытый поток отпускает хост в _close_stream
+        raise
+
+
+async def open_sink(spec, rate, device_index=None, fmt=PA_INT16, channels=1):
+    """Opened playback sink for spec; 'browser' and 'null' play nothing locally."""
+    kind, path = parse_spec(spec)
+    if kind in ("browser", "null"):
+        return await NullSink(rate, realtime=FILE_REALTIME or kind == "browser").open()
+    if kind == "file":
+        return await WavFileSink(path, rate).open()
+    pya = await to_thread("pyaudio_init", _acquire_host)
+    try:
+        device_rate = await _device_rate(pya, device_index, rate, output=True)
+        return await SpeakerPlayback(pya, device_index, rate, fmt=fmt, channels=channels, device_rate=device_rate).open()
+    except BaseException:
+        _release_host()
+        raise
+
+
+async def _device_rate(pya, device_index, rate, output):
+    if DEVICE_RATE != "native":
+        return rate
+    try:
+        return await to_thread("device_rate", native_rate, pya, device_index, output)
+    except Exception as e:
+        print(f"[KANA] Native rate of device {device_index} unknown, using {rate} Hz: {e}")
+        return rate
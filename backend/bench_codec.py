@@ -0,0 +1,104 @@
+"""
+KANA — микро-бенчмарк ресемплинга и кодеков: CPU на секунду аудио, битрейт и искажения (SNR).
+Сначала — сверка µ-law и запасного декодера ADPCM с audioop на всём диапазоне int16 (если audioop есть).
+
+    python bench_codec.py [--seconds 10] [--chunk-ms 40] [--codec-rate 16000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+import codec
+from fake_live import synth_speech
+from resample import Resampler
+
+SOURCE_RATE = 24000  # ответ Gemini
+RESAMPLE_PAIRS = ((48000, 16000), (44100, 16000), (24000, 48000), (24000, 44100), (24000, 16000))
+
+
+def chunks_of(pcm, rate, chunk_ms):
+    step = rate * chunk_ms // 1000 * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+def tone_pcm(seconds, rate):
+    t = np.arange(int(seconds * rate)) / rate
+    return (6000 * np.sin(2 * np.pi * 440 * t) + 2000 * np.sin(2 * np.pi * 1870 * t)).astype(np.int16).tobytes()
+
+
+def snr_db(reference, decoded):
+    ref = np.frombuffer(reference, dtype=np.int16).astype(np.float64)
+    out = np.frombuffer(decoded, dtype=np.int16).astype(np.float64)
+    n = min(ref.size, out.size)
+    noise = np.sum((ref[:n] - out[:n]) ** 2)
+    return float("inf") if noise == 0 else 10 * np.log10(np.sum(ref[:n] ** 2) / noise)
+
+
+def check_audioop():
+    """µ-law both ways and the pure-Python ADPCM decoder must be bit-exact with audioop."""
+    if codec.audioop is None:
+        print("audioop check: skipped (no audioop)")
+        return True
+    pcm = np.arange(-32768, 32768, dtype=np.int16).tobytes()
+    ulaw = codec.UlawCodec(16000)
+    adpcm, _ = codec.audioop.lin2adpcm(pcm, 2, None)
+    results = {
+        "ulaw encode": ulaw.encode(pcm) == codec.audioop.lin2ulaw(pcm, 2),
+        "ulaw decode": ulaw.decode(bytes(range(256))) == codec.audioop.ulaw2lin(bytes(range(256)), 2),
+        "adpcm decode": codec._ima_decode(adpcm, len(adpcm) * 2, 0, 0) == codec.audioop.adpcm2lin(adpcm, 2, None)[0],
+    }
+    print("audioop check (full int16 range): " + ", ".join(f"{k} {'ok' if v else 'MISMATCH'}" for k, v in results.items()))
+    return all(results.values())
+
+
+def bench_resample(seconds, chunk_ms):
+    print(f"resampling ({chunk_ms} ms chunks), CPU ms per second of audio:")
+    for src, dst in RESAMPLE_PAIRS:
+        data = chunks_of(tone_pcm(seconds, src), src, chunk_ms)
+        r = Resampler(src, dst)
+        t0 = time.process_time()
+        for chunk in data:
+            r.process(chunk)
+        cpu_ms = (time.process_time() - t0) * 1000 / seconds
+        print(f"  {src:>5} -> {dst:<5}  {cpu_ms:6.2f} ms/s  ({cpu_ms / 10:.3f}% of a core), {r.taps} taps x {r.up} phases")
+
+
+def bench_codecs(seconds, chunk_ms, codec_rate):
+    source = synth_speech(seconds, SOURCE_RATE)
+    print(f"codecs (speech-like 24 kHz source, {chunk_ms} ms frames), per second of audio:")
+    for name in codec.available():
+        rate = codec.codec_rate(name, SOURCE_RATE, codec_rate)
+        frame_ms = min(codec.OPUS_FRAME_MS, key=lambda ms: abs(ms - chunk_ms)) if name == "opus" else chunk_ms
+        resampler = Resampler(SOURCE_RATE, rate)
+        enc = codec.create(name, rate)
+        t0 = time.process_time()
+        pcm = resampler.process(source)
+        resample_ms = (time.process_time() - t0) * 1000 / seconds
+        frames = chunks_of(pcm, rate, frame_ms)
+        t0 = time.process_time()
+        encoded = [enc.encode(f) for f in frames]
+        encode_ms = (time.process_time() - t0) * 1000 / seconds
+        dec = codec.create(name, rate)
+        decoded = b"".join(dec.decode(e)[:len(f)] for e, f in zip(encoded, frames))
+        kbps = sum(len(e) for e in encoded) * 8 / seconds / 1000
+        quality = snr_db(pcm, decoded)
+        print(
+            f"  {name:<5} @ {rate:>5} Hz  {kbps:7.1f} kbit/s  resample {resample_ms:5.2f} ms/s"
+            f"  encode {encode_ms:6.2f} ms/s  SNR {quality:5.1f} dB"
+        )
+    print(f"  (pcm @ {SOURCE_RATE} Hz without resampling: {SOURCE_RATE * 16 / 1000:.0f} kbit/s)")
+    if "opus" not in codec.available():
+        print("  opus: unavailable (pip install opuslib and the system libopus)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resampler and audio codec micro-benchmark")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--chunk-ms", type=int, default=40)
+    parser.add_argument("--codec-rate", type=int, default=codec.CODEC_RATE)
+    args = parser.parse_args()
+    if not check_audioop():
+        raise SystemExit(1)
+    bench_resample(args.seconds, args.chunk_ms)
+    bench_codecs(args.seconds, args.chunk_ms, args.codec_rate)
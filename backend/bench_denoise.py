@@ -0,0 +1,49 @@
+"""
+KANA — микро-бенчмарк шумоподавления: стоимость обработки одного кадра против его длительности.
+
+    python bench_denoise.py [--frames 2000] [--frame-size 1024] [--rate 16000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from denoise import NoiseSuppressor
+
+
+def synth_frames(count, frame_size, rate, seed=0):
+    """Noisy tone bursts: 1 s of noise, then alternating speech-like bursts."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(count * frame_size) / rate
+    noise = rng.normal(0, 300, t.size)
+    tone = 4000 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.5 * t) > 0) * (t > 1.0)
+    pcm = np.clip(noise + tone, -32768, 32767).astype(np.int16)
+    return [pcm[i * frame_size:(i + 1) * frame_size].tobytes() for i in range(count)]
+
+
+def run(frames, frame_size, rate):
+    data = synth_frames(frames, frame_size, rate)
+    ns = NoiseSuppressor(frame_size)
+    for frame in data[:50]:  # прогрев
+        ns.process(frame)
+    timings = np.empty(len(data))
+    for i, frame in enumerate(data):
+        t0 = time.perf_counter()
+        ns.process(frame)
+        timings[i] = time.perf_counter() - t0
+    frame_ms = 1000.0 * frame_size / rate
+    mean_ms = timings.mean() * 1000
+    p99_ms = np.percentile(timings, 99) * 1000
+    print(f"frames: {len(data)}  frame: {frame_size} samples ({frame_ms:.1f} ms @ {rate} Hz)")
+    print(f"per frame: mean {mean_ms * 1000:.0f} us, p99 {p99_ms * 1000:.0f} us")
+    print(f"real-time factor: {mean_ms / frame_ms:.4f} (CPU share of one core per stream)")
+    return mean_ms / frame_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Noise suppressor micro-benchmark")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--frame-size", type=int, default=1024)
+    parser.add_argument("--rate", type=int, default=16000)
+    args = parser.parse_args()
+    run(args.frames, args.frame_size, args.rate)
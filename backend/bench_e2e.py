@@ -0,0 +1,240 @@
+"""
+KANA — сквозной бенчмарк: сервер без звуковых устройств на fake-бэкенде Live, N клиентов socket.io.
+
+Каждый клиент: start_audio -> несколько ходов user_input (ждём первое аудио и конец ответа) -> stop_audio.
+Отчёт: p50/p99 времени до первого аудио, пропускная способность событий, CPU и память сервера на сессию.
+
+    python bench_e2e.py [--clients 4] [--turns 5] [--latency-ms 300] [--max-p99-ms 1500] [--json]
+
+Клиент socket.io на aiohttp (есть в requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import socketio
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def proc_usage(pid):
+    """(cpu seconds, rss bytes) of a process from /proc; (None, None) where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        return cpu, rss
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None, None
+
+
+def start_server(port, args):
+    env = dict(
+        os.environ,
+        KANA_LIVE_BACKEND="fake",
+        KANA_MAX_SESSIONS=str(args.clients),
+        KANA_LIVE_POOL_SIZE=str(args.pool),
+        KANA_FAKE_LIVE_LATENCY_MS=str(args.latency_ms),
+        KANA_FAKE_LIVE_JITTER_MS=str(args.jitter_ms),
+        KANA_FAKE_LIVE_REPLY_SEC=str(args.reply_sec),
+        KANA_FAKE_LIVE_BURST=str(args.burst),
+        KANA_FAKE_LIVE_SPEED=str(args.speed),
+    )
+    cmd = [sys.executable, "-m", "uvicorn", "server:app_socketio", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    log = None if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+
+
+async def wait_ready(url, proc, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", int(url.rsplit(":", 1)[1]))
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start in time")
+
+
+class SimClient:
+    """One simulated frontend: counts events and times each turn to its first audio chunk."""
+
+    def __init__(self, url, index, args):
+        self.url = url
+        self.index = index
+        self.args = args
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.events = 0
+        self.audio_events = 0
+        self.audio_bytes = 0
+        self.errors = []
+        self.ttfa = []
+        self._ready = asyncio.Event()
+        self._audio = asyncio.Event()
+        self._last_audio = 0.0
+        self._first_audio = 0.0
+
+        @self.sio.on("*")
+        async def any_event(event, data=None):
+            self.events += 1
+            if event == "audio_data":
+                self.audio_events += 1
+                self.audio_bytes += len(data) if isinstance(data, (bytes, bytearray)) else 2 * len(data.get("data", []))
+                self._last_audio = time.perf_counter()
+                if not self._audio.is_set():
+                    self._first_audio = self._last_audio
+                    self._audio.set()
+            elif event == "status" and (data or {}).get("msg") == "KANA Started":
+                self._ready.set()
+            elif event == "error":
+                self.errors.append((data or {}).get("msg"))
+
+    async def turn(self, text):
+        self._audio.clear()
+        t0 = time.perf_counter()
+        await self.sio.emit("user_input", {"text": text})
+        await asyncio.wait_for(self._audio.wait(), timeout=self.args.turn_timeout)
+        self.ttfa.append(self._first_audio - t0)
+        # Конец ответа — пауза в аудио дольше idle_ms
+        while time.perf_counter() - self._last_audio < self.args.idle_ms / 1000.0:
+            await asyncio.sleep(self.args.idle_ms / 4000.0)
+
+    async def run(self):
+        await self.sio.connect(self.url, transports=["websocket"])
+        try:
+            await self.sio.emit("start_audio", {"audio_transport": "binary", "audio_ack": True, "vad": False, "muted": True, "audio_input": "null", "audio_output": "browser"})
+            await asyncio.wait_for(self._ready.wait(), timeout=self.args.turn_timeout)
+            for i in range(self.args.turns):
+                try:
+                    await self.turn(f"Вопрос {i + 1} от клиента {self.index}")
+                except asyncio.TimeoutError:
+                    self.errors.append(f"turn {i + 1}: no audio within {self.args.turn_timeout}s")
+            await self.sio.emit("stop_audio")
+            await asyncio.sleep(0.1)
+        finally:
+            await self.sio.disconnect()
+
+
+async def sample_usage(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(proc_usage(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.25)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def bench(args):
+    port = args.port or free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = start_server(port, args) if not args.port else None
+    try:
+        if proc:
+            await wait_ready(url, proc)
+            await asyncio.sleep(0.5)  # прогрев пула Live-сессий
+        pid = proc.pid if proc else None
+        base_cpu, base_rss = proc_usage(pid) if pid else (None, None)
+        samples, stop = [], asyncio.Event()
+        sampler = asyncio.create_task(sample_usage(pid, samples, stop)) if pid else None
+
+        clients = [SimClient(url, i, args) for i in range(args.clients)]
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(c.run() for c in clients), return_exceptions=True)
+        wall = time.perf_counter() - t0
+
+        stop.set()
+        if sampler:
+            await sampler
+        end_cpu, _ = proc_usage(pid) if pid else (None, None)
+    finally:
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    ttfa = np.array([t for c in clients for t in c.ttfa]) * 1000.0
+    errors = [f"client {c.index}: {e}" for c in clients for e in c.errors]
+    errors += [f"client {i}: {r!r}" for i, r in enumerate(results) if isinstance(r, Exception)]
+    rss_peak = max((rss for _, rss in samples if rss), default=None)
+    report = {
+        "clients": args.clients,
+        "turns": int(ttfa.size),
+        "wall_sec": round(wall, 2),
+        "ttfa_ms_p50": round(float(np.percentile(ttfa, 50)), 1) if ttfa.size else None,
+        "ttfa_ms_p99": round(float(np.percentile(ttfa, 99)), 1) if ttfa.size else None,
+        "ttfa_ms_max": round(float(ttfa.max()), 1) if ttfa.size else None,
+        "events_per_sec": round(sum(c.events for c in clients) / wall, 1),
+        "audio_events_per_sec": round(sum(c.audio_events for c in clients) / wall, 1),
+        "audio_kbytes_per_sec": round(sum(c.audio_bytes for c in clients) / wall / 1024, 1),
+        "server_cpu_pct": round(100.0 * (end_cpu - base_cpu) / wall, 1) if end_cpu is not None and base_cpu is not None else None,
+        "server_rss_mb": round(rss_peak / 2**20, 1) if rss_peak else None,
+        "errors": errors,
+    }
+    if report["server_cpu_pct"] is not None:
+        report["server_cpu_pct_per_session"] = round(report["server_cpu_pct"] / args.clients, 2)
+    if rss_peak and base_rss:
+        report["server_rss_mb_per_session"] = round((rss_peak - base_rss) / 2**20 / args.clients, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KANA end-to-end latency/throughput benchmark (fake Live backend)")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="fake model time to first audio")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--reply-sec", type=float, default=2.0)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--speed", type=float, default=2.0)
+    parser.add_argument("--pool", type=int, default=1, help="KANA_LIVE_POOL_SIZE for the server")
+    parser.add_argument("--idle-ms", type=float, default=500.0, help="audio gap that ends a turn")
+    parser.add_argument("--turn-timeout", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=0, help="use an already running server instead of starting one")
+    parser.add_argument("--server-log", action="store_true", help="show server output")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="exit 1 if p99 time-to-first-audio is above this")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = asyncio.run(bench(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"clients: {report['clients']}  turns: {report['turns']}  wall: {report['wall_sec']} s")
+        print(f"time to first audio: p50 {report['ttfa_ms_p50']} ms, p99 {report['ttfa_ms_p99']} ms, max {report['ttfa_ms_max']} ms"
+              f" (fake model latency {args.latency_ms:.0f} ± {args.jitter_ms:.0f} ms)")
+        print(f"throughput: {report['events_per_sec']} events/s, {report['audio_events_per_sec']} audio events/s,"
+              f" {report['audio_kbytes_per_sec']} KiB/s audio")
+        print(f"server: CPU {report['server_cpu_pct']}% ({report.get('server_cpu_pct_per_session')}% per session),"
+              f" RSS {report['server_rss_mb']} MiB ({report.get('server_rss_mb_per_session')} MiB per session)")
+        for err in report["errors"]:
+            print(f"error: {err}")
+
+    failed = bool(report["errors"]) or not report["turns"]
+    if args.max_p99_ms is not None and (report["ttfa_ms_p99"] is None or report["ttfa_ms_p99"] > args.max_p99_ms):
+        print(f"FAIL: p99 time to first audio above {args.max_p99_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
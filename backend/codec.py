@@ -0,0 +1,207 @@
+"""
+KANA — сжатие аудио ответа для клиентов socket.io на медленных каналах.
+
+Opus (если установлен opuslib и libopus), иначе IMA ADPCM (4 бита на отсчёт; только с audioop)
+или G.711 µ-law (8 бит), обычно на 16 кГц вместо 24 кГц PCM: 24 / 64 / 128 кбит/с против 384.
+Клиент перечисляет, что умеет декодировать (audio_codecs в start_audio); сервер выбирает первый доступный.
+"""
+import os
+import struct
+import warnings
+
+import numpy as np
+
+try:
+    import opuslib
+except Exception:  # нет пакета или libopus в системе
+    opuslib = None
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop  # ADPCM на C; в Python 3.13+ — пакет audioop-lts
+except ImportError:
+    audioop = None
+
+CODEC_RATE = int(os.getenv("KANA_CODEC_RATE", "16000"))
+OPUS_BITRATE = int(os.getenv("KANA_OPUS_BITRATE", "24000"))
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_FRAME_MS = (10, 20, 40, 60)
+
+# Заголовок кадра ADPCM: состояние декодера на начало кадра (предсказание, индекс шага).
+# Каждый кадр декодируется независимо — потерянный или сброшенный кадр не ломает следующие.
+ADPCM_HEADER = struct.Struct("<hBx")
+
+IMA_INDEX = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+IMA_STEPS = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55, 60, 66, 73, 80, 88, 97,
+    107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796,
+    876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871,
+    5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623,
+    27086, 29794, 32767,
+)
+
+
+class PcmCodec:
+    """Identity codec (int16 little-endian)."""
+
+    name = "pcm"
+    bits = 16
+
+    def __init__(self, rate):
+        self.rate = rate
+
+    def encode(self, pcm):
+        return bytes(pcm)
+
+    def decode(self, data):
+        return bytes(data)
+
+    def reset(self):
+        pass
+
+
+class UlawCodec(PcmCodec):
+    """G.711 µ-law, vectorized; stateless, one byte per sample, bit-exact with audioop.lin2ulaw."""
+
+    name = "ulaw"
+    bits = 8
+
+    def encode(self, pcm):
+        # Как audioop: 14 бит (сдвиг с округлением вниз, -1 -> -1), модуль, смещение 33; всё от 0x1FFF
+        # кодируется максимумом сегмента 7 (у audioop — ограничение 8159 и отдельная ветка)
+        x = np.frombuffer(pcm, dtype=np.int16).astype(np.int32) >> 2
+        mask = np.where(x < 0, 0x7F, 0xFF)
+        x = np.minimum(np.abs(x) + 33, 0x1FFF)
+        segment = np.frexp(x)[1] - 6  # старший бит 6..13 -> сегмент 0..7
+        ulaw = (segment << 4) | ((x >> (segment + 1)) & 0x0F)
+        return (ulaw ^ mask).astype(np.uint8).tobytes()
+
+    def decode(self, data):
+        u = ~np.frombuffer(data, dtype=np.uint8).astype(np.int32) & 0xFF
+        exponent = (u >> 4) & 0x07
+        x = (((u & 0x0F) << 3) + 0x84 << exponent) - 0x84
+        return np.where(u & 0x80, -x, x).astype(np.int16).tobytes()
+
+
+def _ima_decode(data, count, predicted, index):
+    """Pure-Python IMA ADPCM decoder (same bitstream as audioop.adpcm2lin) for clients without audioop."""
+    out = np.empty(count, dtype=np.int16)
+    for i in range(count):
+        code = data[i >> 1] >> 4 if not i & 1 else data[i >> 1] & 0x0F
+        step = IMA_STEPS[index]
+        delta = step >> 3
+        if code & 4:
+            delta += step
+        if code & 2:
+            delta += step >> 1
+        if code & 1:
+            delta += step >> 2
+        predicted = max(-32768, min(32767, predicted - delta if code & 8 else predicted + delta))
+        index = max(0, min(88, index + IMA_INDEX[code]))
+        out[i] = predicted
+    return out.tobytes()
+
+
+class AdpcmCodec(PcmCodec):
+    """IMA ADPCM, 4 bits per sample; every frame carries the decoder state it starts from.
+
+    Encoding needs audioop: IMA state depends on every previous sample, so it cannot be vectorized,
+    and a Python loop costs ~14 ms per second of audio per client on the event loop. Without
+    audioop the server does not offer ADPCM (see available()); decoding still works.
+    """
+
+    name = "adpcm"
+    bits = 4
+
+    def __init__(self, rate):
+        super().__init__(rate)
+        self.reset()
+
+    def reset(self):
+        self._predicted = 0
+        self._index = 0
+
+    def encode(self, pcm):
+        if len(pcm) % 4:
+            pcm = bytes(pcm) + bytes(4 - len(pcm) % 4)  # чётное число отсчётов — целые байты
+        header = ADPCM_HEADER.pack(self._predicted, self._index)
+        data, (self._predicted, self._index) = audioop.lin2adpcm(pcm, 2, (self._predicted, self._index))
+        return header + data
+
+    def decode(self, data):
+        predicted, index = ADPCM_HEADER.unpack_from(data)
+        body = bytes(data[ADPCM_HEADER.size:])
+        if audioop is not None:
+            return audioop.adpcm2lin(body, 2, (predicted, index))[0]
+        return _ima_decode(body, len(body) * 2, predicted, index)
+
+
+class OpusCodec(PcmCodec):
+    """Opus (VOIP profile) through opuslib; encode() takes exactly one 10-60 ms frame."""
+
+    name = "opus"
+    bits = None
+
+    def __init__(self, rate, bitrate=OPUS_BITRATE):
+        super().__init__(rate)
+        self.bitrate = bitrate
+        self.reset()
+
+    def reset(self):
+        self._encoder = opuslib.Encoder(self.rate, 1, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = self.bitrate
+        self._decoder = None
+
+    def encode(self, pcm):
+        samples = len(pcm) // 2
+        frame = next((self.rate * ms // 1000 for ms in OPUS_FRAME_MS if self.rate * ms // 1000 >= samples), None)
+        if frame is None:
+            raise ValueError(f"Opus frame too long: {samples} samples")
+        if samples < frame:
+            pcm = bytes(pcm) + bytes(2 * (frame - samples))  # хвост реплики добивается тишиной
+        return self._encoder.encode(bytes(pcm), frame)
+
+    def decode(self, data):
+        if self._decoder is None:
+            self._decoder = opuslib.Decoder(self.rate, 1)
+        return self._decoder.decode(bytes(data), self.rate * max(OPUS_FRAME_MS) // 1000)
+
+
+CODECS = {"opus": OpusCodec, "adpcm": AdpcmCodec, "ulaw": UlawCodec, "pcm": PcmCodec}
+
+
+def available():
+    """Codec names usable in this process, best compression first."""
+    missing = {"opus": opuslib is None, "adpcm": audioop is None}
+    return [name for name in CODECS if not missing.get(name)]
+
+
+def negotiate(requested):
+    """First codec of the client's list (a name or a list) that the server can encode; pcm otherwise."""
+    if isinstance(requested, str):
+        requested = [requested]
+    usable = available()
+    for name in requested or ():
+        name = str(name).lower()
+        if name in usable:
+            return name
+    return "pcm"
+
+
+def codec_rate(name, source_rate, requested=None):
+    """Sample rate of the compressed stream: pcm keeps the source rate, opus needs one of its own."""
+    if name == "pcm":
+        return source_rate
+    try:
+        rate = int(requested or CODEC_RATE)
+    except (TypeError, ValueError):
+        rate = CODEC_RATE
+    rate = max(8000, min(rate, source_rate))
+    if name == "opus":
+        rate = min(OPUS_RATES, key=lambda r: abs(r - rate))
+    return rate
+
+
+def create(name, rate):
+    return CODECS[name](rate)
@@ -0,0 +1,179 @@
+"""
+KANA — анимационные подсказки из транскрипции: один проход автомата Ахо — Корасик по дельтам
+User и KANA, совпадения через границы дельт, событие animation_cue раньше конца фразы.
+
+Ключи — русские и английские слова, фразы и основы; совпадение засчитывается только с начала слова,
+целые слова — только когда слово закончилось. Отрицание перед ключом («не», «not») снижает уверенность. Одна подсказка на категорию за ход.
+"""
+import os
+
+CUES_ENABLED = os.getenv("KANA_CUES", "1") != "0"
+NEGATION_FACTOR = 0.4
+
+# cue -> [(ключ, уверенность)]; cue — категория (dance) или группа клипов каталога анимаций.
+# Ключ со звёздочкой — основа (совпадает начало слова), без неё — слово или фраза целиком.
+CUE_KEYWORDS = {
+    "dance": [
+        ("танц*", 0.9), ("потанц*", 0.95), ("станц*", 0.95), ("пляс*", 0.85), ("пляш*", 0.9),
+        ("dance*", 0.9), ("dancing", 0.9),
+    ],
+    "action_greeting": [
+        ("привет*", 0.8), ("здравствуй*", 0.85), ("добрый день", 0.8), ("доброе утро", 0.8),
+        ("добрый вечер", 0.8), ("hello", 0.8), ("hi", 0.6), ("good morning", 0.8),
+    ],
+    "joy": [
+        ("рада", 0.7), ("рад", 0.6), ("ура", 0.8), ("здорово", 0.7), ("отлично", 0.6), ("класс", 0.6),
+        ("happy", 0.7), ("awesome", 0.7), ("yay", 0.8),
+    ],
+    "amusement": [("ха-ха*", 0.8), ("хаха*", 0.8), ("смешн*", 0.7), ("забавн*", 0.7), ("haha*", 0.8), ("funny", 0.7)],
+    "sadness": [("грустн*", 0.8), ("печальн*", 0.8), ("жаль", 0.6), ("sad", 0.7), ("unfortunately", 0.5)],
+    "anger": [("злюсь", 0.85), ("бесит", 0.85), ("сердит*", 0.7), ("angry", 0.8), ("annoying", 0.6)],
+    "surprise": [("ого", 0.7), ("ничего себе", 0.85), ("неожиданн*", 0.7), ("вау", 0.8), ("wow", 0.8), ("surpris*", 0.7)],
+    "fear": [("страшн*", 0.8), ("боюсь", 0.85), ("жутк*", 0.7), ("scary", 0.8), ("afraid", 0.8)],
+    "love": [("люблю", 0.8), ("обожаю", 0.8), ("love", 0.7), ("adore", 0.8)],
+    "gratitude": [("спасибо", 0.85), ("благодар*", 0.85), ("thank*", 0.85)],
+    "confusion": [("не понима*", 0.8), ("странно", 0.6), ("запута*", 0.7), ("confus*", 0.8), ("don't understand", 0.8)],
+    "curiosity": [("интересно", 0.7), ("любопытн*", 0.75), ("curious", 0.75), ("interesting", 0.6)],
+    "embarrassment": [("стыдно", 0.8), ("смущ*", 0.8), ("неловко", 0.75), ("embarrass*", 0.8)],
+    "disgust": [("фу", 0.6), ("отвратительн*", 0.85), ("мерзк*", 0.8), ("gross", 0.7), ("disgusting", 0.85)],
+    "pride": [("горжусь", 0.85), ("получилось", 0.6), ("proud", 0.8)],
+    "caring": [("не волнуйся", 0.8), ("береги себя", 0.85), ("take care", 0.8)],
+}
+NEGATIONS = ("не", "нет", "not", "no", "don't", "never", "ни")
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch in "-'"
+
+
+class CueAutomaton:
+    """Aho-Corasick automaton over lowercase keywords; built once and shared by all sessions."""
+
+    def __init__(self, keywords=CUE_KEYWORDS):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]  # узел -> [(длина ключа, cue, уверенность, только целое слово)]
+        for cue, entries in keywords.items():
+            for word, confidence in entries:
+                whole = not word.endswith("*")
+                word = word.rstrip("*").lower()
+                node = 0
+                for ch in word:
+                    nxt = self.goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(self.goto)
+                        self.goto[node][ch] = nxt
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.out.append([])
+                    node = nxt
+                self.out[node].append((len(word), cue, confidence, whole))
+        self.max_len = max((len(w) for entries in keywords.values() for w, _ in entries), default=0)
+        # Ссылки неудач в ширину; выходы узла дополняются выходами его суффиксной ссылки
+        queue = list(self.goto[0].values())
+        while queue:
+            node = queue.pop(0)
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if node else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def step(self, node, ch):
+        while node and ch not in self.goto[node]:
+            node = self.fail[node]
+        return self.goto[node].get(ch, 0)
+
+
+AUTOMATON = CueAutomaton()
+
+
+class CueStream:
+    """Streaming matcher for one speaker: automaton state, a short tail and whole-word matches
+    waiting for the next character survive across deltas."""
+
+    def __init__(self, automaton=AUTOMATON):
+        self.automaton = automaton
+        self.keep = automaton.max_len + 16
+        self.reset()
+
+    def reset(self):
+        self.node = 0
+        self.tail = " "  # последние символы: граница слова и отрицание перед ключом
+        self.pending = []
+
+    def feed(self, text):
+        """Return [(cue, keyword, confidence)] for keywords completed by this delta."""
+        found = []
+        a = self.automaton
+        tail = self.tail
+        for ch in text.lower():
+            if self.pending:
+                # Слово закончилось — целые слова подтверждаются, иначе это было начало другого слова
+                if not _is_word_char(ch):
+                    found.extend(self.pending)
+                self.pending = []
+            tail += ch
+            self.node = a.step(self.node, ch)
+            for length, cue, confidence, whole in a.out[self.node]:
+                before = tail[:-length]
+                if before and _is_word_char(before[-1]):
+                    continue  # ключ — середина слова
+                words = before.split()
+                if words and words[-1].strip(",.!?;:") in NEGATIONS:
+                    confidence *= NEGATION_FACTOR
+                match = (cue, tail[-length:], round(confidence, 2))
+                (self.pending if whole else found).append(match)
+        self.tail = tail[-self.keep:]
+        return found
+
+    def flush(self):
+        """End of the utterance: whole-word matches at the very end count."""
+        found, self.pending = self.pending, []
+        return found
+
+
+class CueEngine:
+    """Per-session analyzer: one stream per sender, at most one cue per (sender, cue) per turn."""
+
+    def __init__(self, on_cue, automaton=AUTOMATON):
+        self.on_cue = on_cue
+        self.automaton = automaton
+        self.streams = {}
+        self.turn = None
+        self._sent = set()
+        self.chars = 0
+        self.cues = 0
+
+    def feed(self, sender, text, turn, final=False):
+        """Match a transcription delta; `final` marks the end of the sender's text (typed input)."""
+        if turn != self.turn:
+            self.end_turn()
+            self.turn = turn
+        stream = self.streams.get(sender)
+        if stream is None:
+            stream = self.streams[sender] = CueStream(self.automaton)
+        self.chars += len(text)
+        self._emit(sender, stream.feed(text))
+        if final:
+            self._emit(sender, stream.flush())
+
+    def end_turn(self):
+        """Flush keywords that ended the turn's last delta and start matching afresh."""
+        for sender, stream in self.streams.items():
+            self._emit(sender, stream.flush())
+            stream.reset()
+        self._sent.clear()
+
+    def _emit(self, sender, matches):
+        for cue, keyword, confidence in matches:
+            if (sender, cue) in self._sent:
+                continue
+            self._sent.add((sender, cue))
+            self.cues += 1
+            self.on_cue({"turn": self.turn, "sender": sender, "cue": cue, "keyword": keyword, "confidence": confidence})
+
+    def stats(self):
+        return {"chars": self.chars, "cues": self.cues}
@@ -0,0 +1,233 @@
+"""
+KANA — реестр аудиоустройств: перечисляется один раз, общий для сервера и AssistantLoop.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import metrics
+
+RESCAN_INTERVAL_SEC = float(os.getenv("KANA_DEVICE_RESCAN_SEC", "5"))
+
+
+def fix_device_name(name):
+    """Fix mojibake: UTF-8 bytes wrongly decoded as cp1251 (Russian Windows) or cp1252."""
+    if not name or not isinstance(name, str):
+        return name or ""
+    for enc in ("cp1251", "cp1252", "cp866"):
+        try:
+            fixed = name.encode(enc).decode("utf-8")
+            if fixed != name and any("\u0400" <= c <= "\u04FF" for c in fixed):
+                return fixed
+            if fixed != name:
+                return fixed
+        except (UnicodeDecodeError, UnicodeEncodeError):
+            continue
+    return name
+
+
+def deduplicate_devices(devices, default_idx):
+    """Remove duplicates: merge devices where one name is prefix of another. Keep default or longest name.
+
+    Pairwise against the already kept names, in enumeration order: siblings sharing a root
+    ("Speakers (Realtek)", "Speakers (USB Audio)") stay separate. Device lists are short and
+    this runs once per (re)scan, so the quadratic scan costs nothing.
+    """
+    if not devices:
+        return []
+    result = []
+    for d in devices:
+        name = d["name"]
+        merged = False
+        for i, existing in enumerate(result):
+            ex_name = existing["name"]
+            if name == ex_name:
+                if d["index"] == default_idx:
+                    result[i] = d
+                merged = True
+                break
+            if name.startswith(ex_name) or ex_name.startswith(name):
+                keep = d if (d["index"] == default_idx or (existing["index"] != default_idx and len(name) >= len(ex_name))) else existing
+                result[i] = keep
+                merged = True
+                break
+        if not merged:
+            result.append(d)
+    result.sort(key=lambda x: (not x.get("default", False), x["name"]))
+    return result
+
+
+class DeviceRegistry:
+    """Cached PortAudio device list with name->index lookup.
+
+    PortAudio snapshots the device list when it is initialized, so a hot-plugged device only
+    shows up after the PyAudio host is re-created: refresh(rehost=True) calls `rehost` first
+    (it returns False and changes nothing while a device stream is open), and the watcher does
+    that periodically while the devices are idle. pya may be a PyAudio instance or a function
+    returning the shared one, so PortAudio is only initialized on the first enumeration.
+    Background rescans run in `executor` (the audio executor), or the default one when None.
+    """
+
+    def __init__(self, pya, rehost=None, executor=None):
+        self._pya = pya
+        self._rehost = rehost
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()  # пересоздание хоста и перечисление — не одновременно
+        self._snapshot = None
+        self._task = None
+        self.builds = 0
+        self.built_at = None
+        self.build_ms = None
+        self.rehosts = 0
+
+    @property
+    def pya(self):
+        return self._pya() if callable(self._pya) else self._pya
+
+    def _enumerate(self):
+        t0 = time.perf_counter()
+        pya = self.pya
+        try:
+            default_in_idx = pya.get_default_input_device_info().get("index", -1)
+        except Exception:
+            default_in_idx = -1
+        try:
+            default_out_idx = pya.get_default_output_device_info().get("index", -1)
+        except Exception:
+            default_out_idx = -1
+        count = pya.get_device_count()
+        inputs, outputs = [], []
+        by_name = {"input": {}, "output": {}}
+        raw_names = {}
+        for i in range(count):
+            try:
+                info = pya.get_device_info_by_index(i)
+            except Exception:
+                continue
+            raw = info.get("name", f"Device {i}")
+            name = fix_device_name(raw) or str(raw)
+            raw_names[i] = (name.lower(), str(raw).lower())
+            if info.get("maxInputChannels", 0) > 0:
+                inputs.append({"index": i, "name": name, "default": i == default_in_idx})
+                by_name["input"].setdefault(name.lower(), i)
+                by_name["input"].setdefault(str(raw).lower(), i)
+            if info.get("maxOutputChannels", 0) > 0:
+                outputs.append({"index": i, "name": name, "default": i == default_out_idx})
+                by_name["output"].setdefault(name.lower(), i)
+                by_name["output"].setdefault(str(raw).lower(), i)
+        return {
+            "count": count,
+            "default_input": default_in_idx if default_in_idx >= 0 else None,
+            "default_output": default_out_idx if default_out_idx >= 0 else None,
+            "inputs": deduplicate_devices(inputs, default_in_idx),
+            "outputs": deduplicate_devices(outputs, default_out_idx),
+            "all_inputs": [d["index"] for d in inputs],
+            "all_outputs": [d["index"] for d in outputs],
+            "by_name": by_name,
+            "names": raw_names,
+            "build_ms": (time.perf_counter() - t0) * 1000.0,
+        }
+
+    def refresh(self, rehost=False):
+        """Re-enumerate devices (blocking; run it in the audio executor from the event loop).
+
+        With rehost, PortAudio is re-initialized first when no device stream is open, so newly
+        plugged devices are found (with a stream open, the current host's list is returned).
+        """
+        with self._scan_lock:
+            if rehost and self._rehost is not None and self._rehost():
+                self.rehosts += 1
+            snapshot = self._enumerate()
+        with self._lock:
+            self._snapshot = snapshot
+            self.builds += 1
+            self.built_at = time.time()
+            self.build_ms = round(snapshot["build_ms"], 2)
+        return snapshot
+
+    def _rescan(self):
+        """Watcher step: re-create the host and re-enumerate; None while a device is in use."""
+        with self._scan_lock:
+            if not self._rehost():
+                return None
+            self.rehosts += 1
+        return self.refresh()
+
+    def snapshot(self):
+        snap = self._snapshot
+        if snap is None:
+            with self._lock:
+                snap = self._snapshot
+            if snap is None:
+                snap = self.refresh()
+        return snap
+
+    def listing(self):
+        snap = self.snapshot()
+        return {"inputs": snap["inputs"], "outputs": snap["outputs"]}
+
+    def _resolve(self, kind, name):
+        snap = self.snapshot()
+        key = name.lower()
+        index = snap["by_name"][kind].get(key)
+        if index is not None:
+            return index
+        # Как раньше: подстрока в имени устройства
+        for i in snap["all_inputs"] if kind == "input" else snap["all_outputs"]:
+            fixed, raw = snap["names"][i]
+            if key in fixed or key in raw:
+                return i
+        return None
+
+    def resolve_input(self, index=None, name=None):
+        """Index for the requested input: by name if it matches, else index, else the default."""
+        if name:
+            found = self._resolve("input", name)
+            if found is not None:
+                return found
+        if index is not None:
+            return index
+        return self.snapshot()["default_input"]
+
+    def resolve_output(self, index=None, name=None):
+        """Index for the requested output: explicit index wins, then name, else None (default device)."""
+        if index is not None:
+            return index
+        if name:
+            return self._resolve("output", name)
+        return None
+
+    async def watch(self, interval=RESCAN_INTERVAL_SEC):
+        """Background hot-plug rescan: re-create the host while no device is in use and compare."""
+        if self._rehost is None:
+            return  # без пересоздания хоста PortAudio новых устройств не покажет — опрос бесполезен
+        while True:
+            await asyncio.sleep(interval)
+            old = self._snapshot
+            if old is None:
+                continue  # устройства ещё никто не запрашивал — PortAudio не трогаем
+            try:
+                snap = await metrics.to_thread("device_scan", self._rescan, executor=self.executor)
+                if snap is not None and snap["names"] != old["names"]:
+                    print(f"[KANA] Audio devices changed ({old['count']} -> {snap['count']})")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[KANA] Device rescan failed: {e}")
+
+    def start_watcher(self, interval=RESCAN_INTERVAL_SEC):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.watch(interval))
+        return self._task
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            "builds": self.builds,
+            "built_at": self.built_at,
+            "build_ms": self.build_ms,
+            "count": snap["count"] if snap else None,
+            "rehosts": self.rehosts,
+        }
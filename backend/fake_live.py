@@ -0,0 +1,260 @@
+"""
+KANA — локальная замена Gemini Live API (KANA_LIVE_BACKEND=fake): без сети и ключа.
+
+Повторяет поверхность сессии google-genai, которой пользуется AssistantLoop: send, send_realtime_input,
+send_client_content и receive() (один ход — до turn_complete). Отвечает скриптованными транскрипциями
+и синтетическим PCM 24 кГц с настраиваемой задержкой, джиттером и «пачками» чанков; с модальностью
+TEXT в конфиге — потоком текстовых частей по слову. Со script (replay.py) вместо синтетики звучат
+записанные ходы модели — аудио и транскрипции со смещениями из записи.
+"""
+import asyncio
+import itertools
+import os
+import random
+
+import numpy as np
+from google.genai import types
+
+SAMPLE_RATE = 24000
+INPUT_SAMPLE_RATE = 16000
+
+CONNECT_MS = float(os.getenv("KANA_FAKE_LIVE_CONNECT_MS", "150"))
+LATENCY_MS = float(os.getenv("KANA_FAKE_LIVE_LATENCY_MS", "300"))
+JITTER_MS = float(os.getenv("KANA_FAKE_LIVE_JITTER_MS", "50"))
+REPLY_SEC = float(os.getenv("KANA_FAKE_LIVE_REPLY_SEC", "2.0"))
+CHUNK_MS = int(os.getenv("KANA_FAKE_LIVE_CHUNK_MS", "40"))
+BURST = int(os.getenv("KANA_FAKE_LIVE_BURST", "5"))  # чанков подряд без паузы
+SPEED = float(os.getenv("KANA_FAKE_LIVE_SPEED", "2.0"))  # во сколько раз быстрее реального времени
+UTTERANCE_SEC = float(os.getenv("KANA_FAKE_LIVE_UTTERANCE_SEC", "3.0"))  # аудио без audio_stream_end
+SEED = os.getenv("KANA_FAKE_LIVE_SEED")  # задан — джиттер задержки повторяется от прогона к прогону
+
+USER_PHRASES = (
+    "Привет, как дела?",
+    "Расскажи что-нибудь про Python.",
+    "Сколько будет два плюс два?",
+)
+REPLIES = (
+    "Привет! У меня всё отлично, я готова помогать.",
+    "Python — язык, в котором отступы решают всё.",
+    "Два плюс два — четыре, тут я уверена.",
+)
+
+_pcm_cache = {}
+
+
+def synth_speech(seconds, rate=SAMPLE_RATE):
+    """Speech-like int16 PCM: a few harmonics of a gliding pitch under a ~4 Hz syllable envelope."""
+    key = (round(seconds, 3), rate)
+    pcm = _pcm_cache.get(key)
+    if pcm is None:
+        t = np.arange(int(seconds * rate)) / rate
+        pitch = 190 + 25 * np.sin(2 * np.pi * 0.7 * t)
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        voice = np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.25 * np.sin(3 * phase)
+        envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) ** 0.5
+        pcm = _pcm_cache[key] = (voice * envelope * 6000).astype(np.int16).tobytes()
+    return pcm
+
+
+def _message(**content):
+    return types.LiveServerMessage(server_content=types.LiveServerContent(**content))
+
+
+def _text_message(text):
+    return _message(model_turn=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def _audio_message(chunk):
+    part = types.Part(inline_data=types.Blob(data=chunk, mime_type=f"audio/pcm;rate={SAMPLE_RATE}"))
+    return _message(model_turn=types.Content(role="model", parts=[part]))
+
+
+class FakeLiveSession:
+    """In-process stand-in for an AsyncSession of client.aio.live.connect().
+
+    A turn starts on text input with end_of_turn, on audio_stream_end after some audio, or once
+    utterance_sec of audio has streamed in. New input during a reply interrupts it (interrupted,
+    then turn_complete), like the server-side barge-in of the real API.
+
+    script replaces the synthetic replies: turn n plays script[n], a list of (offset_ms, kind, value)
+    with kind "audio" (PCM bytes), "input" or "output" (transcription text); offsets are divided
+    by speed, so speed=inf emits a whole turn at once. Turns past the script end empty.
+    """
+
+    def __init__(
+        self,
+        config=None,
+        latency_ms=LATENCY_MS,
+        jitter_ms=JITTER_MS,
+        reply_sec=REPLY_SEC,
+        chunk_ms=CHUNK_MS,
+        burst=BURST,
+        speed=SPEED,
+        utterance_sec=UTTERANCE_SEC,
+        seed=SEED,
+        script=None,
+    ):
+        self.config = config
+        modalities = getattr(config, "response_modalities", None) or ()
+        self.text_only = any(str(getattr(m, "value", m)).upper() == "TEXT" for m in modalities)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.reply_sec = reply_sec
+        self.chunk_bytes = max(2, SAMPLE_RATE * chunk_ms // 1000 * 2)
+        self.burst = max(1, burst)
+        self.speed = max(0.01, speed)
+        self.utterance_bytes = int(utterance_sec * INPUT_SAMPLE_RATE * 2)
+        self._random = random.Random(seed)
+        self.script = script
+        self._outbox = asyncio.Queue()
+        self._reply = None
+        self._audio_bytes = 0
+        self._closed = False
+        self._handles = itertools.count(1)
+
+        self.turns = 0
+        self.received_audio_bytes = 0
+        self.sent_audio_bytes = 0
+
+    # --- клиент -> «сервер» ---
+
+    async def send(self, input=None, end_of_turn=False):
+        if isinstance(input, dict) and "data" in input:
+            self._on_audio(input["data"])
+        elif isinstance(input, str) and input and end_of_turn:
+            self._start_turn(None)
+
+    async def send_realtime_input(self, audio=None, audio_stream_end=None, text=None, **kwargs):
+        if audio is not None:
+            self._on_audio(getattr(audio, "data", audio))
+        if text:
+            self._start_turn(None)
+        if audio_stream_end:
+            self._on_stream_end()
+
+    async def send_client_content(self, turns=None, turn_complete=True):
+        if turn_complete:
+            self._start_turn(None)
+
+    def _on_audio(self, data):
+        n = len(data or b"")
+        self.received_audio_bytes += n
+        self._audio_bytes += n
+        if self.utterance_bytes and self._audio_bytes >= self.utterance_bytes:
+            self._on_stream_end()
+
+    def _on_stream_end(self):
+        if self._audio_bytes:
+            self._audio_bytes = 0
+            self._start_turn(USER_PHRASES[self.turns % len(USER_PHRASES)])
+
+    def _start_turn(self, user_text):
+        if self._closed:
+            return
+        if self._reply and not self._reply.done():
+            self._reply.cancel()
+            self._outbox.put_nowait(_message(interrupted=True))
+            self._outbox.put_nowait(_message(turn_complete=True))
+        self._reply = asyncio.create_task(self._respond(self.turns, user_text))
+        self.turns += 1
+
+    # --- «сервер» -> клиент ---
+
+    async def _respond(self, n, user_text):
+        if self.script is not None:
+            await self._scripted(n)
+        else:
+            await self._synthesized(n, user_text)
+        put = self._outbox.put_nowait
+        put(_message(generation_complete=True))
+        put(_message(turn_complete=True))
+        put(types.LiveServerMessage(
+            session_resumption_update=types.LiveServerSessionResumptionUpdate(
+                new_handle=f"fake-{next(self._handles)}", resumable=True
+            )
+        ))
+
+    async def _scripted(self, n):
+        put = self._outbox.put_nowait
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for offset_ms, kind, value in self.script[n] if n < len(self.script) else ():
+            delay = started + offset_ms / 1000.0 / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if kind == "audio":
+                put(_audio_message(value))
+                self.sent_audio_bytes += len(value)
+            elif kind == "input":
+                put(_message(input_transcription=types.Transcription(text=value)))
+            elif self.text_only:
+                put(_text_message(value))
+            else:
+                put(_message(output_transcription=types.Transcription(text=value)))
+
+    async def _synthesized(self, n, user_text):
+        put = self._outbox.put_nowait
+        if user_text:
+            for word in user_text.split():
+                put(_message(input_transcription=types.Transcription(text=word + " ")))
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000.0)
+
+        words = REPLIES[n % len(REPLIES)].split()
+        if self.text_only:
+            # Дельты текста с темпом речи (как транскрипция ответа)
+            for word in words:
+                put(_text_message(word + " "))
+                await asyncio.sleep(self.reply_sec / len(words) / self.speed)
+        else:
+            pcm = synth_speech(self.reply_sec)
+            chunks = [pcm[i:i + self.chunk_bytes] for i in range(0, len(pcm), self.chunk_bytes)]
+            burst_sec = self.burst * self.chunk_bytes / 2 / SAMPLE_RATE / self.speed
+            for i, chunk in enumerate(chunks):
+                put(_audio_message(chunk))
+                self.sent_audio_bytes += len(chunk)
+                # Транскрипция ответа равномерно «размазана» по аудио
+                w0, w1 = len(words) * i // len(chunks), len(words) * (i + 1) // len(chunks)
+                if w1 > w0:
+                    put(_message(output_transcription=types.Transcription(text=" ".join(words[w0:w1]) + " ")))
+                if (i + 1) % self.burst == 0:
+                    await asyncio.sleep(burst_sec)
+
+    async def receive(self):
+        """Yield server messages of one turn, up to and including turn_complete."""
+        while True:
+            msg = await self._outbox.get()
+            if msg is None:
+                raise ConnectionError("fake Live session closed")
+            yield msg
+            if msg.server_content and msg.server_content.turn_complete:
+                return
+
+    async def close(self):
+        self._closed = True
+        if self._reply and not self._reply.done():
+            self._reply.cancel()
+        self._outbox.put_nowait(None)
+
+
+class _FakeConnect:
+    def __init__(self, config, connect_ms, options):
+        self.config = config
+        self.connect_ms = connect_ms
+        self.options = options
+        self.session = None
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.connect_ms / 1000.0)
+        self.session = FakeLiveSession(self.config, **self.options)
+        return self.session
+
+    async def __aexit__(self, *exc):
+        if self.session:
+            await self.session.close()
+        return False
+
+
+def connect(model=None, config=None, connect_ms=CONNECT_MS, **options):
+    """Drop-in for client.aio.live.connect(model=..., config=...)."""
+    return _FakeConnect(config, connect_ms, options)
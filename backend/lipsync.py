@@ -0,0 +1,137 @@
+"""
+KANA — lip-sync на сервере: огибающая громкости и грубые веса визем (aa/ih/ou/ee/oh) из энергий
+полос спектра, кадры фиксированной частоты (KANA_LIPSYNC_FPS, 30 Гц) по времени воспроизведения.
+
+Клиенту, которому нужен только аватар, PCM не нужен вовсе: событие lipsync — десятки байт
+вместо ~48 КБ/с аудио. KANA_LIPSYNC=0 — выключить; KANA_LIPSYNC_OFFSET_MS — сдвиг под задержку вывода.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+LIPSYNC_ENABLED = os.getenv("KANA_LIPSYNC", "1") != "0"
+LIPSYNC_FPS = int(os.getenv("KANA_LIPSYNC_FPS", "30"))
+LIPSYNC_OFFSET_MS = float(os.getenv("KANA_LIPSYNC_OFFSET_MS", "0"))
+LEVEL_GAIN = 4.0  # как прежний расчёт на фронтенде: min(1, rms * 4)
+MAX_QUEUED_SEC = 30.0
+
+VISEMES = ("aa", "ih", "ou", "ee", "oh")
+# Полосы: низкая F1, F1 открытых гласных, F2 задних, F2 передних, F3 и шипящие (F0 — ниже первой)
+BANDS_HZ = ((200, 450), (450, 900), (900, 1600), (1600, 2600), (2600, 4500))
+# Вклад долей полос в каждую визему (строки — VISEMES); отрицательные веса — «этой полосы быть не должно»
+VISEME_BANDS = np.array([
+    [-0.4, 0.7, 0.8, -0.2, 0.0],  # aa: высокая F1, средняя F2
+    [-0.2, 0.0, 0.0, 0.9, 0.6],  # ih: высокие F2/F3
+    [1.0, 0.2, -0.5, -1.0, -0.6],  # ou: низкие F1 и F2
+    [0.3, -0.3, -0.2, 1.0, 0.2],  # ee: низкая F1, высокая F2
+    [0.1, 1.0, -0.2, -0.7, -0.3],  # oh: средняя F1, низкая F2
+], dtype=np.float32)
+
+
+class LipSyncAnalyzer:
+    """Splits PCM into hop-sized frames and returns [level, aa, ih, ou, ee, oh] rows, vectorized per chunk."""
+
+    def __init__(self, rate, fps=LIPSYNC_FPS):
+        self.rate = rate
+        self.hop = rate // fps
+        self.window = np.hanning(self.hop).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.hop, 1.0 / rate)
+        self.bands = np.stack([(freqs >= lo) & (freqs < hi) for lo, hi in BANDS_HZ]).astype(np.float32)
+        self._carry = np.empty(0, dtype=np.int16)
+
+    @property
+    def carried_sec(self):
+        return self._carry.size / self.rate
+
+    def reset(self):
+        self._carry = np.empty(0, dtype=np.int16)
+
+    def push(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        if self._carry.size:
+            samples = np.concatenate((self._carry, samples))
+        n = samples.size // self.hop
+        self._carry = samples[n * self.hop:].copy()
+        if not n:
+            return np.empty((0, 1 + len(VISEMES)), dtype=np.float32)
+        frames = samples[:n * self.hop].reshape(n, self.hop).astype(np.float32) / 32768.0
+        level = np.minimum(1.0, np.sqrt(np.mean(frames * frames, axis=1)) * LEVEL_GAIN)
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        # Доли по амплитуде, а не по мощности: слабая F2 иначе теряется на фоне F1
+        amplitude = np.sqrt(spectrum @ self.bands.T)
+        shares = amplitude / np.maximum(amplitude.sum(axis=1, keepdims=True), 1e-12)
+        # Квадрат заостряет выбор, сумма весов визем — уровень открытия рта
+        weights = np.maximum(shares @ VISEME_BANDS.T, 0.0) ** 2
+        weights *= (level / np.maximum(weights.sum(axis=1), 1e-12))[:, None]
+        return np.column_stack((level, weights))
+
+
+class LipSync:
+    """Schedules analyzed frames at their playback time and yields them at a fixed rate."""
+
+    def __init__(self, rate, fps=LIPSYNC_FPS, offset_ms=LIPSYNC_OFFSET_MS):
+        self.analyzer = LipSyncAnalyzer(rate, fps)
+        self.period = 1.0 / fps
+        self.offset = offset_ms / 1000.0
+        self._frames = deque()  # (due, row)
+        self._wakeup = asyncio.Event()
+        self._open = False  # последним ушёл ненулевой кадр — после речи закрываем рот
+        self.seq = 0
+        self.emitted = 0
+        self.skipped = 0
+
+    def push(self, pcm, starts_in=0.0):
+        """Analyze a chunk whose first sample plays `starts_in` seconds from now."""
+        base = time.monotonic() + starts_in + self.offset - self.analyzer.carried_sec
+        rows = self.analyzer.push(pcm)
+        for i, row in enumerate(rows):
+            self._frames.append((base + i * self.period, row))
+        while self._frames and self._frames[-1][0] - self._frames[0][0] > MAX_QUEUED_SEC:
+            self._frames.popleft()
+            self.skipped += 1
+        self._wakeup.set()
+
+    def flush(self):
+        """Barge-in: drop everything not yet shown."""
+        self._frames.clear()
+        self.analyzer.reset()
+        self._wakeup.set()
+
+    def _payload(self, row):
+        self.seq += 1
+        self.emitted += 1
+        return {"seq": self.seq, "level": round(float(row[0]), 3), "visemes": [round(float(v), 3) for v in row[1:]]}
+
+    async def frames(self):
+        """Yield lipsync payloads when they are due; one closing zero frame after speech ends."""
+        zero = np.zeros(1 + len(VISEMES), dtype=np.float32)
+        while True:
+            if not self._frames:
+                if self._open:
+                    self._open = False
+                    yield self._payload(zero)
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            due, row = self._frames[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._frames.popleft()
+            # Опоздали больше чем на кадр — показываем только последний наступивший
+            if self._frames and self._frames[0][0] <= time.monotonic():
+                self.skipped += 1
+                continue
+            self._open = row[0] > 0
+            yield self._payload(row)
+
+    def stats(self):
+        return {"emitted": self.emitted, "skipped": self.skipped, "queued": len(self._frames)}
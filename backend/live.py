@@ -0,0 +1,261 @@
+"""
+KANA — подключение к Gemini Live: пул заранее открытых сессий, возобновление по handle,
+экспоненциальная задержка с джиттером между переподключениями.
+
+Бэкенд выбирается KANA_LIVE_BACKEND: gemini (по умолчанию) или fake — локальная замена
+Live API без сети и ключа (см. fake_live.py), для нагрузочных тестов и бенчмарков.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+
+from websockets.exceptions import ConnectionClosed
+
+import metrics
+
+BACKEND = os.getenv("KANA_LIVE_BACKEND", "gemini").strip().lower()
+FAKE_OPTIONS = {}  # аргументы FakeLiveSession для бэкенда fake (replay.py: seed и записанные ответы)
+POOL_SIZE = int(os.getenv("KANA_LIVE_POOL_SIZE", "1"))
+POOL_MAX_AGE_SEC = float(os.getenv("KANA_LIVE_POOL_MAX_AGE_SEC", "300"))
+BACKOFF_BASE_SEC = 0.5
+BACKOFF_MAX_SEC = 30.0
+# Коды закрытия WebSocket, после которых сессию имеет смысл возобновить по handle
+CLOSE_CODES = (1000, 1001, 1006, 1011)
+
+
+def _gemini_connect(client, model, config):
+    return client.aio.live.connect(model=model, config=config)
+
+
+def _fake_connect(client, model, config):
+    import fake_live
+    return fake_live.connect(model=model, config=config, **FAKE_OPTIONS)
+
+
+# name -> connect(client, model, config), returning an async context manager that yields a session
+BACKENDS = {"gemini": _gemini_connect, "fake": _fake_connect}
+
+
+def needs_api_key():
+    """Only the real Gemini backend needs GEMINI_API_KEY."""
+    return BACKEND == "gemini"
+
+
+def connect(client, model, config):
+    try:
+        backend = BACKENDS[BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown KANA_LIVE_BACKEND: {BACKEND!r} (expected one of {', '.join(BACKENDS)})") from None
+    return backend(client, model, config)
+
+
+def with_resumption(config, handle=None):
+    """Copy of the LiveConnectConfig with session resumption enabled (and a handle, if any)."""
+    from google.genai import types
+    return config.model_copy(update={"session_resumption": types.SessionResumptionConfig(handle=handle)})
+
+
+def connection_closed(exc):
+    """True when exc means the Live WebSocket dropped (resume by handle rather than report).
+
+    google-genai re-raises ConnectionClosed from session.receive() as errors.APIError carrying the
+    close code, so both forms are recognised.
+    """
+    if isinstance(exc, ConnectionClosed):
+        return True
+    if BACKEND != "gemini":
+        return False
+    from google.genai import errors
+    return isinstance(exc, errors.APIError) and exc.code in CLOSE_CODES
+
+
+def session_alive(session):
+    """Best-effort liveness of an idle session: its WebSocket (or the fake session) is still open."""
+    if getattr(session, "_closed", False):
+        return False
+    state = getattr(getattr(session, "_ws", None), "state", None)
+    return state is None or state.name == "OPEN"
+
+
+class Backoff:
+    """Exponential backoff with full jitter."""
+
+    def __init__(self, base=BACKOFF_BASE_SEC, cap=BACKOFF_MAX_SEC):
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next(self):
+        delay = random.uniform(0, min(self.cap, self.base * (2 ** self.attempt)))
+        self.attempt += 1
+        return delay
+
+    def reset(self):
+        self.attempt = 0
+
+
+class LiveStats:
+    """Connect-time and resumption counters (process-wide)."""
+
+    def __init__(self, keep=200):
+        self.connects = 0
+        self.connect_failures = 0
+        self.connect_ms = deque(maxlen=keep)
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.resume_attempts = 0
+        self.resume_successes = 0
+
+    def record_connect(self, ms):
+        self.connects += 1
+        self.connect_ms.append(ms)
+
+    def record_resume(self, ok):
+        self.resume_attempts += 1
+        if ok:
+            self.resume_successes += 1
+        RESUMES.inc(result="ok" if ok else "failed")
+
+    def snapshot(self):
+        ms = sorted(self.connect_ms)
+        return {
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "connect_ms_avg": round(sum(ms) / len(ms), 1) if ms else None,
+            "connect_ms_p50": round(ms[len(ms) // 2], 1) if ms else None,
+            "connect_ms_max": round(ms[-1], 1) if ms else None,
+            "pool_hits": self.pool_hits,
+            "pool_misses": self.pool_misses,
+            "resume_attempts": self.resume_attempts,
+            "resume_successes": self.resume_successes,
+            "resume_success_rate": round(self.resume_successes / self.resume_attempts, 3) if self.resume_attempts else None,
+        }
+
+
+stats = LiveStats()
+
+CONNECT_SECONDS = metrics.REGISTRY.histogram(
+    "kana_live_connect_seconds", "Gemini Live connect (handshake) time", ("resumed",)
+)
+RESUMES = metrics.REGISTRY.counter("kana_live_resume_total", "Session resumption attempts", ("result",))
+POOL_CLAIMS = metrics.REGISTRY.counter("kana_live_pool_claims_total", "Warm session pool claims", ("result",))
+
+
+class LiveConnection:
+    """An open Live session together with the context manager that owns it."""
+
+    def __init__(self, cm, session, connect_ms, resumed=False):
+        self._cm = cm
+        self.session = session
+        self.connect_ms = connect_ms
+        self.resumed = resumed
+        self.opened_at = time.monotonic()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.opened_at
+
+    @property
+    def alive(self):
+        return self._cm is not None and session_alive(self.session)
+
+    async def close(self):
+        cm, self._cm = self._cm, None
+        if cm is not None:
+            try:
+                await cm.__aexit__(None, None, None)
+            except Exception as e:
+                print(f"[KANA] Live session close: {e}")
+
+
+async def open_session(client, model, config, timeout):
+    """Connect to the Live backend and return a LiveConnection; raises asyncio.TimeoutError on timeout."""
+    t0 = time.perf_counter()
+    cm = connect(client, model, config)
+    try:
+        session = await asyncio.wait_for(cm.__aenter__(), timeout=timeout)
+    except BaseException:
+        stats.connect_failures += 1
+        raise
+    ms = (time.perf_counter() - t0) * 1000.0
+    stats.record_connect(ms)
+    resumed = bool(getattr(getattr(config, "session_resumption", None), "handle", None))
+    CONNECT_SECONDS.observe(ms / 1000.0, resumed="yes" if resumed else "no")
+    return LiveConnection(cm, session, ms, resumed=resumed)
+
+
+class LiveSessionPool:
+    """Keeps a few idle, already-connected sessions that start_audio can claim immediately.
+
+    Idle sessions older than max_age are replaced in the background so the server does not
+    close them under a new user; claim() also skips sessions whose connection already closed.
+    """
+
+    def __init__(self, factory, size=POOL_SIZE, max_age=POOL_MAX_AGE_SEC):
+        self.factory = factory
+        self.size = size
+        self.max_age = max_age
+        self._idle = deque()
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._backoff = Backoff(base=1.0, cap=60.0)
+
+    def claim(self):
+        """Take a warm session without waiting; None when the pool is empty."""
+        while self._idle:
+            conn = self._idle.popleft()
+            self._wakeup.set()
+            # Простаивающую сессию сервер мог закрыть (GoAway, таймаут простоя) — такую не выдаём
+            if conn.age < self.max_age and conn.alive:
+                stats.pool_hits += 1
+                POOL_CLAIMS.inc(result="hit")
+                return conn
+            asyncio.create_task(conn.close())
+        stats.pool_misses += 1
+        POOL_CLAIMS.inc(result="miss")
+        self._wakeup.set()
+        return None
+
+    async def _maintain(self):
+        while True:
+            # Выбрасываем старые сессии, добираем до размера пула
+            while self._idle and (self._idle[0].age >= self.max_age or not self._idle[0].alive):
+                await self._idle.popleft().close()
+            if len(self._idle) < self.size:
+                try:
+                    self._idle.append(await self.factory())
+                    self._backoff.reset()
+                    continue
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[KANA] Live pool connect failed: {e}")
+                    await asyncio.sleep(self._backoff.next())
+                    continue
+            self._wakeup.clear()
+            oldest = self._idle[0].age if self._idle else 0
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(1.0, self.max_age - oldest))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.size > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._maintain())
+        return self
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        while self._idle:
+            await self._idle.popleft().close()
+
+    def snapshot(self):
+        return {"size": self.size, "idle": len(self._idle), "max_age_sec": self.max_age}
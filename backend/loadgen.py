@@ -0,0 +1,591 @@
+"""
+KANA — генератор нагрузки и soak-тест: N клиентов socket.io гоняют сценарий (start_audio, user_input,
+pause_audio, resume_audio, stop_audio) по кругу минуты или часы, часть из них — медленные потребители.
+
+Медленный клиент подключается через локальный прокси, который отдаёт ему данные сервера не быстрее
+--slow-kbps (и может «замирать» на --slow-stall-sec): сервер упирается в настоящий TCP-backpressure,
+как с вкладкой на плохом канале. Раз в --sample-sec снимаются RSS и CPU сервера (/proc, если сервер
+запущен здесь), число задач и лаг цикла событий (/status), задержки событий у клиентов; временной ряд —
+в --timeline (JSON Lines), итог — в --report, --compare сравнивает итог с отчётом другой сборки.
+
+    python loadgen.py --clients 20 --slow 4 --duration 3600 --report soak.json
+    python loadgen.py --url http://127.0.0.1:8000 --script "start; say; pause; wait 2; resume; say; stop"
+    python loadgen.py --clients 20 --duration 3600 --compare soak.json
+
+Шаги сценария (через «;» или по строке в файле @путь): start, say [текст], text [текст] — ввод без
+ожидания ответа, pause, resume, stop, wait <сек>. Без --url сервер поднимается на fake-бэкенде Live.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import aiohttp
+import numpy as np
+import socketio
+
+from bench_e2e import free_port, proc_usage, start_server, wait_ready
+from transport import FRAME_HEADER
+
+DEFAULT_SCRIPT = "start; say; say; pause; wait 1; resume; say; stop; wait 1"
+RESERVOIR_SIZE = 20000
+ERRORS_KEPT = 50
+GRACE_SEC = 5.0  # незаконченный ход медленного клиента не растягивает прогон дольше
+ACKS = {"start": "KANA Started", "pause": "Audio Paused", "resume": "Audio Resumed", "stop": "KANA Stopped"}
+
+
+def parse_script(text):
+    """'start; say Привет; wait 2' (or @file with one step per line) -> [(op, arg)]."""
+    if text.startswith("@"):
+        with open(text[1:], encoding="utf-8") as f:
+            text = ";".join(line for line in f.read().splitlines() if line.strip() and not line.lstrip().startswith("#"))
+    steps = []
+    for part in text.split(";"):
+        op, _, arg = part.strip().partition(" ")
+        op = op.lower()
+        if not op:
+            continue
+        if op not in ("start", "say", "text", "pause", "resume", "stop", "wait"):
+            raise ValueError(f"unknown script step: {op}")
+        if op == "wait":
+            arg = float(arg)
+        steps.append((op, arg.strip() if isinstance(arg, str) else arg))
+    if not steps:
+        raise ValueError("empty script")
+    return steps
+
+
+class Reservoir:
+    """Bounded sample of a long stream (algorithm R) plus exact count and max, for hours-long runs."""
+
+    def __init__(self, size=RESERVOIR_SIZE):
+        self.size = size
+        self.values = []
+        self.count = 0
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            i = random.randrange(self.count)
+            if i < self.size:
+                self.values[i] = value
+
+    def summary(self):
+        if not self.values:
+            return None
+        arr = np.array(self.values)
+        return {
+            "p50": round(float(np.percentile(arr, 50)), 1),
+            "p99": round(float(np.percentile(arr, 99)), 1),
+            "max": round(float(self.max), 1),
+            "count": self.count,
+        }
+
+
+class ClassStats:
+    """Latencies and volumes of one client class (normal or slow), over the run and the current window."""
+
+    def __init__(self):
+        self.ttfa = Reservoir()
+        self.frame_lag = Reservoir()
+        self.ack = Reservoir()
+        self.window_ttfa = []
+        self.window_lag = []
+        self.events = 0
+        self.audio_events = 0
+        self.audio_bytes = 0
+        self.turns = 0
+        self.steps = 0
+
+    def take_window(self):
+        ttfa, lag = self.window_ttfa, self.window_lag
+        self.window_ttfa, self.window_lag = [], []
+        return {
+            "ttfa_p99_ms": round(float(np.percentile(ttfa, 99)), 1) if ttfa else None,
+            "frame_lag_p99_ms": round(float(np.percentile(lag, 99)), 1) if lag else None,
+        }
+
+    def summary(self, wall):
+        return {
+            "turns": self.turns,
+            "steps": self.steps,
+            "ttfa_ms": self.ttfa.summary(),
+            "frame_lag_ms": self.frame_lag.summary(),
+            "ack_ms": self.ack.summary(),
+            "events_per_sec": round(self.events / wall, 1),
+            "audio_events_per_sec": round(self.audio_events / wall, 1),
+            "audio_kbytes_per_sec": round(self.audio_bytes / wall / 1024, 1),
+        }
+
+
+class ThrottledProxy:
+    """TCP proxy that forwards server -> client at most kbps (optionally freezing periodically).
+
+    The proxy stops reading from the server while it waits, so the server's socket buffer fills
+    and its outbound queue sees a genuinely slow client. Client -> server is not throttled.
+    """
+
+    def __init__(self, target_port, kbps, stall_every=0.0, stall_sec=0.0, host="127.0.0.1"):
+        self.host = host
+        self.target_port = target_port
+        self.rate = kbps * 1000 / 8
+        self.stall_every = stall_every
+        self.stall_sec = stall_sec
+        self.port = None
+        self._server = None
+        self._conns = {}  # задача-обработчик -> сокеты обеих сторон
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def _handle(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(self.host, self.target_port)
+        except OSError:
+            client_writer.close()
+            return
+        self._conns[asyncio.current_task()] = (client_writer, server_writer)
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer, throttle=False),
+            self._pipe(server_reader, client_writer, throttle=True),
+            return_exceptions=True,
+        )
+        self._conns.pop(asyncio.current_task(), None)
+
+    async def _pipe(self, reader, writer, throttle):
+        chunk = max(512, int(self.rate / 20)) if throttle else 65536  # ~50 мс трафика за раз
+        next_stall = time.monotonic() + self.stall_every if self.stall_every else None
+        try:
+            while True:
+                data = await reader.read(chunk)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+                if throttle and self.rate:
+                    await asyncio.sleep(len(data) / self.rate)
+                    if next_stall and time.monotonic() >= next_stall:
+                        await asyncio.sleep(self.stall_sec)
+                        next_stall = time.monotonic() + self.stall_every
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def release(self):
+        """Stop throttling: the slow clients drain what is left and can disconnect at the end of the run."""
+        self.rate = None
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            for writers in list(self._conns.values()):
+                for writer in writers:
+                    writer.close()
+            await asyncio.gather(*self._conns, return_exceptions=True)
+            await self._server.wait_closed()
+
+
+class LoadClient:
+    """One simulated frontend that repeats the script until the deadline, reconnecting after failures."""
+
+    def __init__(self, index, url, script, args, stats, errors, slow=False):
+        self.index = index
+        self.url = url
+        self.script = script
+        self.args = args
+        self.stats = stats
+        self.errors = errors
+        self.slow = slow
+        self.sio = None
+        self.connected = False
+        self.hard_deadline = None
+        self._status = asyncio.Queue()
+        self._audio = asyncio.Event()
+        self._last_audio = 0.0
+        self._first_audio = 0.0
+        self._turn_lag = 0.0  # задержка первого кадра текущего хода
+
+    def _new_client(self):
+        sio = socketio.AsyncClient(reconnection=False)
+
+        @sio.on("*")
+        async def any_event(event, data=None):
+            self._on_event(event, data)
+
+        @sio.event
+        async def disconnect(*_):
+            self.connected = False
+
+        return sio
+
+    def _on_event(self, event, data):
+        stats = self.stats
+        stats.events += 1
+        if event == "audio_data":
+            now = time.perf_counter()
+            stats.audio_events += 1
+            if isinstance(data, (bytes, bytearray)):
+                stats.audio_bytes += len(data) - FRAME_HEADER.size
+                if len(data) >= FRAME_HEADER.size:
+                    # Метка кадра — время сервера, когда пришло начало ответа, плюс длительность аудио до
+                    # кадра (часы одной машины). Модель отдаёт ответ быстрее реального времени, поэтому
+                    # разница отрицательна у кадров, ушедших с опережением: считаем задержку первого кадра
+                    # хода плюс только отставание от воспроизведения, начатого с него
+                    lag = time.time() * 1000.0 - FRAME_HEADER.unpack_from(data)[2]
+                    if not self._audio.is_set():
+                        self._turn_lag = lag
+                    lag = max(lag, self._turn_lag)
+                    stats.frame_lag.add(lag)
+                    stats.window_lag.append(lag)
+            else:
+                stats.audio_bytes += len((data or {}).get("data", []))
+            self._last_audio = now
+            if not self._audio.is_set():
+                self._first_audio = now
+                self._audio.set()
+        elif event == "status":
+            self._status.put_nowait(((data or {}).get("msg"), time.perf_counter()))
+        elif event == "error":
+            self._error((data or {}).get("msg"))
+
+    def _timeout(self):
+        """Wait limit for a reply: turn_timeout, but never past the end of the run plus GRACE_SEC."""
+        return max(0.1, min(self.args.turn_timeout, self.hard_deadline - time.monotonic()))
+
+    def _error(self, message):
+        self.errors["count"] += 1
+        if len(self.errors["messages"]) < ERRORS_KEPT:
+            self.errors["messages"].append(f"client {self.index}: {message}")
+
+    async def _expect(self, msg, t0):
+        """Wait for the status acknowledging a control event; returns its round trip in ms."""
+        deadline = time.perf_counter() + self._timeout()
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            got, at = await asyncio.wait_for(self._status.get(), timeout=remaining)
+            if got == msg:
+                return (at - t0) * 1000.0
+
+    async def _control(self, op, event, payload=None):
+        while not self._status.empty():
+            self._status.get_nowait()
+        t0 = time.perf_counter()
+        await self.sio.emit(event, payload)
+        rtt = await self._expect(ACKS[op], t0)
+        if op != "start":
+            self.stats.ack.add(rtt)
+
+    async def _say(self, text):
+        self._audio.clear()
+        t0 = time.perf_counter()
+        await self.sio.emit("user_input", {"text": text})
+        await asyncio.wait_for(self._audio.wait(), timeout=self._timeout())
+        ttfa = (self._first_audio - t0) * 1000.0
+        self.stats.ttfa.add(ttfa)
+        self.stats.window_ttfa.append(ttfa)
+        self.stats.turns += 1
+        # Конец ответа — пауза в аудио дольше idle_ms (медленный клиент дочитывает дольше)
+        deadline = time.perf_counter() + self._timeout()
+        while time.perf_counter() - self._last_audio < self.args.idle_ms / 1000.0 and time.perf_counter() < deadline:
+            await asyncio.sleep(self.args.idle_ms / 4000.0)
+
+    async def _step(self, op, arg, n):
+        if op == "start":
+            await self._control(op, "start_audio", {
+                "audio_transport": self.args.transport,
+                "audio_codecs": self.args.codecs,
+                "audio_ack": self.args.ack,  # python-socketio подтверждает кадры сам, если сервер просит
+                "vad": False,
+                "muted": True,
+                "audio_input": "null",
+                "audio_output": "browser",
+            })
+        elif op == "say":
+            await self._say(arg or f"Вопрос {n} от клиента {self.index}")
+        elif op == "text":
+            await self.sio.emit("user_input", {"text": arg or f"Сообщение {n} от клиента {self.index}"})
+        elif op == "pause":
+            await self._control(op, "pause_audio")
+        elif op == "resume":
+            await self._control(op, "resume_audio")
+        elif op == "stop":
+            await self._control(op, "stop_audio")
+        elif op == "wait":
+            await asyncio.sleep(arg)
+        self.stats.steps += 1
+
+    async def run(self, deadline):
+        self.hard_deadline = deadline + GRACE_SEC
+        n = 0
+        while time.monotonic() < deadline:
+            self.sio = self._new_client()
+            try:
+                await self.sio.connect(self.url, transports=["websocket"])
+                self.connected = True
+                while self.connected and time.monotonic() < deadline:
+                    for op, arg in self.script:
+                        if time.monotonic() >= deadline:
+                            break
+                        n += 1
+                        try:
+                            await self._step(op, arg, n)
+                        except asyncio.TimeoutError:
+                            if time.monotonic() < deadline:
+                                self._error(f"{op}: no response within {self.args.turn_timeout}s")
+                    if self.args.iterations and n >= self.args.iterations * len(self.script):
+                        return
+            except (socketio.exceptions.SocketIOError, OSError) as e:
+                self._error(f"connection: {e!r}")
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await self.sio.disconnect()
+                except Exception:
+                    pass
+
+
+async def fetch_status(http, url):
+    try:
+        async with http.get(f"{url}/status", timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            return await resp.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return None
+
+
+def _slope_per_hour(points):
+    """Least-squares slope of (seconds, value) points, per hour; None with too few points."""
+    points = [(t, v) for t, v in points if v is not None]
+    if len(points) < 3:
+        return None
+    t, v = np.array(points, dtype=np.float64).T
+    if np.ptp(t) <= 0:
+        return None
+    return round(float(np.polyfit(t / 3600.0, v, 1)[0]), 2)
+
+
+async def sample(url, pid, classes, clients, errors, args, timeline, stop, t_start):
+    """Every sample_sec: server RSS/CPU, /status (tasks, loop lag, outbound), client-side windows."""
+    prev_cpu, prev_t = (proc_usage(pid)[0] if pid else None), time.monotonic()
+    out = open(args.timeline, "w", encoding="utf-8") if args.timeline else None
+    async with aiohttp.ClientSession() as http:
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=args.sample_sec)
+                except asyncio.TimeoutError:
+                    pass
+                now = time.monotonic()
+                cpu, rss = proc_usage(pid) if pid else (None, None)
+                status = await fetch_status(http, url) or {}
+                loop = status.get("loop") or {}
+                outbound = (status.get("outbound") or {}).values()
+                row = {
+                    "t_sec": round(now - t_start, 1),
+                    "rss_mb": round(rss / 2**20, 1) if rss else None,
+                    "cpu_pct": round(100.0 * (cpu - prev_cpu) / (now - prev_t), 1) if cpu is not None and prev_cpu is not None else None,
+                    "tasks": loop.get("tasks"),
+                    "loop_lag_p99_ms": loop.get("lag_p99_ms"),
+                    "loop_stalls": loop.get("stalls"),
+                    "sessions": (status.get("sessions") or {}).get("active"),
+                    "outbound_pending_kb": round(sum(q.get("pending_audio_bytes", 0) for q in outbound) / 1024, 1),
+                    "outbound_dropped": sum(q.get("dropped", 0) for q in outbound),
+                    "connected": sum(1 for c in clients if c.connected),
+                    "errors": errors["count"],
+                }
+                for name, stats in classes.items():
+                    for key, value in stats.take_window().items():
+                        row[f"{name}_{key}"] = value
+                prev_cpu, prev_t = cpu, now
+                timeline.append(row)
+                if out:
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    out.flush()
+                if not args.quiet:
+                    print(
+                        f"[{row['t_sec']:>7.0f}s] rss {row['rss_mb']} MiB  cpu {row['cpu_pct']}%  tasks {row['tasks']}"
+                        f"  lag p99 {row['loop_lag_p99_ms']} ms  clients {row['connected']}/{len(clients)}"
+                        f"  ttfa p99 {row.get('normal_ttfa_p99_ms')} ms  slow lag p99 {row.get('slow_frame_lag_p99_ms')} ms"
+                        f"  pending {row['outbound_pending_kb']} KiB  errors {row['errors']}"
+                    )
+        finally:
+            if out:
+                out.close()
+
+
+def summarize(args, classes, errors, timeline, wall):
+    # Тренды — только по установившемуся режиму: после прогрева и до конца прогона (без хвоста GRACE_SEC)
+    steady = [row for row in timeline if args.warmup_sec <= row["t_sec"] <= args.duration] or timeline
+
+    def series(key):
+        return [(row["t_sec"], row[key]) for row in steady if row.get(key) is not None]
+
+    def values(key):
+        return [v for _, v in series(key)]
+
+    rss, tasks, cpu, lag = values("rss_mb"), values("tasks"), values("cpu_pct"), values("loop_lag_p99_ms")
+    return {
+        "config": {
+            "clients": args.clients,
+            "slow_clients": args.slow,
+            "slow_kbps": args.slow_kbps,
+            "script": args.script,
+            "transport": args.transport,
+            "codecs": args.codecs,
+            "duration_sec": args.duration,
+        },
+        "wall_sec": round(wall, 1),
+        "clients": {name: stats.summary(wall) for name, stats in classes.items() if stats.steps},
+        "server": {
+            "rss_mb_start": rss[0] if rss else None,
+            "rss_mb_end": rss[-1] if rss else None,
+            "rss_mb_peak": max(rss) if rss else None,
+            "rss_mb_per_hour": _slope_per_hour(series("rss_mb")),
+            "tasks_start": tasks[0] if tasks else None,
+            "tasks_end": tasks[-1] if tasks else None,
+            "tasks_max": max(tasks) if tasks else None,
+            "tasks_per_hour": _slope_per_hour(series("tasks")),
+            "cpu_pct_mean": round(float(np.mean(cpu)), 1) if cpu else None,
+            "loop_lag_p99_ms_max": max(lag) if lag else None,
+            "loop_stalls": timeline[-1].get("loop_stalls") if timeline else None,
+            "outbound_pending_kb_max": max(values("outbound_pending_kb"), default=None),
+        },
+        "errors": errors["count"],
+        "error_messages": errors["messages"],
+    }
+
+
+def _flatten(report, prefix=""):
+    out = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            out.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix + key] = value
+    return out
+
+
+def compare(base, new):
+    old, cur = _flatten(base), _flatten(new)
+    for key in sorted(old.keys() & cur.keys()):
+        if key.startswith("config.") or old[key] == cur[key]:
+            continue
+        change = f" ({(cur[key] - old[key]) / abs(old[key]) * 100:+.1f}%)" if old[key] else ""
+        print(f"  {key}: {old[key]} -> {cur[key]}{change}")
+
+
+async def run(args):
+    script = parse_script(args.script)
+    port = free_port() if not args.url else None
+    url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{port}"
+    proc = start_server(port, args) if port else None
+    proxy = None
+    try:
+        if proc:
+            await wait_ready(url, proc)
+            await asyncio.sleep(0.5)
+        if args.slow:
+            proxy = await ThrottledProxy(
+                int(url.rsplit(":", 1)[1]), args.slow_kbps, args.slow_stall_every, args.slow_stall_sec,
+                host=url.split("://", 1)[1].rsplit(":", 1)[0],
+            ).start()
+        classes = {"normal": ClassStats(), "slow": ClassStats()}
+        errors = {"count": 0, "messages": []}
+        clients = []
+        for i in range(args.clients):
+            slow = i < args.slow
+            client_url = f"http://127.0.0.1:{proxy.port}" if slow else url
+            clients.append(LoadClient(i, client_url, script, args, classes["slow" if slow else "normal"], errors, slow=slow))
+
+        t_start = time.monotonic()
+        deadline = t_start + args.duration
+        timeline, stop = [], asyncio.Event()
+        sampler = asyncio.create_task(
+            sample(url, proc.pid if proc else None, classes, clients, errors, args, timeline, stop, t_start)
+        )
+
+        async def launch(client, delay):
+            await asyncio.sleep(delay)
+            await client.run(deadline)
+
+        if proxy:
+            asyncio.get_running_loop().call_at(deadline + GRACE_SEC, proxy.release)
+        ramp = args.ramp_sec / max(1, args.clients - 1)
+        results = await asyncio.gather(*(launch(c, i * ramp) for i, c in enumerate(clients)), return_exceptions=True)
+        wall = time.monotonic() - t_start
+        for client, result in zip(clients, results):
+            if isinstance(result, Exception):
+                client._error(repr(result))
+        stop.set()
+        await sampler
+    finally:
+        if proxy:
+            await proxy.close()
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except Exception:
+                proc.kill()
+    return summarize(args, classes, errors, timeline, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KANA socket.io load generator and soak test")
+    parser.add_argument("--url", help="server to load (default: start one on the fake Live backend)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--slow", type=int, default=0, help="how many of the clients are slow consumers")
+    parser.add_argument("--slow-kbps", type=float, default=64.0, help="server -> slow client bandwidth")
+    parser.add_argument("--slow-stall-every", type=float, default=0.0, help="freeze a slow client every N seconds")
+    parser.add_argument("--slow-stall-sec", type=float, default=0.0, help="... for this long")
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="steps separated by ';' or @file")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to run (soak: hours)")
+    parser.add_argument("--iterations", type=int, default=0, help="stop a client after N passes of the script")
+    parser.add_argument("--ramp-sec", type=float, default=5.0, help="spread client starts over this time")
+    parser.add_argument("--transport", default="binary", choices=("binary", "json"))
+    parser.add_argument("--ack", action=argparse.BooleanOptionalAction, default=True, help="acknowledge audio frames (audio_ack)")
+    parser.add_argument("--codecs", default="pcm", type=lambda s: [c.strip() for c in s.split(",") if c.strip()])
+    parser.add_argument("--idle-ms", type=float, default=500.0, help="audio gap that ends a turn")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--sample-sec", type=float, default=5.0)
+    parser.add_argument("--warmup-sec", type=float, default=30.0, help="samples before this are left out of trends")
+    parser.add_argument("--timeline", metavar="PATH", help="write samples as JSON Lines")
+    parser.add_argument("--report", metavar="PATH", help="save the summary")
+    parser.add_argument("--compare", metavar="PATH", help="print differences against a saved summary")
+    parser.add_argument("--quiet", action="store_true")
+    # Параметры сервера на fake-бэкенде (как в bench_e2e.py)
+    parser.add_argument("--pool", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--reply-sec", type=float, default=2.0)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--speed", type=float, default=2.0)
+    parser.add_argument("--server-log", action="store_true")
+    args = parser.parse_args()
+    args.slow = max(0, min(args.slow, args.clients))
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        print(f"changes vs {args.compare}:")
+        compare(base, report)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+KANA — наблюдение за циклом событий: задержка пробуждений (лаг) и долгие блокировки.
+
+uvicorn, socket.io и все сессии живут в одном цикле; синхронный вызов в корутине или колбэке
+задерживает всё сразу — отправку аудио клиентам, session.send, таймеры транскрипта. Сэмплер раз в
+KANA_LOOP_SAMPLE_MS спит и меряет, насколько позже проснулся; сторожевой поток замечает, что цикл
+не отвечает дольше KANA_LOOP_STALL_MS, и снимает стек потока цикла — видно, какой колбэк его держит.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+import metrics
+
+LOOP_SAMPLE_MS = float(os.getenv("KANA_LOOP_SAMPLE_MS", "100"))
+LOOP_LAG_WARN_MS = float(os.getenv("KANA_LOOP_LAG_WARN_MS", "50"))  # лаг выше — в счётчик предупреждений
+LOOP_STALL_MS = float(os.getenv("KANA_LOOP_STALL_MS", "250"))  # блокировка дольше — стек в лог и /status
+WINDOW_SEC = 60.0  # окно перцентилей лага
+STACK_DEPTH = 8
+RECENT_STALLS = 10
+
+LOOP_LAG = metrics.REGISTRY.histogram(
+    "kana_loop_lag_seconds",
+    "Event loop wake-up delay measured by the lag sampler",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+LOOP_STALLS = metrics.REGISTRY.counter("kana_loop_stalls_total", "Event loop blocked longer than KANA_LOOP_STALL_MS")
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopMonitor:
+    """Lag sampler task plus a watchdog thread for the running event loop.
+
+    The sampler records every wake-up delay; the watchdog only reads the sampler's heartbeat and,
+    once it is older than the stall threshold, captures the loop thread's stack while it is still
+    blocked. The stall is recorded with its full duration when the loop wakes up again.
+    """
+
+    def __init__(self, sample_ms=LOOP_SAMPLE_MS, warn_ms=LOOP_LAG_WARN_MS, stall_ms=LOOP_STALL_MS):
+        self.interval = sample_ms / 1000.0
+        self.warn_sec = warn_ms / 1000.0
+        self.stall_sec = stall_ms / 1000.0
+        self._lags = deque()  # (время, лаг) за WINDOW_SEC
+        self._stalls = deque(maxlen=RECENT_STALLS)
+        self._pending = None  # стек текущей блокировки, снятый сторожем
+        self._beat = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._loop_thread = None
+        self.samples = 0
+        self.warnings = 0
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return self
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample())
+        if self.stall_sec > 0:
+            self._thread = threading.Thread(target=self._watch, name="kana-loop-watchdog", daemon=True)
+            self._thread.start()
+        return self
+
+    async def _sample(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._beat = now
+            lag = max(0.0, now - t0 - self.interval)
+            self._record(now, lag)
+
+    def _record(self, now, lag):
+        self.samples += 1
+        self._lags.append((now, lag))
+        while self._lags[0][0] < now - WINDOW_SEC:
+            self._lags.popleft()
+        self.max_lag = max(self.max_lag, lag)
+        LOOP_LAG.observe(lag)
+        if lag >= self.warn_sec:
+            self.warnings += 1
+        if lag >= self.stall_sec:
+            pending, self._pending = self._pending, None
+            self.stalls += 1
+            LOOP_STALLS.inc()
+            stall = {
+                "at": round(time.time() - lag, 3),
+                "ms": round(lag * 1000.0, 1),
+                "stack": pending or [],
+            }
+            self._stalls.append(stall)
+            print(f"[KANA] Event loop blocked for {stall['ms']:.0f} ms" + (f" in {pending[-1]}" if pending else ""))
+
+    def _watch(self):
+        poll = max(0.01, min(self.interval, self.stall_sec) / 2)
+        while not self._stop.wait(poll):
+            beat = self._beat
+            if self._pending is not None or beat is None:
+                continue
+            if time.perf_counter() - beat > self.interval + self.stall_sec:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._pending = [
+                        f"{os.path.basename(f.filename)}:{f.lineno} {f.name}"
+                        for f in traceback.extract_stack(frame)[-STACK_DEPTH:]
+                    ]
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self):
+        lags = [lag for _, lag in self._lags]
+
+        def ms(value):
+            return round(value * 1000.0, 2) if value is not None else None
+
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "sample_ms": self.interval * 1000.0,
+            "warn_ms": self.warn_sec * 1000.0,
+            "stall_ms": self.stall_sec * 1000.0,
+            "samples": self.samples,
+            "lag_p50_ms": ms(_percentile(lags, 0.5)),
+            "lag_p99_ms": ms(_percentile(lags, 0.99)),
+            "lag_max_ms": ms(max(lags) if lags else None),
+            "lag_max_ever_ms": ms(self.max_lag),
+            "warnings": self.warnings,
+            "stalls": self.stalls,
+            "recent_stalls": list(self._stalls),
+            "tasks": len(asyncio.all_tasks()),
+        }
@@ -0,0 +1,249 @@
+"""
+KANA — метрики в текстовом формате Prometheus: счётчики, gauge, гистограммы с метками,
+таймеры этапов хода и времени «прыжков» в пул потоков.
+"""
+import asyncio
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def forget(self, **match):
+        """Drop series whose labels include all of match (e.g. session=...)."""
+        idx = {n: i for i, n in enumerate(self.labelnames)}
+        if not all(n in idx for n in match):
+            return
+        with self._lock:
+            for key in [k for k in self._values if all(k[idx[n]] == str(v) for n, v in match.items())]:
+                del self._values[key]
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        return Counter.render(self)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = f'le="{_format_value(float(bound))}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Holds metrics plus collectors that fill gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def _get(self, cls, name, help_text, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def add_collector(self, fn):
+        """fn() is called before each render to refresh scrape-time gauges."""
+        self._collectors.append(fn)
+
+    def forget(self, **match):
+        for metric in self._metrics.values():
+            metric.forget(**match)
+
+    def render(self):
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[KANA] metrics collector failed: {e}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TURN_LATENCY = REGISTRY.histogram(
+    "kana_turn_latency_seconds",
+    "Time from the end of user speech (or text input) to each reply stage",
+    ("session", "stage"),
+)
+EXECUTOR_WAIT = REGISTRY.histogram(
+    "kana_executor_wait_seconds",
+    "Time a blocking call waited for a worker thread",
+    ("op",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+EXECUTOR_RUN = REGISTRY.histogram(
+    "kana_executor_run_seconds",
+    "Time a blocking call ran in a worker thread",
+    ("op",),
+)
+
+
+class TurnTimer:
+    """Per-session timestamps of one conversational turn.
+
+    user_speech() is called on every input transcription delta (or text input); the first
+    occurrence of each later stage is observed relative to it, both per session and
+    under session="all" (per-session series are dropped when the session ends).
+    """
+
+    STAGES = ("model_text", "model_audio", "playback", "emit")
+
+    def __init__(self, session):
+        self.session = session
+        self.speech_end = None
+        self._seen = set()
+        self._answering = False
+        self.last = {}
+
+    def user_speech(self):
+        if self._answering:
+            return  # поздняя транскрипция хода, на который уже идёт ответ
+        self._seen.clear()
+        self.speech_end = time.perf_counter()
+
+    def mark(self, stage, delay=0.0):
+        """Observe the first occurrence of stage; delay is how many seconds from now it really happens."""
+        if stage in self._seen or self.speech_end is None:
+            return
+        self._seen.add(stage)
+        if stage in ("model_audio", "model_text"):
+            self._answering = True
+        elapsed = time.perf_counter() + delay - self.speech_end
+        self.last[stage] = round(elapsed * 1000.0, 1)
+        TURN_LATENCY.observe(elapsed, session=self.session, stage=stage)
+        TURN_LATENCY.observe(elapsed, session="all", stage=stage)
+
+    def turn_complete(self):
+        self._answering = False
+
+    def snapshot(self):
+        return {f"{stage}_ms": self.last.get(stage) for stage in self.STAGES}
+
+
+async def to_thread(op, fn, *args, executor=None, **kwargs):
+    """asyncio.to_thread (or run in a dedicated executor) with queue-wait and run-time histograms for op."""
+    submitted = time.perf_counter()
+    started = []
+
+    def call():
+        started.append(time.perf_counter())
+        return fn(*args, **kwargs)
+
+    try:
+        if executor is None:
+            return await asyncio.to_thread(call)
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+    finally:
+        done = time.perf_counter()
+        if started:
+            EXECUTOR_WAIT.observe(started[0] - submitted, op=op)
+            EXECUTOR_RUN.observe(done - started[0], op=op)
@@ -0,0 +1,317 @@
+"""
+KANA — исходящая очередь событий socket.io на клиента (sid).
+
+Один drainer-таск на клиента вместо asyncio.create_task(sio.emit(...)) на каждое событие:
+служебные события (status, transcription, error) идут первыми и по порядку и не теряются,
+аудио ограничено бюджетом по байтам и при переполнении теряет самые старые чанки. Частые
+заменяемые события (lipsync, 30 кадров/с) хранят только последнее значение и идут вместе с аудио.
+
+sio.emit возвращается, как только engineio положил пакет в свою (неограниченную) очередь сокета,
+а дальше данные оседают в буферах websockets и ядра — с медленным клиентом там легко пропасть
+десяткам секунд звука. Поэтому аудио отправляется, только пока очередь engineio короче
+KANA_OUTBOUND_MAX_BACKLOG пакетов и (если клиент подтверждает кадры, audio_ack) неподтверждённого
+звука меньше KANA_OUTBOUND_MAX_UNACKED_MS. Пока канал перегружен, в очереди остаётся не больше
+того же окна звука, старое выбрасывается — задержка не растёт, служебные события не ждут за аудио.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+AUDIO_EVENT = "audio_data"
+
+DEFAULT_MAX_AUDIO_BYTES = int(os.getenv("KANA_OUTBOUND_MAX_AUDIO_BYTES", str(512 * 1024)))
+DEFAULT_MAX_EVENTS = int(os.getenv("KANA_OUTBOUND_MAX_EVENTS", "256"))
+DEFAULT_COALESCE_BYTES = int(os.getenv("KANA_OUTBOUND_COALESCE_BYTES", str(64 * 1024)))
+DEFAULT_MAX_BACKLOG = int(os.getenv("KANA_OUTBOUND_MAX_BACKLOG", "16"))  # пакетов engineio (бинарный кадр — 2)
+DEFAULT_MAX_UNACKED_MS = float(os.getenv("KANA_OUTBOUND_MAX_UNACKED_MS", "400"))
+BACKLOG_POLL_SEC = 0.02
+ACK_TIMEOUT_SEC = 5.0  # без подтверждений дольше — считаем их потерянными, а не клиента вечно медленным
+
+
+class OutboundQueue:
+    """Bounded per-client outbound scheduler with a single drainer task.
+
+    emit is a coroutine function (event, data, callback=None). Control events keep priority and order;
+    audio chunks are PCM bytes, coalesced up to coalesce_bytes per emit and encoded
+    with the transport encoder (see transport.AudioEncoder) at send time. backlog, if given,
+    returns how many packets the transport still holds for the client; audio waits while
+    it is above max_backlog, or while more than max_unacked_ms of audio is unacknowledged
+    by a client that acks frames (audio_format["ack"]).
+    """
+
+    def __init__(
+        self,
+        emit,
+        max_audio_bytes=DEFAULT_MAX_AUDIO_BYTES,
+        max_events=DEFAULT_MAX_EVENTS,
+        coalesce_bytes=DEFAULT_COALESCE_BYTES,
+        backlog=None,
+        max_backlog=DEFAULT_MAX_BACKLOG,
+        max_unacked_ms=DEFAULT_MAX_UNACKED_MS,
+        name="",
+    ):
+        self.emit = emit
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.max_unacked_ms = max_unacked_ms
+        self.max_audio_bytes = max_audio_bytes
+        self.max_events = max_events
+        self.coalesce_bytes = coalesce_bytes
+        self.name = name
+        self.encoder = None
+        self.on_audio_sent = None
+
+        self._control = deque()
+        self._latest = {}  # event -> последнее значение, старые кадры заменяются
+        self._audio = deque()
+        self._audio_bytes = 0
+        self._unacked_ms = 0.0
+        self._unacked_since = None  # последний прогресс подтверждений
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closed = False
+
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.dropped_audio_bytes = 0
+        self.superseded = 0
+        self.errors = 0
+        self.congested = 0
+        self.acked = 0
+        self.ack_timeouts = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+        return self
+
+    def set_audio_encoder(self, encoder):
+        """Switch transport; audio queued for the previous encoder is discarded."""
+        self.drop_audio()
+        self.encoder = encoder
+
+    def put(self, event, data=None):
+        """Queue a control event (status, transcription, error...). Order is preserved, nothing is lost:
+        above max_events the queued audio is shed instead, so the drainer gets to the events sooner."""
+        if self._closed:
+            return
+        if len(self._control) >= self.max_events and self._audio:
+            self.drop_audio()
+        self._control.append((event, data))
+        self.queued += 1
+        self._wakeup.set()
+
+    def put_latest(self, event, data):
+        """Queue a replaceable event (lipsync frames): only the newest value per event is kept.
+
+        It is sent like audio, only while the client keeps up, and never displaces audio or
+        control events; a client that falls behind simply skips frames."""
+        if self._closed:
+            return
+        if event in self._latest:
+            self.superseded += 1
+        self._latest[event] = data
+        self.queued += 1
+        self._wakeup.set()
+
+    def drop_latest(self, event):
+        """Forget a pending replaceable event (a viseme frame is stale after an interruption)."""
+        if self._latest.pop(event, None) is not None:
+            self.superseded += 1
+
+    def put_audio(self, data_bytes):
+        """Queue a PCM chunk; drops the oldest audio when the byte budget is exceeded.
+
+        Without an enabled encoder (transport not negotiated yet, or audio off) the chunk is not accepted."""
+        if self._closed or not data_bytes or self.encoder is None or not self.encoder.enabled:
+            return
+        self._audio.append(data_bytes)
+        self._audio_bytes += len(data_bytes)
+        self.queued += 1
+        self._shed(self.max_audio_bytes)
+        self._wakeup.set()
+
+    def _shed(self, limit):
+        """Drop the oldest chunks until at most limit bytes are queued (the newest chunk stays)."""
+        while self._audio_bytes > limit and len(self._audio) > 1:
+            old = self._audio.popleft()
+            self._audio_bytes -= len(old)
+            self.dropped += 1
+            self.dropped_audio_bytes += len(old)
+
+    def drop_audio(self):
+        """Discard all queued audio (e.g. on interruption)."""
+        while self._audio:
+            old = self._audio.popleft()
+            self.dropped += 1
+            self.dropped_audio_bytes += len(old)
+        self._audio_bytes = 0
+        if self.encoder is not None:
+            self.encoder.reset()
+
+    def _take_audio(self, limit):
+        if len(self._audio) == 1:
+            chunk = self._audio.popleft()
+            self._audio_bytes -= len(chunk)
+            return chunk
+        buf = bytearray()
+        while self._audio and (not buf or len(buf) + len(self._audio[0]) <= limit):
+            chunk = self._audio.popleft()
+            self._audio_bytes -= len(chunk)
+            buf += chunk
+        return bytes(buf)
+
+    def transport_backlog(self):
+        try:
+            return self.backlog() if self.backlog else 0
+        except Exception:
+            return 0
+
+    @property
+    def acks(self):
+        return self.encoder is not None and self.encoder.format.get("ack", False)
+
+    def _congested(self):
+        if self.transport_backlog() > self.max_backlog:
+            return True
+        if self._unacked_ms <= self.max_unacked_ms:
+            return False
+        if time.monotonic() - self._unacked_since > ACK_TIMEOUT_SEC:
+            self.ack_timeouts += 1
+            self._unacked_ms = 0.0
+            self._unacked_since = None
+            return False
+        return True
+
+    def _on_ack(self, ms):
+        self.acked += 1
+        self._unacked_ms = max(0.0, self._unacked_ms - ms)
+        self._unacked_since = time.monotonic() if self._unacked_ms else None
+        self._wakeup.set()
+
+    def _bytes_per_ms(self):
+        fmt = self.encoder.format
+        return fmt.get("source_rate", fmt["sample_rate"]) * fmt["sample_width"] / 1000.0
+
+    def _window_bytes(self):
+        """PCM bytes the client may still have in flight (the whole coalesce size without acks)."""
+        if not self.acks:
+            return self.coalesce_bytes
+        room = (self.max_unacked_ms - self._unacked_ms) * self._bytes_per_ms()
+        return int(max(0, min(self.coalesce_bytes, room)))
+
+    def _payload_ms(self, chunk, count):
+        fmt = self.encoder.format
+        if fmt["frame_ms"]:
+            return fmt["frame_ms"]
+        return len(chunk) / self._bytes_per_ms() / max(1, count)
+
+    async def _send_audio(self, payload, ms):
+        callback = None
+        if self.acks:
+            if self._unacked_since is None:
+                self._unacked_since = time.monotonic()
+            self._unacked_ms += ms
+
+            def callback(*_):
+                self._on_ack(ms)
+        await self._send(AUDIO_EVENT, payload, callback)
+
+    async def _send(self, event, data, callback=None):
+        try:
+            if callback is None:
+                await self.emit(event, data)
+            else:
+                await self.emit(event, data, callback)
+            self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            print(f"[KANA] outbound {self.name} {event}: {e}")
+
+    async def _drain(self):
+        while not self._closed:
+            if not self._control and not self._audio and not self._latest:
+                delay = self.encoder.flush_delay if self.encoder is not None else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    for payload in self.encoder.flush():
+                        await self._send_audio(payload, self.encoder.format["frame_ms"])
+                    continue
+            self._wakeup.clear()
+
+            while self._control:
+                event, data = self._control.popleft()
+                await self._send(event, data)
+
+            if (self._audio or self._latest) and self._congested():
+                # Клиент не успевает читать: в очереди — не больше окна звука, события идут без ожидания
+                self.congested += 1
+                if self.encoder is not None:
+                    self._shed(int(self.max_unacked_ms * self._bytes_per_ms()))
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=BACKLOG_POLL_SEC)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            while self._latest:
+                event = next(iter(self._latest))
+                await self._send(event, self._latest.pop(event))
+
+            if self._audio:
+                chunk = self._take_audio(self._window_bytes())
+                payloads = self.encoder.encode(chunk)
+                ms = self._payload_ms(chunk, len(payloads))
+                for payload in payloads:
+                    await self._send_audio(payload, ms)
+                    if self.on_audio_sent:
+                        self.on_audio_sent()
+
+    async def close(self, timeout=1.0):
+        """Stop the drainer after trying to deliver queued control events."""
+        if self._task is None:
+            self._closed = True
+            return
+        self._audio.clear()
+        self._audio_bytes = 0
+        self._latest.clear()
+        if self._control:
+            self._wakeup.set()
+            try:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + timeout
+                while self._control and loop.time() < deadline:
+                    await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                pass
+        self._closed = True
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+
+    def stats(self):
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "dropped_audio_bytes": self.dropped_audio_bytes,
+            "errors": self.errors,
+            "pending_events": len(self._control),
+            "pending_latest": len(self._latest),
+            "superseded": self.superseded,
+            "pending_audio_chunks": len(self._audio),
+            "pending_audio_bytes": self._audio_bytes,
+            "transport_backlog": self.transport_backlog(),
+            "unacked_ms": round(self._unacked_ms),
+            "acked": self.acked,
+            "ack_timeouts": self.ack_timeouts,
+            "congested": self.congested,
+        }
@@ -0,0 +1,233 @@
+"""
+KANA — запись сессии для воспроизведения проблем: кадры микрофона, аудио модели и события
+(транскрипции, конец хода, прерывания) с отметками времени в отображённые в память сегменты.
+
+Сегмент — заранее выделенный файл .pcmlog (записи: заголовок + payload) и компактный индекс .idx
+(17 байт на запись). Запись — одно копирование в mmap, без системных вызовов на горячем пути;
+сегменты ротируются по размеру, самые старые удаляются при превышении общего лимита. Следующий
+сегмент создаётся заранее, а закрытие и удаление старых идут в пуле audio_io.EXECUTOR — в цикле
+событий ротация только подменяет ссылку на сегмент.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+
+import audio_io
+
+RECORD_DIR = os.getenv("KANA_RECORD_DIR", "")
+RECORD_ALL = os.getenv("KANA_RECORD", "0") == "1"  # писать все сессии, а не только с record в start_audio
+SEGMENT_BYTES = int(float(os.getenv("KANA_RECORD_SEGMENT_MB", "16")) * 2**20)
+MAX_TOTAL_BYTES = int(float(os.getenv("KANA_RECORD_MAX_MB", "256")) * 2**20)
+
+MIC = 1
+MODEL_AUDIO = 2
+TRANSCRIPT = 3
+EVENT = 4
+KIND_NAMES = {MIC: "mic", MODEL_AUDIO: "model_audio", TRANSCRIPT: "transcript", EVENT: "event"}
+
+# Заголовок записи в сегменте: kind, t (мс от начала сессии), длина payload
+RECORD_HEADER = struct.Struct("<BdI")
+# Запись индекса: kind, t, смещение payload в сегменте, длина
+INDEX_ENTRY = struct.Struct("<BdII")
+
+
+class _Segment:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.pos = 0
+        self._file = open(path + ".pcmlog", "w+b")
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._index = open(path + ".idx", "wb", buffering=64 * 1024)
+
+    def fits(self, n):
+        return self.pos + RECORD_HEADER.size + n <= self.size
+
+    def append(self, kind, t, data):
+        n = len(data)
+        RECORD_HEADER.pack_into(self._map, self.pos, kind, t, n)
+        start = self.pos + RECORD_HEADER.size
+        self._map[start:start + n] = data
+        self._index.write(INDEX_ENTRY.pack(kind, t, start, n))
+        self.pos = start + n
+
+    def close(self):
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(self.pos)
+        self._file.close()
+        self._index.close()
+
+    def remove(self):
+        for ext in (".pcmlog", ".idx"):
+            try:
+                os.remove(self.path + ext)
+            except OSError:
+                pass
+
+
+def _retire(segment, expired):
+    """Executor job: close a full segment, then delete segments over the total limit."""
+    if segment is not None:
+        segment.close()
+    for old in expired:
+        old.remove()
+
+
+def _discard(future):
+    """Executor job: close and delete a pre-allocated segment that was never used."""
+    try:
+        segment = future.result()
+    except Exception:
+        return
+    segment.close()
+    segment.remove()
+
+
+class Recorder:
+    """Append-only, timestamped session log in rotating memory-mapped segments.
+
+    All methods are called from the event loop thread. Oversized records (larger than a
+    segment) are skipped and counted rather than written, as are records that arrive while
+    the next segment is still being allocated in the executor.
+    """
+
+    def __init__(
+        self, directory, session, meta=None, segment_bytes=SEGMENT_BYTES, max_total_bytes=MAX_TOTAL_BYTES, executor=None
+    ):
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(session))
+        self.path = os.path.join(directory, f"{safe}-{time.strftime('%Y%m%d-%H%M%S')}")
+        os.makedirs(self.path, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_total_bytes = max_total_bytes
+        self.executor = executor or audio_io.EXECUTOR
+        self.started = time.perf_counter()
+        self._segments = []
+        self._closed_bytes = 0
+        self._segment = None
+        self._next = None  # Future следующего сегмента, создаваемого в пуле
+        self._seq = 0
+
+        self.records = 0
+        self.skipped = 0
+        self.rotations = 0
+        self.deleted_segments = 0
+
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(meta or {}, session=str(session), started_at=time.time()), f, ensure_ascii=False, indent=2)
+        self._segment = self._new_segment()
+        self._segments.append(self._segment)
+        self._prepare_next()
+
+    def _new_segment(self):
+        name = os.path.join(self.path, f"seg-{self._seq:04d}")
+        self._seq += 1
+        return _Segment(name, self.segment_bytes)
+
+    def _prepare_next(self):
+        self._next = self.executor.submit(self._new_segment)
+
+    def _rotate(self):
+        """Swap in the pre-allocated segment; False when it is not ready yet (or failed)."""
+        if self._next is None or not self._next.done():
+            return False
+        try:
+            segment = self._next.result()
+        except Exception as e:
+            print(f"[KANA] Recording segment allocation failed: {e}")
+            self._prepare_next()
+            return False
+        old, self._segment = self._segment, segment
+        self._segments.append(segment)
+        self._closed_bytes += old.pos
+        self.rotations += 1
+        # Общий лимит: самые старые закрытые сегменты удаляются (в пуле, после закрытия полного)
+        expired = []
+        while self._closed_bytes + self.segment_bytes > self.max_total_bytes and len(self._segments) > 1:
+            expired.append(self._segments.pop(0))
+            self._closed_bytes -= expired[-1].pos
+            self.deleted_segments += 1
+        self.executor.submit(_retire, old, expired)
+        self._prepare_next()
+        return True
+
+    def _append(self, kind, data):
+        if self._segment is None:
+            return
+        if not self._segment.fits(len(data)):
+            if RECORD_HEADER.size + len(data) > self.segment_bytes or not self._rotate():
+                self.skipped += 1
+                return
+        self._segment.append(kind, (time.perf_counter() - self.started) * 1000.0, data)
+        self.records += 1
+
+    def mic(self, frame):
+        self._append(MIC, frame)
+
+    def model_audio(self, data):
+        self._append(MODEL_AUDIO, data)
+
+    def transcript(self, sender, text):
+        self._append(TRANSCRIPT, json.dumps({"sender": sender, "text": text}, ensure_ascii=False).encode("utf-8"))
+
+    def event(self, name, **fields):
+        self._append(EVENT, json.dumps(dict(fields, event=name), ensure_ascii=False).encode("utf-8"))
+
+    def close(self):
+        """Close the recording in the executor; returns a Future that is done once the files are final."""
+        segment, self._segment = self._segment, None
+        pending, self._next = self._next, None
+        if pending is not None:
+            self.executor.submit(_discard, pending)
+        return self.executor.submit(_retire, segment, [])
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "records": self.records,
+            "skipped": self.skipped,
+            "segments": len(self._segments),
+            "rotations": self.rotations,
+            "deleted_segments": self.deleted_segments,
+        }
+
+
+class RecordingReader:
+    """Iterates a recording directory in time order using the segment indexes."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.segments = sorted(
+            os.path.join(path, name[:-len(".idx")]) for name in os.listdir(path) if name.endswith(".idx")
+        )
+
+    def __iter__(self):
+        """Yield (kind, t_ms, payload bytes) for every record."""
+        for seg in self.segments:
+            try:
+                with open(seg + ".idx", "rb") as f:
+                    index = f.read()
+                size = os.path.getsize(seg + ".pcmlog")
+            except OSError:
+                continue
+            if not size:
+                continue
+            with open(seg + ".pcmlog", "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                usable = len(index) - len(index) % INDEX_ENTRY.size
+                for kind, t, offset, length in INDEX_ENTRY.iter_unpack(index[:usable]):
+                    if offset + length > size:
+                        break  # сегмент оборван (сессия упала до закрытия)
+                    yield kind, t, data[offset:offset + length]
+
+    def events(self):
+        """Yield (kind, t_ms, value): bytes for audio, decoded dicts for transcripts and events."""
+        for kind, t, payload in self:
+            if kind in (TRANSCRIPT, EVENT):
+                yield kind, t, json.loads(payload.decode("utf-8"))
+            else:
+                yield kind, t, payload
@@ -0,0 +1,252 @@
+"""
+KANA — воспроизведение записи сессии (recorder.py) через настоящий AssistantLoop без сети и устройств.
+
+Микрофонная дорожка записи выгружается в WAV и подаётся в AssistantLoop как источник file:, вместо
+Gemini Live — локальный fake_live (KANA_LIVE_BACKEND=fake) с фиксированным seed, который отвечает
+записанным потоком модели (аудио и транскрипции по ходам), ответ уходит в приёмник null (или file:
+с --output-wav). Так прогон проходит тот же путь, что и живая сессия: шумоподавление, VAD, очереди,
+воспроизведение, плюс кодер транспорта, как у отправки клиентам. Темп: --realtime — как в записи,
+иначе файл и ответы идут без ожиданий, и два прогона одной записи дают одинаковые ходы, VAD и
+воспроизведение (различаются только замеры времени). Отчёт можно сохранить (--json) и сравнить
+с другим прогоном (--compare).
+
+    python replay.py RECORDING [--realtime] [--denoise/--no-denoise] [--json out.json] [--compare base.json]
+    python replay.py RECORDING --export-mic mic.wav   # затем KANA_AUDIO_INPUT=file:mic.wav
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+import audio_io
+import live
+import recorder
+import transport
+from assistant import AssistantLoop, RECEIVE_SAMPLE_RATE
+
+IDLE_SEC = 2.0  # после конца входа столько без новых ходов и звука — прогон окончен
+MAX_TAIL_SEC = 60.0
+SEED = 0
+
+
+def _timing(samples):
+    if not samples:
+        return None
+    us = np.array(samples) * 1e6
+    return {"mean_us": round(float(us.mean()), 1), "p99_us": round(float(np.percentile(us, 99)), 1), "count": len(samples)}
+
+
+def recorded_turns(reader):
+    """Time to first model audio after each user turn, as it happened in the recorded session (ms)."""
+    turns = []
+    user_end = None
+    for kind, t, value in reader.events():
+        if kind == recorder.MODEL_AUDIO and user_end is not None:
+            turns.append(round(t - user_end, 1))
+            user_end = None
+        elif kind == recorder.TRANSCRIPT and value.get("sender") == "User":
+            user_end = t
+        elif kind == recorder.EVENT and value.get("event") == "user_input":
+            user_end = t
+    return turns
+
+
+def recorded_script(reader):
+    """The recorded model stream as fake_live turns: [(offset_ms, kind, value), ...] per turn.
+
+    Turns are split at turn_complete events; offsets count from the first message of the turn.
+    """
+    turns, current = [], []
+    for kind, t, value in reader.events():
+        if kind == recorder.MODEL_AUDIO:
+            current.append((t, "audio", value))
+        elif kind == recorder.TRANSCRIPT:
+            current.append((t, "input" if value.get("sender") == "User" else "output", value.get("text", "")))
+        elif kind == recorder.EVENT and value.get("event") == "turn_complete":
+            turns.append(current)
+            current = []
+    if current:
+        turns.append(current)
+    return [[(round(t - turn[0][0], 1), kind, value) for t, kind, value in turn] if turn else [] for turn in turns]
+
+
+async def _until_idle(loop, started):
+    """Wait for the file input to run out and the last reply to finish playing."""
+    last_turn, quiet_since = None, None
+    while True:
+        await asyncio.sleep(0.05)
+        capture = loop.capture
+        if capture is None:
+            if loop.session is not None and time.monotonic() - started > MAX_TAIL_SEC:
+                return  # вход не открылся
+            continue
+        stats = capture.stats()
+        if stats["position_bytes"] < stats["length_bytes"]:
+            continue
+        now = time.monotonic()
+        playing = loop.stats()["queues"]["audio_in"] or (loop.playback and loop.playback.depth_ms() > 0)
+        if playing or loop.turn_id != last_turn:
+            last_turn, quiet_since = loop.turn_id, now
+        elif now - quiet_since >= IDLE_SEC:
+            return
+
+
+async def _drive(mic_wav, realtime, denoise, vad, output_wav):
+    encoder = transport.AudioEncoder(transport.negotiate({"audio_transport": "binary"}, RECEIVE_SAMPLE_RATE))
+    encode = []
+    errors = []
+    received = [0]
+
+    def on_audio_data(data):
+        # Как _outbound на сервере: каждый чанк ответа кодируется для отправки
+        t0 = time.perf_counter()
+        encoder.encode(data)
+        encode.append(time.perf_counter() - t0)
+        received[0] += len(data)
+
+    audio_io.FILE_REALTIME = realtime
+    loop = AssistantLoop(
+        on_audio_data=on_audio_data,
+        on_error=errors.append,
+        name="replay",
+        audio_input=f"file:{mic_wav}",
+        audio_output=f"file:{output_wav}" if output_wav else "null",
+        vad=vad,
+        noise_suppression=denoise,
+        record=False,
+        cues=False,
+        lipsync=False,
+    )
+    cpu0, t0 = time.process_time(), time.monotonic()
+    task = asyncio.create_task(loop.run())
+    try:
+        await _until_idle(loop, t0)
+        stats = loop.stats()
+    finally:
+        loop.stop()
+        await task
+    wall = time.monotonic() - t0
+    return stats, {
+        "wall_sec": round(wall, 2),
+        "cpu_sec": round(time.process_time() - cpu0, 3),
+        "reply_audio_sec": round(received[0] / (RECEIVE_SAMPLE_RATE * 2), 2),
+        "encode": _timing(encode),
+        "errors": errors,
+    }
+
+
+def replay(path, realtime=False, denoise=None, vad=None, output_wav=None):
+    reader = recorder.RecordingReader(path)
+    meta = reader.meta
+    denoise = meta.get("noise_suppression", False) if denoise is None else denoise
+    vad = meta.get("vad", True) if vad is None else vad
+    counts = {name: 0 for name in recorder.KIND_NAMES.values()}
+    for kind, _, _ in reader:
+        counts[recorder.KIND_NAMES.get(kind, "unknown")] += 1
+    recorded = np.array(recorded_turns(reader)) if counts["model_audio"] else None
+
+    # Модель — локальная заглушка с записанными ответами: прогон без сети и ключа, вход идентичен записи
+    script = recorded_script(reader)
+    live.BACKEND = "fake"
+    live.FAKE_OPTIONS = {"seed": SEED, "script": script, "speed": 1.0 if realtime else float("inf")}
+    fd, mic_wav = tempfile.mkstemp(prefix="kana-replay-", suffix=".wav")
+    os.close(fd)
+    try:
+        mic_sec = export_track(path, recorder.MIC, mic_wav)
+        stats, run = asyncio.run(_drive(mic_wav, realtime, denoise, vad, output_wav))
+    finally:
+        os.remove(mic_wav)
+    return {
+        "recording": path,
+        "records": counts,
+        "realtime": realtime,
+        "denoise": bool(denoise),
+        "vad": bool(vad),
+        "mic_sec": round(mic_sec, 2),
+        "recorded_ttfa_ms_p50": round(float(np.percentile(recorded, 50)), 1) if recorded is not None and recorded.size else None,
+        "recorded_ttfa_ms_max": round(float(recorded.max()), 1) if recorded is not None and recorded.size else None,
+        "recorded_turns": len(script),
+        "turns": stats["turn"],
+        "interruptions": stats["interruptions"],
+        "last_turn": stats["last_turn"],
+        "vad_gate": stats["vad"],
+        "noise_suppressor": stats["denoise"],
+        "playback": stats["playback"],
+        "cpu_ms_per_mic_sec": round(run["cpu_sec"] * 1000.0 / mic_sec, 2) if mic_sec else None,
+        **run,
+    }
+
+
+def export_track(path, kind, out_path):
+    """Write one audio track of a recording to a mono 16-bit WAV; returns its length in seconds."""
+    reader = recorder.RecordingReader(path)
+    rate = reader.meta.get("mic_rate" if kind == recorder.MIC else "model_rate", 16000)
+    n = 0
+    with wave.open(out_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        for k, _, payload in reader:
+            if k == kind:
+                wav.writeframesraw(payload)
+                n += len(payload)
+    return n / 2 / rate
+
+
+def _flatten(report, prefix=""):
+    out = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            out.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix + key] = value
+    return out
+
+
+def compare(base, new):
+    old, cur = _flatten(base), _flatten(new)
+    for key in sorted(old.keys() & cur.keys()):
+        if old[key] != cur[key]:
+            change = f" ({(cur[key] - old[key]) / old[key] * 100:+.1f}%)" if old[key] else ""
+            print(f"  {key}: {old[key]} -> {cur[key]}{change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a KANA session recording through AssistantLoop, the fake Live backend answering with the recorded model stream")
+    parser.add_argument("recording", help="recording directory (KANA_RECORD_DIR/<session>-<time>)")
+    parser.add_argument("--realtime", action="store_true", help="feed the mic track at the recorded pace (default: as fast as possible)")
+    parser.add_argument("--denoise", action=argparse.BooleanOptionalAction, default=None, help="default: as recorded")
+    parser.add_argument("--vad", action=argparse.BooleanOptionalAction, default=None, help="default: as recorded")
+    parser.add_argument("--output-wav", metavar="WAV", help="write the replayed reply audio here instead of the null sink")
+    parser.add_argument("--json", metavar="PATH", help="save the report")
+    parser.add_argument("--compare", metavar="PATH", help="print differences against a saved report")
+    parser.add_argument("--export-mic", metavar="WAV")
+    parser.add_argument("--export-model", metavar="WAV")
+    args = parser.parse_args()
+
+    if args.export_mic or args.export_model:
+        for kind, out_path in ((recorder.MIC, args.export_mic), (recorder.MODEL_AUDIO, args.export_model)):
+            if out_path:
+                print(f"{out_path}: {export_track(args.recording, kind, out_path):.1f} s")
+        return
+
+    report = replay(args.recording, realtime=args.realtime, denoise=args.denoise, vad=args.vad, output_wav=args.output_wav)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        print(f"changes vs {args.compare}:")
+        compare(base, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,163 +5,389 @@ import os
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-import socketio
-import uvicorn
-import pyaudio
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from assistant import AssistantLoop
+import startup
+
+with startup.phase("import web stack"):
+    import socketio
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import PlainTextResponse, Response
+
+with startup.phase("import pipeline"):
+    from assistant import AssistantLoop, RECEIVE_SAMPLE_RATE, MODEL, CONNECT_TIMEOUT_SEC, CONTEXT_TURNS, get_client, get_config, devices
+    import animations
+    import audio_io
+    import live
+    import loopmon
+    import metrics
+    import recorder
+    import transport
+    import transcript
+    from vad import VAD_ENABLED
+    from outbound import OutboundQueue
+    from sessions import SessionManager, SessionLimitError
 
 sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"])
 app_socketio = socketio.ASGIApp(sio, app)
 
-audio_loop = None
-loop_task = None
-
-pya = pyaudio.PyAudio()
+sessions = SessionManager()
+outbound_queues = {}
+live_pool = None
+animation_bundle = animations.AnimationBundle()
+animation_catalog = animations.AnimationCatalog()
+transcripts = transcript.TranscriptRegistry()
+loop_monitor = loopmon.LoopMonitor()
 
 
 @app.get("/status")
 async def status():
-    return {"status": "running", "service": "KANA Backend"}
-
-
-def _fix_device_name(name):
-    """Fix mojibake: UTF-8 bytes wrongly decoded as cp1251 (Russian Windows) or cp1252."""
-    if not name or not isinstance(name, str):
-        return name or ""
-    for enc in ("cp1251", "cp1252", "cp866"):
-        try:
-            fixed = name.encode(enc).decode("utf-8")
-            if fixed != name and any("\u0400" <= c <= "\u04FF" for c in fixed):
-                return fixed
-            if fixed != name:
-                return fixed
-        except (UnicodeDecodeError, UnicodeEncodeError):
-            continue
-    return name
-
-
-def _deduplicate_devices(devices, default_idx):
-    """Remove duplicates: merge devices where one name is prefix of another. Keep default or longest name."""
-    if not devices:
-        return []
-    result = []
-    for d in devices:
-        name = d["name"]
-        merged = False
-        for i, existing in enumerate(result):
-            ex_name = existing["name"]
-            if name == ex_name:
-                if d["index"] == default_idx:
-                    result[i] = d
-                merged = True
-                break
-            if name.startswith(ex_name) or ex_name.startswith(name):
-                keep = d if (d["index"] == default_idx or (existing["index"] != default_idx and len(name) >= len(ex_name))) else existing
-                result[i] = keep
-                merged = True
-                break
-        if not merged:
-            result.append(d)
-    result.sort(key=lambda x: (not x.get("default", False), x["name"]))
-    return result
+    return {
+        "status": "running",
+        "service": "KANA Backend",
+        "startup": startup.snapshot(),
+        "sessions": sessions.snapshot(),
+        "devices": devices.stats(),
+        "animations": dict(animation_bundle.stats(), catalog=animation_catalog.stats()),
+        "live": dict(live.stats.snapshot(), pool=live_pool.snapshot() if live_pool else None),
+        "outbound": {sid: q.stats() for sid, q in outbound_queues.items()},
+        "transcripts": transcripts.stats(),
+        "loop": loop_monitor.snapshot(),
+        "audio_executor": audio_io.executor_stats(),
+    }
+
+
+QUEUE_DEPTH = metrics.REGISTRY.gauge("kana_queue_depth", "Items waiting in a session queue", ("session", "queue"))
+PLAYBACK_BUFFER = metrics.REGISTRY.gauge("kana_playback_buffer_ms", "Jitter buffer depth", ("session",))
+PLAYBACK_UNDERRUNS = metrics.REGISTRY.gauge("kana_playback_underruns", "Playback underruns so far", ("session",))
+VAD_SENT = metrics.REGISTRY.gauge("kana_vad_sent_ratio", "Fraction of captured mic frames sent upstream", ("session",))
+OUTBOUND_PENDING = metrics.REGISTRY.gauge("kana_outbound_pending_bytes", "Audio bytes waiting for a client", ("client",))
+OUTBOUND_DROPPED = metrics.REGISTRY.gauge("kana_outbound_dropped_events", "Events dropped for a client", ("client",))
+ACTIVE_SESSIONS = metrics.REGISTRY.gauge("kana_sessions_active", "Running assistant sessions")
+
+
+def _collect_metrics():
+    for gauge in (QUEUE_DEPTH, PLAYBACK_BUFFER, PLAYBACK_UNDERRUNS, VAD_SENT, OUTBOUND_PENDING, OUTBOUND_DROPPED):
+        gauge.clear()
+    ACTIVE_SESSIONS.set(len(sessions))
+    for session in list(sessions.sessions.values()):
+        loop = session.loop
+        QUEUE_DEPTH.set(loop.out_queue.qsize() if loop.out_queue else 0, session=session.key, queue="out")
+        QUEUE_DEPTH.set(loop.audio_in_queue.qsize() if loop.audio_in_queue else 0, session=session.key, queue="audio_in")
+        if loop.playback:
+            PLAYBACK_BUFFER.set(round(loop.playback.depth_ms(), 1), session=session.key)
+            PLAYBACK_UNDERRUNS.set(loop.playback.stats().get("underruns", 0), session=session.key)
+        if loop.vad:
+            VAD_SENT.set(loop.vad.stats()["sent_fraction"], session=session.key)
+    for sid, q in list(outbound_queues.items()):
+        stats = q.stats()
+        OUTBOUND_PENDING.set(stats["pending_audio_bytes"], client=sid)
+        OUTBOUND_DROPPED.set(stats["dropped"], client=sid)
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of latency histograms and queue gauges."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def _transport_backlog(sid):
+    """Packets engineio has queued for the client but not yet written to its socket."""
+    eio_sid = sio.manager.eio_sid_from_sid(sid, "/")
+    socket = sio.eio.sockets.get(eio_sid) if eio_sid else None
+    return socket.queue.qsize() if socket is not None else 0
+
+
+def _outbound(sid):
+    """Per-client outbound queue, created lazily and drained by a single task."""
+    q = outbound_queues.get(sid)
+    if q is None:
+        async def emit(event, data, callback=None):
+            await sio.emit(event, data, room=sid, callback=callback)
+
+        q = OutboundQueue(emit, backlog=lambda: _transport_backlog(sid), name=sid).start()
+        outbound_queues[sid] = q
+    return q
 
 
 @app.get("/api/devices")
 async def get_devices():
-    """Return PyAudio input and output devices for backend selection."""
-    inputs = []
-    outputs = []
+    """Return cached PyAudio input and output devices for backend selection."""
     try:
-        default_in = pya.get_default_input_device_info()
-        default_out = pya.get_default_output_device_info()
-        default_in_idx = default_in.get("index", -1)
-        default_out_idx = default_out.get("index", -1)
-        for i in range(pya.get_device_count()):
-            try:
-                info = pya.get_device_info_by_index(i)
-                raw = info.get("name", f"Device {i}")
-                name = _fix_device_name(raw) or str(raw)
-                if info.get("maxInputChannels", 0) > 0:
-                    inputs.append({"index": i, "name": name, "default": i == default_in_idx})
-                if info.get("maxOutputChannels", 0) > 0:
-                    outputs.append({"index": i, "name": name, "default": i == default_out_idx})
-            except Exception:
-                continue
-        inputs = _deduplicate_devices(inputs, default_in_idx)
-        outputs = _deduplicate_devices(outputs, default_out_idx)
+        return await audio_io.to_thread("device_list", devices.listing)
     except Exception as e:
         return {"error": str(e), "inputs": [], "outputs": []}
-    return {"inputs": inputs, "outputs": outputs}
+
+
+@app.post("/api/devices/refresh")
+async def refresh_devices():
+    """Re-enumerate audio devices now (e.g. after plugging in a headset).
+
+    PortAudio is re-initialized to see new devices, which is only possible while no device
+    stream is open; during a device session the current list is returned."""
+    try:
+        await audio_io.to_thread("device_scan", devices.refresh, True)
+        return devices.listing()
+    except Exception as e:
+        return {"error": str(e), "inputs": [], "outputs": []}
+
+
+def _bundle_response(request, bundle, name=None):
+    """Bundle or clip bytes with ETag revalidation, single byte ranges and optional gzip."""
+    headers = {"ETag": bundle.etag, "Cache-Control": "no-cache", "Accept-Ranges": "bytes", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == bundle.etag:
+        return Response(status_code=304, headers=headers)
+    data = bundle.data if name is None else bundle.clip(name)
+    try:
+        span = animations.parse_range(request.headers.get("range"), len(data))
+    except ValueError:
+        return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{len(data)}"}))
+    if span:
+        start, end = span
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(data)}"
+        return Response(bytes(data[start:end]), status_code=206, headers=headers, media_type="application/octet-stream")
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        data = bundle.compressed(name)
+    return Response(bytes(data), headers=headers, media_type="application/octet-stream")
+
+
+@app.get("/api/animations")
+async def animation_catalog_index(request: Request):
+    """Every clip with duration, frame timing, bones, category, variant group and emotion tag."""
+    catalog = await asyncio.to_thread(animation_catalog.get)
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == catalog.etag:
+        return Response(status_code=304, headers=headers)
+    body = catalog.body
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        body = catalog.gzip_body
+    return Response(body, headers=headers, media_type="application/json")
+
+
+@app.get("/api/animations/bundle/index")
+async def animation_bundle_index():
+    """Clip table of the binary animation bundle (offsets, frame timing, bone per track)."""
+    bundle = await asyncio.to_thread(animation_bundle.get)
+    return dict(bundle.index, etag=bundle.etag.strip('"'))
+
+
+@app.get("/api/animations/bundle")
+async def animation_bundle_data(request: Request):
+    bundle = await asyncio.to_thread(animation_bundle.get)
+    return await asyncio.to_thread(_bundle_response, request, bundle)
+
+
+@app.get("/api/animations/clip/{name}")
+async def animation_clip(name: str, request: Request, v: str = None):
+    """One clip's track data; `v` is the index etag, so a stale index gets 412 instead of misaligned bytes."""
+    bundle = await asyncio.to_thread(animation_bundle.get)
+    if bundle.clip(name) is None:
+        return Response(status_code=404)
+    if v is not None and v != bundle.etag.strip('"'):
+        return Response(status_code=412)
+    response = await asyncio.to_thread(_bundle_response, request, bundle, name)
+    if v is not None:
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@app.get("/api/transcript")
+async def transcript_history(session: str = None, key: str = None, before: int = None, after: int = None,
+                             limit: int = transcript.PAGE_DEFAULT):
+    """Paged conversation history of a room (`session`) or a session key; cursors are record ids."""
+    store = transcripts.get(_session_key(key, {"session": session}), create=False)
+    if store is None:
+        return Response(status_code=404)
+    return await store.history(before=before, after=after, limit=limit)
+
+
+@app.on_event("startup")
+async def _startup():
+    loop_monitor.start()
+    # Не ждём прогрева: /status отвечает сразу, тяжёлая инициализация идёт в фоне
+    asyncio.create_task(_warm_up())
+
+
+async def _warm_up():
+    steps = [("genai client", get_client, None), ("live config", get_config, None),
+             ("animation catalog", animation_catalog.get, None), ("animation bundle", animation_bundle.get, None)]
+    if "device" in (audio_io.INPUT, audio_io.OUTPUT):
+        # Список устройств строим один раз при старте, дальше — фоновая проверка
+        steps.insert(0, ("portaudio + devices", devices.refresh, audio_io.EXECUTOR))
+    for name, fn, executor in steps:
+        try:
+            with startup.phase(name):
+                await metrics.to_thread("startup", fn, executor=executor)
+        except Exception as e:
+            print(f"[KANA] Startup step '{name}' failed: {e}")
+    devices.start_watcher()
+    _start_live_pool()
+    startup.ready()
+
+
+def _start_live_pool():
+    """Keep warm Gemini Live sessions so start_audio does not wait for the handshake."""
+    global live_pool
+    if live.POOL_SIZE <= 0 or (live.needs_api_key() and not os.getenv("GEMINI_API_KEY")):
+        return
+
+    async def factory():
+        return await live.open_session(get_client(), MODEL, live.with_resumption(get_config()), CONNECT_TIMEOUT_SEC)
+
+    live_pool = live.LiveSessionPool(factory).start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    loop_monitor.stop()
+    if live_pool:
+        await live_pool.stop()
+    transcripts.close()
 
 
 @sio.event
 async def connect(sid, environ):
     print(f"[KANA] Client connected: {sid}")
-    await sio.emit("status", {"msg": "Connected to KANA Backend"}, room=sid)
+    _outbound(sid).put("status", {"msg": "Connected to KANA Backend"})
 
 
 @sio.event
 async def disconnect(sid):
     print(f"[KANA] Client disconnected: {sid}")
+    await sessions.disconnect(sid)
+    q = outbound_queues.pop(sid, None)
+    if q:
+        await q.close(timeout=0)
 
 
-async def _wait_loop_stop(timeout=8.0):
-    global audio_loop, loop_task
-    if audio_loop:
-        audio_loop.stop()
-        audio_loop = None
-    old_task = loop_task
-    loop_task = None
-    if old_task and not (old_task.done() or old_task.cancelled()):
-        try:
-            await asyncio.wait_for(asyncio.shield(old_task), timeout=timeout)
-        except (asyncio.TimeoutError, asyncio.CancelledError):
-            old_task.cancel()
-            try:
-                await old_task
-            except asyncio.CancelledError:
-                pass
+def _session_key(sid, data):
+    """Session key: a named room from the payload, otherwise the client's own sid."""
+    room = (data or {}).get("session")
+    return f"room:{room}" if room else sid
+
+
+def _broadcast(session, event, data):
+    for client in list(session.clients):
+        _outbound(client).put(event, data)
 
 
 @sio.event
 async def start_audio(sid, data=None):
-    global audio_loop, loop_task
-
-    if audio_loop and loop_task and not (loop_task.done() or loop_task.cancelled()):
-        await sio.emit("status", {"msg": "KANA Already Running"}, room=sid)
+    key = _session_key(sid, data)
+    audio_format = transport.negotiate(data, RECEIVE_SAMPLE_RATE)
+
+    existing = sessions.get(key)
+    if existing and existing.running and not existing.loop.text_only:
+        if sid in existing.clients:
+            _outbound(sid).put("status", {"msg": "KANA Already Running"})
+            return
+        await sessions.join(key, sid)
+        _outbound(sid).set_audio_encoder(transport.AudioEncoder(audio_format))
+        _outbound(sid).on_audio_sent = lambda: existing.loop.turns.mark("emit")
+        _outbound(sid).put("audio_format", audio_format)
+        _outbound(sid).put("transcript_session", {"session": key, "last_id": transcripts.get(key).last_id})
+        ready = existing.loop.session is not None
+        _outbound(sid).put("status", {"msg": "KANA Started" if ready else "Connecting to KANA..."})
         return
 
-    if loop_task and not (loop_task.done() or loop_task.cancelled()):
-        await _wait_loop_stop()
-
     device_index = data.get("device_index") if data else None
     device_name = data.get("device_name") if data else None
     output_device_index = data.get("output_device_index") if data else None
     output_device_name = data.get("output_device_name") if data else None
     muted = data.get("muted", False) if data else False
+    vad = bool(data.get("vad", VAD_ENABLED)) if data else VAD_ENABLED
+    vad_barge_in = bool(data.get("vad_barge_in", False)) if data else False
+    noise_suppression = bool(data.get("noise_suppression", False)) if data else False
+    audio_input = data.get("audio_input") if data else None
+    record = bool(data.get("record", recorder.RECORD_ALL)) if data else recorder.RECORD_ALL
+    audio_output = data.get("audio_output") if data else None
+    # Проверяем запрос до того, как что-то останавливать: неверный выбор не должен убить текстовый чат
+    for choice in (audio_input, audio_output):
+        if choice is not None and choice not in audio_io.CLIENT_CHOICES:
+            _outbound(sid).put("error", {"msg": f"Unsupported audio backend: {choice!r} (use one of {', '.join(audio_io.CLIENT_CHOICES)})"})
+            return
+
+    upgrade = bool(existing and existing.running)
+    peers = existing.clients - {sid} if upgrade else ()
+    previous = sessions.for_sid(sid)
+    if previous and previous is not existing:
+        # Из чужой комнаты только уходим: остановится, если клиент был в ней последним
+        await sessions.leave(sid)
+    if existing:
+        await sessions.stop(existing)
+    context = None
+    if upgrade:
+        # Текстовый чат переходит в голос: та же история, модель получает её как контекст.
+        # Читаем после остановки — недосказанный ответ уже закрыт end_turn()
+        print(f"[KANA] Upgrading text session {key} to voice")
+        context = transcripts.get(key).recent(CONTEXT_TURNS)
+    await _launch(
+        sid, key, audio_format, context=context, peers=peers,
+        input_device_index=device_index,
+        input_device_name=device_name,
+        output_device_index=output_device_index,
+        output_device_name=output_device_name,
+        vad=vad,
+        vad_barge_in=vad_barge_in,
+        noise_suppression=noise_suppression,
+        audio_input=audio_input,
+        audio_output=audio_output,
+        record=record,
+        muted=muted,
+    )
+
+
+async def _launch(sid, key, audio_format=None, text_only=False, context=None, peers=(), muted=False, **options):
+    """Create, admit and start an AssistantLoop for key: voice with an audio_format, or a text chat."""
+    mode = "text" if text_only else "voice"
+    if not text_only:
+        _outbound(sid).set_audio_encoder(transport.AudioEncoder(audio_format))
+    session = None
 
     def on_audio_data(data_bytes):
-        asyncio.create_task(sio.emit("audio_data", {"data": list(data_bytes)}, room=sid))
+        for client in list(session.clients):
+            _outbound(client).put_audio(data_bytes)
 
     def on_transcription(data):
-        asyncio.create_task(sio.emit("transcription", data, room=sid))
+        _broadcast(session, "transcription", data)
 
     def on_error(msg):
-        asyncio.create_task(sio.emit("error", {"msg": msg}, room=sid))
+        _broadcast(session, "error", {"msg": msg})
 
     def on_ready():
-        asyncio.create_task(sio.emit("status", {"msg": "KANA Started"}, room=sid))
+        _broadcast(session, "status", {"msg": "KANA Chat Ready" if text_only else "KANA Started", "mode": mode})
 
     def on_stopped():
-        asyncio.create_task(sio.emit("status", {"msg": "KANA Stopped"}, room=sid))
+        _broadcast(session, "status", {"msg": "KANA Stopped", "mode": mode})
+
+    def on_transcript_record(record):
+        _broadcast(session, "transcript_turn", record)
 
-    await sio.emit("status", {"msg": "Connecting to KANA..."}, room=sid)
+    def on_cue(cue):
+        _broadcast(session, "animation_cue", cue)
+
+    def on_lipsync(frame):
+        # Кадр виземы заменяет неотправленный предыдущий: медленный клиент пропускает кадры, а не копит их
+        for client in list(session.clients):
+            _outbound(client).put_latest("lipsync", frame)
+
+    def on_interrupted(info):
+        for client in list(session.clients):
+            q = _outbound(client)
+            q.drop_audio()
+            q.drop_latest("lipsync")
+            q.put("interrupted", info)
+
+    history = transcripts.get(key)
+    history.attach(on_transcription, on_transcript_record)
 
     try:
         audio_loop = AssistantLoop(
@@ -170,47 +396,84 @@ async def start_audio(sid, data=None):
             on_error=on_error,
             on_ready=on_ready,
             on_stopped=on_stopped,
-            input_device_index=device_index,
-            input_device_name=device_name,
-            output_device_index=output_device_index,
-            output_device_name=output_device_name,
+            on_interrupted=on_interrupted,
+            on_cue=on_cue,
+            on_lipsync=on_lipsync,
+            session_pool=live_pool,
+            name=key,
+            transcript=history,
+            text_only=text_only,
+            context=context,
+            **options,
         )
         if muted:
             audio_loop.set_paused(True)
 
-        loop_task = asyncio.create_task(audio_loop.run())
-        loop_task.add_done_callback(lambda t: None)  # avoid unhandled exception in callback
+        session = sessions.admit(key, sid, audio_loop)
+        for peer in peers:
+            await sessions.join(key, peer)
+            _outbound(peer).set_audio_encoder(transport.AudioEncoder(audio_format))
+            _outbound(peer).put("audio_format", audio_format)
+        _outbound(sid).on_audio_sent = lambda: audio_loop.turns.mark("emit")
+        _outbound(sid).put("status", {"msg": "Connecting to KANA...", "mode": mode})
+        if not text_only:
+            _outbound(sid).put("audio_format", audio_format)
+        _outbound(sid).put("transcript_session", {"session": key, "last_id": history.last_id})
+        task = sessions.start(session, audio_loop.run())
+
+        def on_done(_task):
+            # История больше не привязана к работающей сессии — реестр может её вытеснить
+            history.detach(on_transcription)
+            metrics.REGISTRY.forget(session=key)
+
+        task.add_done_callback(on_done)
+        return audio_loop
+    except SessionLimitError as e:
+        history.detach(on_transcription)
+        print(f"[KANA] Rejected session {key}: {e}")
+        _outbound(sid).put("error", {"msg": f"KANA busy: {e}"})
+        _outbound(sid).put("status", {"msg": "KANA Stopped"})
     except Exception as e:
+        history.detach(on_transcription)
         print(f"[KANA] Failed to start: {e}")
         import traceback
         traceback.print_exc()
-        await sio.emit("error", {"msg": f"Failed to start: {str(e)}"}, room=sid)
-        audio_loop = None
+        _outbound(sid).put("error", {"msg": f"Failed to start: {str(e)}"})
 
 
 @sio.event
 async def stop_audio(sid):
-    global audio_loop, loop_task
     try:
-        await _wait_loop_stop()
+        # Общая комната продолжает работать для остальных клиентов
+        await sessions.leave(sid)
     finally:
-        await sio.emit("status", {"msg": "KANA Stopped"}, room=sid)
+        _outbound(sid).put("status", {"msg": "KANA Stopped"})
 
 
 @sio.event
 async def pause_audio(sid, data=None):
-    global audio_loop
-    if audio_loop:
-        audio_loop.set_paused(True)
-        await sio.emit("status", {"msg": "Audio Paused"}, room=sid)
+    session = sessions.for_sid(sid)
+    if session:
+        session.loop.set_paused(True)
+        _outbound(sid).put("status", {"msg": "Audio Paused"})
 
 
 @sio.event
 async def resume_audio(sid, data=None):
-    global audio_loop
-    if audio_loop:
-        audio_loop.set_paused(False)
-        await sio.emit("status", {"msg": "Audio Resumed"}, room=sid)
+    session = sessions.for_sid(sid)
+    if session:
+        session.loop.set_paused(False)
+        _outbound(sid).put("status", {"msg": "Audio Resumed"})
+
+
+@sio.event
+async def audio_input(sid, data):
+    """Mic PCM from the browser: 16 kHz mono int16 in binary frames (audio_input=browser)."""
+    if not isinstance(data, (bytes, bytearray)):
+        return
+    session = sessions.for_sid(sid)
+    if session:
+        session.loop.push_audio(data)
 
 
 @sio.event
@@ -218,24 +481,32 @@ async def user_input(sid, data):
     text = (data or {}).get("text", "").strip()
     if not text:
         return
-    if not audio_loop or not audio_loop.session:
-        await sio.emit("error", {"msg": "KANA not ready. Start audio first."}, room=sid)
-        return
+    session = sessions.for_sid(sid)
+    if session and session.running:
+        loop = session.loop
+    else:
+        # Без голосовой сессии — лёгкий текстовый чат: ни устройств, ни синтеза речи
+        key = _session_key(sid, data)
+        existing = sessions.get(key)
+        if existing and existing.running:
+            await sessions.join(key, sid)
+            loop = existing.loop
+        else:
+            loop = await _launch(sid, key, text_only=True, record=bool((data or {}).get("record", recorder.RECORD_ALL)))
+            if loop is None:
+                return
     try:
-        await audio_loop.session.send(input=text, end_of_turn=True)
+        await loop.send_text(text)
     except Exception as e:
-        await sio.emit("error", {"msg": str(e)}, room=sid)
+        _outbound(sid).put("error", {"msg": str(e)})
 
 
 @sio.event
 async def shutdown(sid, data=None):
-    global audio_loop, loop_task
-    if audio_loop:
-        audio_loop.stop()
-        audio_loop = None
-    if loop_task and not loop_task.done():
-        loop_task.cancel()
-        loop_task = None
+    for session in list(sessions.sessions.values()):
+        session.loop.stop()
+        if session.task and not session.task.done():
+            session.task.cancel()
     os._exit(0)
 
 
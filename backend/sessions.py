@@ -0,0 +1,148 @@
+"""
+KANA — реестр сессий: один AssistantLoop на клиента (sid) или на именованную комнату.
+"""
+import asyncio
+import os
+import time
+
+DEFAULT_MAX_SESSIONS = int(os.getenv("KANA_MAX_SESSIONS", "4"))
+STOP_TIMEOUT_SEC = 8.0
+
+
+class SessionLimitError(Exception):
+    """Raised when admission control rejects a new session."""
+
+
+class Session:
+    """A running assistant loop plus the socket.io clients attached to it."""
+
+    def __init__(self, key, loop):
+        self.key = key
+        self.loop = loop
+        self.task = None
+        self.clients = set()
+        self.created_at = time.time()
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def info(self):
+        stats = getattr(self.loop, "stats", None)
+        return {
+            "key": self.key,
+            "clients": sorted(self.clients),
+            "running": self.running,
+            "paused": bool(getattr(self.loop, "paused", False)),
+            "connected": getattr(self.loop, "session", None) is not None,
+            "uptime_sec": round(time.time() - self.created_at, 1),
+            "stats": stats() if stats else None,
+        }
+
+
+class SessionManager:
+    """Owns the live sessions, enforces the concurrency limit and cleans up on disconnect."""
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self._by_sid = {}
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, key):
+        return self.sessions.get(key)
+
+    def for_sid(self, sid):
+        key = self._by_sid.get(sid)
+        return self.sessions.get(key) if key is not None else None
+
+    async def join(self, key, sid):
+        """Attach a client to an existing session (named rooms), leaving its previous one."""
+        session = self.sessions.get(key)
+        if session is None:
+            return None
+        if self._by_sid.get(sid) != key:
+            await self.leave(sid)
+        session.clients.add(sid)
+        self._by_sid[sid] = key
+        return session
+
+    def _leave(self, sid):
+        key = self._by_sid.pop(sid, None)
+        session = self.sessions.get(key) if key is not None else None
+        if session:
+            session.clients.discard(sid)
+        return session
+
+    def admit(self, key, sid, loop):
+        """Register a new session for key; raises SessionLimitError when the limit is reached."""
+        if key in self.sessions:
+            raise RuntimeError(f"session {key} already exists")
+        if self.max_sessions and len(self.sessions) >= self.max_sessions:
+            self.rejected += 1
+            raise SessionLimitError(f"Session limit reached ({self.max_sessions})")
+        self._leave(sid)
+        session = Session(key, loop)
+        session.clients.add(sid)
+        self.sessions[key] = session
+        self._by_sid[sid] = key
+        return session
+
+    def start(self, session, coro):
+        session.task = asyncio.create_task(coro)
+        session.task.add_done_callback(lambda t: self._on_done(session, t))
+        return session.task
+
+    def _on_done(self, session, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[KANA] Session {session.key} failed: {task.exception()}")
+        if self.sessions.get(session.key) is session:
+            self._forget(session)
+
+    def _forget(self, session):
+        self.sessions.pop(session.key, None)
+        for sid in list(session.clients):
+            if self._by_sid.get(sid) == session.key:
+                self._by_sid.pop(sid, None)
+
+    async def stop(self, session, timeout=STOP_TIMEOUT_SEC):
+        """Stop a session and wait for its loop task to finish."""
+        if self.sessions.get(session.key) is session:
+            self._forget(session)
+        session.loop.stop()
+        task = session.task
+        if task and not task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            except Exception:
+                pass
+
+    async def leave(self, sid):
+        """Detach sid; stop its session when no clients are left (a shared room keeps running)."""
+        session = self._leave(sid)
+        if session and not session.clients:
+            await self.stop(session)
+        return session
+
+    async def disconnect(self, sid):
+        return await self.leave(sid)
+
+    async def stop_all(self, timeout=STOP_TIMEOUT_SEC):
+        await asyncio.gather(*(self.stop(s, timeout) for s in list(self.sessions.values())))
+
+    def snapshot(self):
+        return {
+            "max_sessions": self.max_sessions,
+            "active": len(self.sessions),
+            "rejected": self.rejected,
+            "sessions": [s.info() for s in self.sessions.values()],
+        }
@@ -0,0 +1,48 @@
+"""
+KANA — профиль запуска сервера: время импортов и отложенной инициализации.
+
+KANA_STARTUP_PROFILE=1 — напечатать отчёт, когда прогрев закончен; этапы всегда видны в /status.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+PROFILE = os.getenv("KANA_STARTUP_PROFILE", "0") == "1"
+T0 = time.perf_counter()
+
+_phases = []
+_ready_ms = None
+
+
+@contextmanager
+def phase(name):
+    """Time a block (an import group or an init step) relative to process start."""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, (t - T0) * 1000.0, (time.perf_counter() - t) * 1000.0))
+
+
+def ready():
+    global _ready_ms
+    if _ready_ms is None:
+        _ready_ms = (time.perf_counter() - T0) * 1000.0
+        if PROFILE:
+            report()
+
+
+def report():
+    print("[KANA] Startup profile (ms since start / duration):")
+    for name, start, duration in _phases:
+        print(f"[KANA]   {name:<28} {start:8.1f}  {duration:8.1f}")
+    if _ready_ms is not None:
+        print(f"[KANA]   {'warm':<28} {_ready_ms:8.1f}")
+
+
+def snapshot():
+    return {
+        "ready": _ready_ms is not None,
+        "ready_ms": round(_ready_ms, 1) if _ready_ms is not None else None,
+        "phases": [{"name": n, "start_ms": round(s, 1), "ms": round(d, 1)} for n, s, d in _phases],
+    }
@@ -0,0 +1,255 @@
+"""
+KANA — история разговора на сервере: дельты транскрипции копятся в пачки (раз в KANA_TRANSCRIPT_FLUSH_MS
+или на конце предложения), реплики в конце хода становятся записями с номером.
+
+Последние KANA_TRANSCRIPT_TURNS записей сессии — в памяти, более старые дописываются в журнал
+JSON Lines (KANA_TRANSCRIPT_DIR); страницы истории — по курсору (номеру записи) в обе стороны.
+Переподключившийся клиент догружает только то, что пропустил.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+
+_backend_dir = os.path.dirname(os.path.abspath(__file__))
+TRANSCRIPT_DIR = os.getenv("KANA_TRANSCRIPT_DIR", os.path.join(_backend_dir, ".cache", "transcripts"))
+TRANSCRIPT_FLUSH_MS = float(os.getenv("KANA_TRANSCRIPT_FLUSH_MS", "80"))
+TRANSCRIPT_TURNS = int(os.getenv("KANA_TRANSCRIPT_TURNS", "200"))  # записей в памяти на сессию
+TRANSCRIPT_SESSIONS = int(os.getenv("KANA_TRANSCRIPT_SESSIONS", "32"))  # историй в памяти на сервер
+PAGE_DEFAULT = 50
+PAGE_MAX = 200
+SENTENCE_END = ".!?…\n"
+
+
+class TranscriptStore:
+    """One session's transcript: delta batching, utterance records, a ring in memory and a spill log.
+
+    delta()/record()/end_turn() are called from the event loop thread; the log is read in a worker
+    thread by history(), at offsets remembered when records were spilled.
+    """
+
+    def __init__(self, key, directory=TRANSCRIPT_DIR, ring=TRANSCRIPT_TURNS, flush_ms=TRANSCRIPT_FLUSH_MS):
+        self.key = key
+        self.directory = directory
+        self.flush_sec = flush_ms / 1000.0
+        self.on_batch = None
+        self.on_record = None
+        self._ring = deque()
+        self._ring_size = max(1, ring)
+        self._open = {}  # sender -> открытая реплика {"turn", "started", "parts"}
+        self._batch = None  # (sender, turn, [части]) — ещё не отправленная пачка
+        self._timer = None
+        self._log = None
+        self._log_path = None
+        self._offsets = []  # смещение каждой записи в журнале; номер записи = индекс + 1
+        self.last_id = 0
+        self.deltas = 0
+        self.batches = 0
+
+    def attach(self, on_batch=None, on_record=None):
+        """Route batches and finished records to the session that currently owns this transcript."""
+        self.on_batch = on_batch
+        self.on_record = on_record
+
+    def detach(self, on_batch=None):
+        """The owning session ended; with on_batch, only if that session is still the owner."""
+        if on_batch is None or self.on_batch is on_batch:
+            self.on_batch = None
+            self.on_record = None
+
+    @property
+    def attached(self):
+        return self.on_batch is not None or self.on_record is not None
+
+    def delta(self, sender, text, turn):
+        """A transcription delta: extend the sender's utterance and the outgoing batch."""
+        if not text:
+            return
+        self.deltas += 1
+        utterance = self._open.get(sender)
+        if utterance is not None and utterance["turn"] != turn:
+            self._finalize(sender)
+            utterance = None
+        if utterance is None:
+            utterance = self._open[sender] = {"turn": turn, "started": time.time(), "parts": []}
+        utterance["parts"].append(text)
+
+        if self._batch and self._batch[:2] != (sender, turn):
+            self.flush()
+        if self._batch is None:
+            self._batch = (sender, turn, [])
+        self._batch[2].append(text)
+        if text.rstrip(" ")[-1:] in SENTENCE_END:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_sec, self.flush)
+
+    def flush(self):
+        """Send the pending batch now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._batch is None:
+            return
+        sender, turn, parts = self._batch
+        self._batch = None
+        self.batches += 1
+        if self.on_batch:
+            self.on_batch({"sender": sender, "text": "".join(parts), "turn": turn})
+
+    def record(self, sender, text, turn):
+        """A complete utterance that did not arrive as deltas (typed input)."""
+        self.flush()
+        self._finalize(sender)
+        now = time.time()
+        self._append({"sender": sender, "turn": turn, "text": text, "started": now, "ended": now})
+
+    def end_turn(self):
+        """Turn complete: flush and turn the open utterances into records, in the order they started."""
+        self.flush()
+        for sender in sorted(self._open, key=lambda s: self._open[s]["started"]):
+            self._finalize(sender)
+
+    def _finalize(self, sender):
+        utterance = self._open.pop(sender, None)
+        if utterance is None:
+            return
+        text = "".join(utterance["parts"]).strip()
+        if text:
+            self._append({
+                "sender": sender,
+                "turn": utterance["turn"],
+                "text": text,
+                "started": utterance["started"],
+                "ended": time.time(),
+            })
+
+    def _append(self, record):
+        self.last_id += 1
+        record = dict(id=self.last_id, **record)
+        self._ring.append(record)
+        while len(self._ring) > self._ring_size:
+            self._spill(self._ring.popleft())
+        if self.on_record:
+            self.on_record(record)
+
+    def _spill(self, record):
+        if self._log is None:
+            if self._log_path is None:
+                os.makedirs(self.directory, exist_ok=True)
+                safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(self.key))
+                self._log_path = os.path.join(self.directory, f"{safe}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+            # Один журнал на историю: после close() дописываем в тот же файл, смещения остаются верными
+            self._log = open(self._log_path, "ab")
+        self._offsets.append(self._log.tell())
+        self._log.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._log.flush()
+
+    def _read_log(self, first, count):
+        with open(self._log_path, "rb") as f:
+            f.seek(self._offsets[first - 1])
+            return [json.loads(f.readline()) for _ in range(count)]
+
+    def recent(self, count):
+        """The last `count` records still in memory (to seed a new model session)."""
+        return list(self._ring)[-count:] if count > 0 else []
+
+    async def history(self, before=None, after=None, limit=PAGE_DEFAULT):
+        """A page of records, oldest first.
+
+        `after` pages forward from a record id (resync after a reconnect), `before` pages back
+        (scrolling up); with neither, the latest page. `next` is the cursor for the following page
+        in the same direction, or None at the end.
+        """
+        limit = max(1, min(int(limit), PAGE_MAX))
+        if after is not None:
+            lo = max(0, int(after)) + 1
+            hi = min(self.last_id, lo + limit - 1)
+            more = hi < self.last_id
+        else:
+            hi = min(self.last_id, (int(before) if before is not None else self.last_id + 1) - 1)
+            lo = max(1, hi - limit + 1)
+            more = lo > 1
+        records = []
+        if lo <= hi:
+            # Снимок кольца — до ожидания журнала: пока читаем файл, кольцо может сдвинуться
+            ring = list(self._ring)
+            ring_first = ring[0]["id"] if ring else self.last_id + 1
+            if lo < ring_first:
+                records = await asyncio.to_thread(self._read_log, lo, min(hi, ring_first - 1) - lo + 1)
+            records += [r for r in ring if lo <= r["id"] <= hi]
+        if not records:
+            cursor = None
+        else:
+            cursor = (records[-1]["id"] if after is not None else records[0]["id"]) if more else None
+        return {
+            "session": self.key,
+            "last_id": self.last_id,
+            "turns": records,
+            "next": cursor,
+            # Реплики текущего хода, ещё не ставшие записями
+            "partial": [
+                {"sender": s, "turn": u["turn"], "text": "".join(u["parts"])} for s, u in self._open.items()
+            ],
+        }
+
+    def close(self):
+        self.end_turn()
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def stats(self):
+        return {
+            "records": self.last_id,
+            "in_memory": len(self._ring),
+            "spilled": len(self._offsets),
+            "deltas": self.deltas,
+            "batches": self.batches,
+        }
+
+
+class TranscriptRegistry:
+    """Transcripts by session key; they outlive the assistant loop so a client can resync after a
+    reconnect. The least recently used ones beyond the limit are closed (their logs stay on disk);
+    a transcript attached to a running session is never evicted, so the limit may be exceeded
+    while that many sessions run."""
+
+    def __init__(self, max_sessions=TRANSCRIPT_SESSIONS, directory=TRANSCRIPT_DIR):
+        self.max_sessions = max_sessions
+        self.directory = directory
+        self._stores = OrderedDict()
+
+    def get(self, key, create=True):
+        store = self._stores.get(key)
+        if store is not None:
+            self._stores.move_to_end(key)
+        elif create:
+            store = self._stores[key] = TranscriptStore(key, self.directory)
+            self._evict(keep=key)
+        return store
+
+    def _evict(self, keep=None):
+        excess = len(self._stores) - self.max_sessions
+        for key in list(self._stores):
+            if excess <= 0:
+                break
+            old = self._stores[key]
+            if old.attached or key == keep:
+                continue  # история работающей сессии: в неё ещё пишет AssistantLoop
+            del self._stores[key]
+            old.close()
+            excess -= 1
+
+    def close(self):
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
+
+    def stats(self):
+        return {
+            "sessions": len(self._stores),
+            "attached": sum(1 for s in self._stores.values() if s.attached),
+            "records": sum(s.last_id for s in self._stores.values()),
+        }
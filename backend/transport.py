@@ -0,0 +1,169 @@
+"""
+KANA — транспорт аудио для socket.io: бинарные кадры вместо JSON-списков чисел.
+
+В бинарных кадрах звук может идти сжатым (codec.py) и на своей частоте: клиент перечисляет
+кодеки в audio_codecs, сервер ресемплирует и кодирует кадр целиком перед отправкой.
+"""
+import struct
+import time
+
+import codec
+from resample import Resampler
+
+TRANSPORT_JSON = "json"
+TRANSPORT_BINARY = "binary"
+TRANSPORT_NONE = "none"  # клиенту не нужен PCM (только аватар: ему хватает событий lipsync)
+TRANSPORTS = (TRANSPORT_JSON, TRANSPORT_BINARY, TRANSPORT_NONE)
+
+SAMPLE_WIDTH = 2  # int16 mono
+
+# Заголовок бинарного кадра: seq (uint32), sample_rate (uint32), timestamp_ms (float64).
+# 16 байт — PCM после заголовка остаётся выровненным для Int16Array на клиенте.
+FRAME_HEADER = struct.Struct("<IId")
+FRAME_HEADER_FORMAT = "<IId"
+
+DEFAULT_FRAME_MS = 40
+MAX_FRAME_MS = 500
+
+
+def negotiate(data, sample_rate):
+    """Pick the audio transport and codec from the start_audio payload. Unknown values fall back to JSON / pcm."""
+    data = data or {}
+    transport = str(data.get("audio_transport") or TRANSPORT_JSON).lower()
+    if transport not in TRANSPORTS:
+        transport = TRANSPORT_JSON
+    try:
+        frame_ms = int(data.get("audio_frame_ms", DEFAULT_FRAME_MS if transport == TRANSPORT_BINARY else 0))
+    except (TypeError, ValueError):
+        frame_ms = DEFAULT_FRAME_MS
+    frame_ms = max(0, min(frame_ms, MAX_FRAME_MS))
+    name = codec.negotiate(data.get("audio_codecs") or data.get("audio_codec")) if transport == TRANSPORT_BINARY else "pcm"
+    if name == "opus":
+        # Пакет Opus — ровно 10/20/40/60 мс
+        frame_ms = min(codec.OPUS_FRAME_MS, key=lambda ms: abs(ms - (frame_ms or DEFAULT_FRAME_MS)))
+    return {
+        "transport": transport,
+        "codec": name,
+        "sample_rate": codec.codec_rate(name, sample_rate, data.get("audio_codec_rate")),
+        "source_rate": sample_rate,
+        "channels": 1,
+        "sample_width": SAMPLE_WIDTH,
+        "frame_ms": frame_ms,
+        "header": FRAME_HEADER_FORMAT if transport == TRANSPORT_BINARY else None,
+        "header_size": FRAME_HEADER.size if transport == TRANSPORT_BINARY else 0,
+        # Клиент подтверждает каждый audio_data (ack socket.io) — сервер видит, сколько ещё в пути
+        "ack": bool(data.get("audio_ack")) and transport != TRANSPORT_NONE,
+    }
+
+
+def encode_json(data_bytes):
+    """Legacy payload: list of byte values (kept for old clients)."""
+    return {"data": list(data_bytes)}
+
+
+class AudioFramer:
+    """Packs PCM chunks into fixed-duration binary frames with a small header.
+
+    frame_ms == 0 disables batching: every chunk becomes its own frame.
+    """
+
+    def __init__(self, sample_rate, frame_ms=DEFAULT_FRAME_MS, encode=bytes):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.encode = encode  # PCM кадра -> payload (сжатие кодеком)
+        frame_bytes = sample_rate * SAMPLE_WIDTH * frame_ms // 1000
+        self.frame_bytes = frame_bytes - frame_bytes % SAMPLE_WIDTH
+        self.seq = 0
+        self._pending = bytearray()
+        self._pending_ts = None
+
+    def _frame(self, payload, timestamp_ms):
+        header = FRAME_HEADER.pack(self.seq & 0xFFFFFFFF, self.sample_rate, timestamp_ms)
+        self.seq += 1
+        return header + self.encode(payload)
+
+    def push(self, data_bytes):
+        """Add a PCM chunk; return the list of complete frames (possibly empty)."""
+        now_ms = time.time() * 1000.0
+        if not self.frame_bytes:
+            return [self._frame(data_bytes, now_ms)]
+        if not self._pending:
+            self._pending_ts = now_ms
+        self._pending += data_bytes
+        frames = []
+        view = memoryview(self._pending)
+        offset = 0
+        ts = self._pending_ts
+        ms_per_byte = 1000.0 / (self.sample_rate * SAMPLE_WIDTH)
+        while len(self._pending) - offset >= self.frame_bytes:
+            frames.append(self._frame(view[offset:offset + self.frame_bytes], ts))
+            offset += self.frame_bytes
+            ts += self.frame_bytes * ms_per_byte
+        view.release()
+        if offset:
+            del self._pending[:offset]
+            self._pending_ts = ts
+        return frames
+
+    def flush(self):
+        """Return the partial frame left in the buffer, or None."""
+        if not self._pending:
+            return None
+        usable = len(self._pending) - len(self._pending) % SAMPLE_WIDTH
+        frame = self._frame(self._pending[:usable], self._pending_ts) if usable else None
+        self._pending.clear()
+        self._pending_ts = None
+        return frame
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+
+class AudioEncoder:
+    """Turns PCM chunks into audio_data payloads for the negotiated transport and codec."""
+
+    def __init__(self, audio_format):
+        self.format = audio_format
+        self.framer = None
+        self.codec = None
+        self.resampler = None
+        if audio_format["transport"] == TRANSPORT_BINARY:
+            rate = audio_format["sample_rate"]
+            source_rate = audio_format.get("source_rate", rate)
+            self.codec = codec.create(audio_format.get("codec", "pcm"), rate)
+            self.resampler = Resampler(source_rate, rate) if source_rate != rate else None
+            self.framer = AudioFramer(rate, audio_format["frame_ms"], encode=self.codec.encode)
+
+    @property
+    def enabled(self):
+        return self.format["transport"] != TRANSPORT_NONE
+
+    @property
+    def flush_delay(self):
+        """Seconds to wait for more audio before sending a partial frame (None — nothing pending)."""
+        if self.framer is None or not self.framer.pending:
+            return None
+        return max(self.format["frame_ms"], 1) / 1000.0
+
+    def encode(self, data_bytes):
+        if self.framer is None:
+            return [encode_json(data_bytes)]
+        if self.resampler:
+            data_bytes = self.resampler.process(data_bytes)
+        return self.framer.push(data_bytes)
+
+    def flush(self):
+        if self.framer is None:
+            return []
+        frame = self.framer.flush()
+        return [frame] if frame else []
+
+    def reset(self):
+        """Interruption: forget the partial frame and the resampler/codec state."""
+        if self.framer is None:
+            return
+        self.framer.flush()
+        if self.resampler:
+            self.resampler.reset()
+        self.codec.reset()
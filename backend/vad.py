@@ -0,0 +1,162 @@
+"""
+KANA — детектор речи (VAD) между микрофоном и send_realtime: тишина не уходит в Gemini.
+"""
+import math
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+VAD_ENABLED = os.getenv("KANA_VAD", "1") != "0"
+VAD_MIN_DBFS = float(os.getenv("KANA_VAD_MIN_DBFS", "-50"))
+VAD_MARGIN_DB = float(os.getenv("KANA_VAD_MARGIN_DB", "9"))
+VAD_HANGOVER_MS = int(os.getenv("KANA_VAD_HANGOVER_MS", "700"))
+VAD_PREROLL_MS = int(os.getenv("KANA_VAD_PREROLL_MS", "250"))
+VAD_KEEPALIVE_SEC = float(os.getenv("KANA_VAD_KEEPALIVE_SEC", "5"))
+VAD_MAX_ZCR = 0.45  # выше — скорее шум/шипение, если энергия невелика
+NOISE_FLOOR_ALPHA = 0.05
+# Окно минимума энергии: в речи есть паузы, поэтому минимум за окно — оценка шума (minimum statistics)
+VAD_NOISE_WINDOW_SEC = float(os.getenv("KANA_VAD_NOISE_WINDOW_SEC", "5"))
+NOISE_FLOOR_RISE_ALPHA = 0.01  # медленный подъём пола внутри длинного «голоса»
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+
+def frame_features(frame):
+    """Return (dBFS energy, zero-crossing rate) of an int16 PCM frame (bytes or ndarray)."""
+    samples = np.frombuffer(frame, dtype=np.int16) if not isinstance(frame, np.ndarray) else frame
+    if samples.size == 0:
+        return -120.0, 0.0
+    x = samples.astype(np.float32)
+    power = float(np.dot(x, x)) / samples.size
+    dbfs = 10.0 * math.log10(power / (32768.0 * 32768.0)) if power > 0 else -120.0
+    signs = np.signbit(samples)
+    zcr = float(np.count_nonzero(signs[1:] != signs[:-1])) / max(samples.size - 1, 1)
+    return dbfs, zcr
+
+
+class VoiceActivityGate:
+    """Energy + zero-crossing VAD with adaptive noise floor, hangover, pre-roll and keep-alive.
+
+    The floor follows unvoiced frames quickly; during a long voiced run it slowly rises towards
+    the minimum frame energy of the last noise_window_sec, so steady noise that passes the gate
+    (a fan, a hum) closes it again after a few seconds instead of keeping it open forever.
+
+    process() takes one captured frame and returns (frames_to_send, event), where event is
+    SPEECH_START, SPEECH_END or None. The hangover should stay long enough for Gemini's own
+    end-of-speech detection to see trailing silence.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        frame_size,
+        min_dbfs=VAD_MIN_DBFS,
+        margin_db=VAD_MARGIN_DB,
+        hangover_ms=VAD_HANGOVER_MS,
+        preroll_ms=VAD_PREROLL_MS,
+        keepalive_sec=VAD_KEEPALIVE_SEC,
+        noise_window_sec=VAD_NOISE_WINDOW_SEC,
+    ):
+        frame_ms = 1000.0 * frame_size / sample_rate
+        self.frame_ms = frame_ms
+        self.min_dbfs = min_dbfs
+        self.margin_db = margin_db
+        self.hangover_frames = max(1, int(math.ceil(hangover_ms / frame_ms)))
+        self.keepalive_sec = keepalive_sec
+        self.preroll = deque(maxlen=max(0, int(math.ceil(preroll_ms / frame_ms))))
+        self.noise_floor = min_dbfs - margin_db
+        self.noise_window = max(1, int(math.ceil(noise_window_sec * 1000.0 / frame_ms)))
+        self._minima = deque()  # (номер кадра, dBFS), энергии возрастают — голова = минимум окна
+        self._seen = 0
+        self.speaking = False
+        self._hangover = 0
+        self._last_sent = time.monotonic()
+
+        self.last_dbfs = -120.0
+        self.last_zcr = 0.0
+        self.frames_total = 0
+        self.frames_sent = 0
+        self.frames_suppressed = 0
+        self.keepalives = 0
+        self.segments = 0
+
+    def is_speech(self, frame):
+        dbfs, zcr = frame_features(frame)
+        self.last_dbfs, self.last_zcr = dbfs, zcr
+        threshold = max(self.min_dbfs, self.noise_floor + self.margin_db)
+        voiced = dbfs >= threshold and (zcr <= VAD_MAX_ZCR or dbfs >= threshold + self.margin_db)
+        window_min = self._window_min(dbfs)
+        if not voiced:
+            self.noise_floor += NOISE_FLOOR_ALPHA * (dbfs - self.noise_floor)
+        elif self._seen >= self.noise_window and window_min > self.noise_floor:
+            # Голос без единой паузы дольше окна — это шум: пол медленно тянется к минимуму
+            self.noise_floor += NOISE_FLOOR_RISE_ALPHA * (window_min - self.noise_floor)
+        return voiced
+
+    def _window_min(self, dbfs):
+        """Sliding minimum of frame energy over the last noise_window frames (monotonic deque)."""
+        self._seen += 1
+        n = self._seen
+        while self._minima and self._minima[-1][1] >= dbfs:
+            self._minima.pop()
+        self._minima.append((n, dbfs))
+        while self._minima[0][0] <= n - self.noise_window:
+            self._minima.popleft()
+        return self._minima[0][1]
+
+    def process(self, frame, speech=None):
+        """Gate one frame. speech overrides the built-in detector when given."""
+        self.frames_total += 1
+        voiced = self.is_speech(frame) if speech is None else speech
+        out = []
+        event = None
+        if voiced:
+            if not self.speaking:
+                self.speaking = True
+                self.segments += 1
+                event = SPEECH_START
+                self.frames_suppressed -= len(self.preroll)
+                out.extend(self.preroll)
+                self.preroll.clear()
+            self._hangover = self.hangover_frames
+            out.append(frame)
+        elif self.speaking:
+            self._hangover -= 1
+            out.append(frame)
+            if self._hangover <= 0:
+                self.speaking = False
+                event = SPEECH_END
+        else:
+            self.preroll.append(frame)
+            if self.keepalive_sec and time.monotonic() - self._last_sent >= self.keepalive_sec:
+                self.keepalives += 1
+                out.append(self.preroll.pop())
+            else:
+                self.frames_suppressed += 1
+        if out:
+            self.frames_sent += len(out)
+            self._last_sent = time.monotonic()
+        return out, event
+
+    def reset(self):
+        self.preroll.clear()
+        self.speaking = False
+        self._hangover = 0
+
+    def stats(self):
+        total = max(self.frames_total, 1)
+        return {
+            "speaking": self.speaking,
+            "frames_total": self.frames_total,
+            "frames_sent": self.frames_sent,
+            "frames_suppressed": self.frames_suppressed,
+            "sent_fraction": round(self.frames_sent / total, 3),
+            "suppressed_fraction": round(self.frames_suppressed / total, 3),
+            "keepalives": self.keepalives,
+            "segments": self.segments,
+            "noise_floor_dbfs": round(self.noise_floor, 1),
+            "last_dbfs": round(self.last_dbfs, 1),
+        }
@@ -0,0 +1,74 @@
+// Пакет анимаций с бэкенда (backend/animations.py): индекс загружается один раз, клип — одним
+// запросом; дорожки читаются прямо из ArrayBuffer (Int16Array без копирования) и деквантуются.
+import * as THREE from 'three';
+
+const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+
+let indexPromise = null;
+let catalogPromise = null;
+
+// Каталог клипов (/api/animations): категории, группы вариантов, длительность и кости
+export function loadCatalog() {
+  if (!catalogPromise) {
+    catalogPromise = fetch(`${API_BASE}/api/animations`)
+      .then((res) => (res.ok ? res.json() : null))
+      .catch(() => null)
+      .then((catalog) => {
+        if (!catalog) catalogPromise = null;
+        return catalog;
+      });
+  }
+  return catalogPromise;
+}
+
+function loadIndex() {
+  if (!indexPromise) {
+    indexPromise = fetch(`${API_BASE}/api/animations/bundle/index`)
+      .then((res) => (res.ok ? res.json() : null))
+      .catch(() => null)
+      .then((index) => {
+        // Бэкенд недоступен — в следующий раз спросим снова, а пока играем BVH
+        if (!index) indexPromise = null;
+        return index;
+      });
+  }
+  return indexPromise;
+}
+
+async function fetchClip(animName, retry = true) {
+  const index = await loadIndex();
+  const meta = index?.clips?.[animName];
+  if (!meta) return null;
+  const res = await fetch(`${API_BASE}/api/animations/clip/${encodeURIComponent(animName)}?v=${index.etag}`);
+  if (res.status === 412 && retry) {
+    // Пакет пересобран после загрузки индекса
+    indexPromise = null;
+    return fetchClip(animName, false);
+  }
+  if (!res.ok) return null;
+  return { index, meta, buffer: await res.arrayBuffer() };
+}
+
+// Клип с дорожками `${node.name}.quaternion`; resolveBone(vrmBoneName) -> узел или null.
+// null, если бэкенд или клип недоступны.
+export async function loadBundledClip(animName, resolveBone) {
+  const loaded = await fetchClip(animName).catch(() => null);
+  if (!loaded) return null;
+  const { index, meta, buffer } = loaded;
+  const scale = 1 / index.quant;
+  const tracks = [];
+  let offset = 0;
+  for (const [bone, keys] of meta.tracks) {
+    const raw = new Int16Array(buffer, offset, keys * 4);
+    offset += raw.byteLength;
+    const node = resolveBone(index.bones[bone]);
+    if (!node) continue;
+    const times = new Float32Array(keys);
+    const values = new Float32Array(keys * 4);
+    for (let i = 0; i < keys; i++) times[i] = i * meta.frame_time;
+    for (let i = 0; i < values.length; i++) values[i] = raw[i] * scale;
+    tracks.push(new THREE.QuaternionKeyframeTrack(`${node.name}.quaternion`, times, values));
+  }
+  if (tracks.length === 0) return null;
+  return new THREE.AnimationClip(animName, meta.duration, tracks);
+}
@@ -0,0 +1,67 @@
+// Декодеры сжатого аудио ответа (backend/codec.py): G.711 µ-law и IMA ADPCM -> Int16Array.
+// Какие кодеки просить у сервера — VITE_AUDIO_CODECS (через запятую, по предпочтению), по умолчанию pcm.
+
+const IMA_INDEX = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8];
+const IMA_STEPS = [
+  7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55, 60, 66, 73, 80, 88, 97,
+  107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796,
+  876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871,
+  5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623,
+  27086, 29794, 32767,
+];
+// Заголовок кадра ADPCM: предсказание (int16) и индекс шага (uint8) на начало кадра + байт выравнивания
+const ADPCM_HEADER_SIZE = 4;
+
+const ULAW_TABLE = new Int16Array(256);
+for (let i = 0; i < 256; i++) {
+  const u = ~i & 0xff;
+  const exponent = (u >> 4) & 0x07;
+  const x = ((((u & 0x0f) << 3) + 0x84) << exponent) - 0x84;
+  ULAW_TABLE[i] = u & 0x80 ? -x : x;
+}
+
+function decodeUlaw(bytes) {
+  const out = new Int16Array(bytes.length);
+  for (let i = 0; i < bytes.length; i++) out[i] = ULAW_TABLE[bytes[i]];
+  return out;
+}
+
+function decodeAdpcm(bytes) {
+  if (bytes.length < ADPCM_HEADER_SIZE) return new Int16Array(0);
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  let predicted = view.getInt16(0, true);
+  let index = bytes[2];
+  const body = bytes.subarray(ADPCM_HEADER_SIZE);
+  const out = new Int16Array(body.length * 2);
+  for (let i = 0; i < out.length; i++) {
+    // Первый отсчёт — в старшем полубайте
+    const code = i & 1 ? body[i >> 1] & 0x0f : body[i >> 1] >> 4;
+    const step = IMA_STEPS[index];
+    let delta = step >> 3;
+    if (code & 4) delta += step;
+    if (code & 2) delta += step >> 1;
+    if (code & 1) delta += step >> 2;
+    predicted = code & 8 ? Math.max(-32768, predicted - delta) : Math.min(32767, predicted + delta);
+    index = Math.max(0, Math.min(88, index + IMA_INDEX[code]));
+    out[i] = predicted;
+  }
+  return out;
+}
+
+const DECODERS = {
+  pcm: (bytes) => new Int16Array(bytes.buffer, bytes.byteOffset, bytes.byteLength >> 1),
+  ulaw: decodeUlaw,
+  adpcm: decodeAdpcm,
+};
+
+export const AUDIO_CODECS = (import.meta.env.VITE_AUDIO_CODECS || 'pcm')
+  .split(',')
+  .map((name) => name.trim().toLowerCase())
+  .filter((name) => name in DECODERS);
+
+// Payload бинарного кадра (после заголовка) -> отсчёты int16
+export function decodeAudio(codec, buffer, offset) {
+  const decode = DECODERS[codec || 'pcm'];
+  if (!decode) return null;
+  return decode(new Uint8Array(buffer, offset));
+}
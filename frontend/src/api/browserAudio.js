@@ -0,0 +1,98 @@
+// Звук через браузер (audio_input / audio_output = 'browser'): микрофон уходит на сервер
+// событиями audio_input (PCM 16 кГц int16), ответ играется здесь, а не на устройствах сервера.
+
+export const CAPTURE_SAMPLE_RATE = 16000;
+const CAPTURE_FRAME_SAMPLES = 1024;
+const PLAYBACK_LEAD_SEC = 0.05;
+
+// AudioWorklet пересылает блоки по 128 сэмплов в основной поток
+const WORKLET_SOURCE = `
+class KanaCapture extends AudioWorkletProcessor {
+  process(inputs) {
+    const channel = inputs[0] && inputs[0][0];
+    if (channel) this.port.postMessage(channel.slice(0));
+    return true;
+  }
+}
+registerProcessor('kana-capture', KanaCapture);
+`;
+
+export async function startCapture(onFrame) {
+  const stream = await navigator.mediaDevices.getUserMedia({
+    audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true, autoGainControl: true },
+  });
+  const ctx = new AudioContext({ sampleRate: CAPTURE_SAMPLE_RATE });
+  const url = URL.createObjectURL(new Blob([WORKLET_SOURCE], { type: 'application/javascript' }));
+  try {
+    await ctx.audioWorklet.addModule(url);
+  } finally {
+    URL.revokeObjectURL(url);
+  }
+  const source = ctx.createMediaStreamSource(stream);
+  const node = new AudioWorkletNode(ctx, 'kana-capture');
+  let frame = new Int16Array(CAPTURE_FRAME_SAMPLES);
+  let filled = 0;
+  node.port.onmessage = (e) => {
+    const block = e.data;
+    for (let i = 0; i < block.length; i++) {
+      const s = Math.max(-1, Math.min(1, block[i]));
+      frame[filled++] = s < 0 ? s * 0x8000 : s * 0x7fff;
+      if (filled === frame.length) {
+        onFrame(frame.buffer);
+        frame = new Int16Array(CAPTURE_FRAME_SAMPLES);
+        filled = 0;
+      }
+    }
+  };
+  source.connect(node);
+
+  return () => {
+    node.port.onmessage = null;
+    source.disconnect();
+    node.disconnect();
+    stream.getTracks().forEach((t) => t.stop());
+    ctx.close();
+  };
+}
+
+export function createPlayer(sampleRate) {
+  const ctx = new AudioContext({ sampleRate });
+  const sources = new Set();
+  let nextTime = 0;
+
+  return {
+    get sampleRate() {
+      return ctx.sampleRate;
+    },
+    play(samples) {
+      if (!samples.length) return;
+      const buffer = ctx.createBuffer(1, samples.length, sampleRate);
+      const channel = buffer.getChannelData(0);
+      for (let i = 0; i < samples.length; i++) channel[i] = samples[i] / 32768;
+      const node = ctx.createBufferSource();
+      node.buffer = buffer;
+      node.connect(ctx.destination);
+      nextTime = Math.max(nextTime, ctx.currentTime + PLAYBACK_LEAD_SEC);
+      node.start(nextTime);
+      nextTime += buffer.duration;
+      sources.add(node);
+      node.onended = () => sources.delete(node);
+    },
+    // Барж-ин: глушим всё, что уже запланировано
+    flush() {
+      sources.forEach((node) => {
+        try {
+          node.stop();
+        } catch {
+          // уже остановлен
+        }
+      });
+      sources.clear();
+      nextTime = 0;
+    },
+    close() {
+      this.flush();
+      ctx.close();
+    },
+  };
+}
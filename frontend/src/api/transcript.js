@@ -0,0 +1,17 @@
+// История разговора с бэкенда (backend/transcript.py): записи по курсору, только пропущенное
+const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+
+// Все записи после afterId (страницами) и незаконченные реплики текущего хода; null — истории нет
+export async function fetchTranscriptSince(key, afterId) {
+  const turns = [];
+  let cursor = afterId;
+  let page = null;
+  do {
+    const res = await fetch(`${API_BASE}/api/transcript?key=${encodeURIComponent(key)}&after=${cursor}&limit=200`);
+    if (!res.ok) return null;
+    page = await res.json();
+    turns.push(...page.turns);
+    cursor = page.next;
+  } while (cursor != null);
+  return { turns, partial: page.partial, lastId: page.last_id };
+}
@@ -5,6 +5,7 @@ const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 const STORAGE_KEY_INPUT = 'kana_audio_input_device';
 const STORAGE_KEY_OUTPUT = 'kana_audio_output_device';
 const STORAGE_KEY_NOISE = 'kana_noise_suppression';
+const STORAGE_KEY_BROWSER_AUDIO = 'kana_browser_audio';
 
 function loadStoredDevice(key) {
   try {
@@ -26,6 +27,9 @@ export default function AudioSettingsDropdown({ onClose }) {
   const [noiseSuppression, setNoiseSuppression] = useState(
     () => localStorage.getItem(STORAGE_KEY_NOISE) !== 'false'
   );
+  const [browserAudio, setBrowserAudio] = useState(
+    () => localStorage.getItem(STORAGE_KEY_BROWSER_AUDIO) === 'true'
+  );
   const [loading, setLoading] = useState(true);
   const [fetchError, setFetchError] = useState(null);
   const dropdownRef = useRef(null);
@@ -141,6 +145,21 @@ export default function AudioSettingsDropdown({ onClose }) {
     setNoiseSuppression(value);
     localStorage.setItem(STORAGE_KEY_NOISE, String(value));
     setAudioSettings((prev) => ({ ...prev, noiseSuppression: value }));
+    if (isListening) {
+      stopAudio();
+      setTimeout(() => startAudio({ noiseSuppression: value }), 1000);
+    }
+  };
+
+  const handleBrowserAudioChange = (e) => {
+    const value = e.target.checked;
+    setBrowserAudio(value);
+    localStorage.setItem(STORAGE_KEY_BROWSER_AUDIO, String(value));
+    setAudioSettings((prev) => ({ ...prev, browserAudio: value }));
+    if (isListening) {
+      stopAudio();
+      setTimeout(() => startAudio({ browserAudio: value }), 1000);
+    }
   };
 
   return (
@@ -200,6 +219,18 @@ export default function AudioSettingsDropdown({ onClose }) {
               Шумоподавление
             </label>
           </div>
+          <div className="flex items-center gap-2 mt-2">
+            <input
+              type="checkbox"
+              id="browser-audio"
+              checked={browserAudio}
+              onChange={handleBrowserAudioChange}
+              className="w-4 h-4 rounded bg-zinc-700 border-zinc-600 text-emerald-500 focus:ring-emerald-500 focus:ring-offset-0"
+            />
+            <label htmlFor="browser-audio" className="text-xs text-zinc-300">
+              Звук через браузер (без устройств сервера)
+            </label>
+          </div>
           <p className="text-xs text-zinc-500 mt-2">Перезапустите KANA для применения устройств.</p>
         </>
       )}
@@ -2,6 +2,7 @@ import React, { useRef, useState, useEffect, Suspense, useCallback } from 'react
 import { Canvas, useFrame, useThree } from '@react-three/fiber';
 import { OrbitControls } from '@react-three/drei';
 import { useAssistant } from '../context/AssistantContext';
+import { loadBundledClip, loadCatalog } from '../api/animationBundle';
 import { GLTFLoader } from 'three/addons/loaders/GLTFLoader.js';
 import { BVHLoader } from 'three/addons/loaders/BVHLoader.js';
 import { VRMLoaderPlugin } from '@pixiv/three-vrm';
@@ -21,7 +22,7 @@ const IDLE_ANIMATIONS = [
   'nervousnes3', 'reaction_headshot'
 ];
 
-// Dance animations
+// Dance animations (replaced by the backend catalog's "dance" category when available)
 const DANCE_ANIMATIONS = [
   'dance_1', 'dance_2', 'dance_backup', 'dance_dab',
   'dance_gangnam_style', 'dance_headdrop', 'dance_marachinostep',
@@ -54,6 +55,16 @@ const BVH_TO_VRM_BONE_MAP = {
   rightToes: 'rightToes',
 };
 
+// Clips played on known triggers; fetched ahead so the first play does not wait for the network
+const PREFETCH_ANIMATIONS = ['action_greeting', 'pride'];
+
+// Order of the weights in the backend's lipsync frames (backend/lipsync.py)
+const VISEMES = ['aa', 'ih', 'ou', 'ee', 'oh'];
+
+function pickRandom(list) {
+  return list[Math.floor(Math.random() * list.length)];
+}
+
 function getStoredUrl() {
   try {
     const u = localStorage.getItem(STORAGE_KEY);
@@ -92,22 +103,27 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
   const loadStartRef = useRef(0);
   const animationCacheRef = useRef({});
   const idleTimerRef = useRef(null);
+  const idleListRef = useRef(IDLE_ANIMATIONS);
+  const danceListRef = useRef(DANCE_ANIMATIONS);
+  const catalogRef = useRef(null);
   const prevIsListeningRef = useRef(false);
   const {
-    audioLevel,
+    lipSyncRef,
     isListening,
     isAssistantSpeaking,
     sentenceEnded,
     clearSentenceEnded,
     danceRequested,
-    clearDanceRequested
+    clearDanceRequested,
+    animationCue,
+    clearAnimationCue
   } = useAssistant();
   const { scene } = useThree();
-  const mouthWeightRef = useRef(0);
+  const visemeWeightsRef = useRef(VISEMES.map(() => 0));
   const blinkAccumRef = useRef(0);
   const blinkWeightRef = useRef(0);
 
-  // Load BVH animation
+  // Load animation: precompiled bundle from the backend, BVH parsing as a fallback
   const loadBvhAnimation = useCallback(async (animName) => {
     if (animationCacheRef.current[animName]) {
       return animationCacheRef.current[animName];
@@ -116,6 +132,12 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
     const vrm = vrmRef.current;
     if (!vrm) return null;
 
+    const bundled = await loadBundledClip(animName, (bone) => vrm.humanoid?.getNormalizedBoneNode(bone));
+    if (bundled) {
+      animationCacheRef.current[animName] = bundled;
+      return bundled;
+    }
+
     try {
       const bvhLoader = new BVHLoader();
       const url = `${ANIMATION_BASE_URL}${animName}.bvh`;
@@ -126,15 +148,14 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
       // Create animation clip from BVH
       const clip = bvh.clip;
       
-      // Retarget tracks to VRM bones; skip root position to keep avatar in frame
+      // Retarget rotation tracks to VRM bones; position tracks are skipped for every joint
+      // (root: keeps the avatar in frame; others: BVH offsets don't fit VRM bones), same as the bundle
       const retargetedTracks = [];
-      const rootBones = ['hips', 'Hips'];
       for (const track of clip.tracks) {
         const parts = track.name.split('.');
         const bvhBoneName = parts[0];
         const property = parts.slice(1).join('.');
-        const isRoot = rootBones.includes(bvhBoneName);
-        if (isRoot && (property === 'position' || property.startsWith('position'))) continue;
+        if (property.startsWith('position')) continue;
 
         const vrmBoneName = BVH_TO_VRM_BONE_MAP[bvhBoneName] ?? bvhBoneName;
         const vrmBone = vrm.humanoid?.getNormalizedBoneNode(vrmBoneName);
@@ -201,7 +222,7 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
     const scheduleNext = () => {
       const delay = 10000 + Math.random() * 10000; // 10-20 seconds
       idleTimerRef.current = setTimeout(() => {
-        const randomAnim = IDLE_ANIMATIONS[Math.floor(Math.random() * IDLE_ANIMATIONS.length)];
+        const randomAnim = pickRandom(idleListRef.current);
         playAnimation(randomAnim, { loop: false });
         scheduleNext();
       }, delay);
@@ -259,6 +280,7 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
           
           // Start with neutral pose (ignore errors - BVH may fail)
           Promise.resolve().then(() => playAnimation('neutral3', { loop: true, fadeIn: 0 })).catch(() => {});
+          PREFETCH_ANIMATIONS.forEach((name) => loadBvhAnimation(name).catch(() => {}));
         },
         (progress) => {
           const total = progress.total || 1;
@@ -279,7 +301,7 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
         loader.manager.onError = () => {};
       };
     },
-    [scene, onLoadError, onLoaded, onLoadProgress, playAnimation]
+    [scene, onLoadError, onLoaded, onLoadProgress, playAnimation, loadBvhAnimation]
   );
 
   useEffect(() => {
@@ -304,6 +326,22 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
     };
   }, [vrmUrl, scene, loadVrm, stopIdleTimer]);
 
+  // Clip lists from the backend catalog: new dances need no code change, missing idle clips are skipped
+  useEffect(() => {
+    let cancelled = false;
+    loadCatalog().then((catalog) => {
+      if (cancelled || !catalog) return;
+      catalogRef.current = catalog;
+      const known = new Set(catalog.clips.map((c) => c.name));
+      const idle = IDLE_ANIMATIONS.filter((name) => known.has(name));
+      if (idle.length) idleListRef.current = idle;
+      if (catalog.categories?.dance?.length) danceListRef.current = catalog.categories.dance;
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, []);
+
   // Handle isListening change - play greeting animation
   useEffect(() => {
     if (isListening && !prevIsListeningRef.current) {
@@ -329,12 +367,21 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
   // Handle dance request
   useEffect(() => {
     if (danceRequested) {
-      const randomDance = DANCE_ANIMATIONS[Math.floor(Math.random() * DANCE_ANIMATIONS.length)];
+      const randomDance = pickRandom(danceListRef.current);
       playAnimation(randomDance, { loop: false, fadeIn: 0.5 });
       clearDanceRequested();
     }
   }, [danceRequested, clearDanceRequested, playAnimation]);
 
+  // Handle emotion cue from the backend: a random variant of the matching clip group
+  useEffect(() => {
+    if (animationCue) {
+      const variants = catalogRef.current?.groups?.[animationCue.cue];
+      if (variants?.length) playAnimation(pickRandom(variants), { loop: false });
+      clearAnimationCue();
+    }
+  }, [animationCue, clearAnimationCue, playAnimation]);
+
   useFrame((state, delta) => {
     const vrm = vrmRef.current;
     const mixer = mixerRef.current;
@@ -350,10 +397,15 @@ function AvatarScene({ vrmUrl, onLoadError, onLoaded, onLoadProgress, animationT
 
     const em = vrm.expressionManager;
     if (em) {
-      const mouthTarget = Math.min(1, audioLevel * 2.5);
-      mouthWeightRef.current += (mouthTarget - mouthWeightRef.current) * 0.3;
-      const hasAa = em.getExpression('aa') != null;
-      if (hasAa) em.setValue('aa', mouthWeightRef.current);
+      const { level, visemes } = lipSyncRef.current;
+      const weights = visemeWeightsRef.current;
+      VISEMES.forEach((name, i) => {
+        // Without viseme weights, fall back to opening the mouth with 'aa' from the level alone
+        const raw = visemes ? visemes[i] : i === 0 ? level : 0;
+        const target = Math.min(1, raw * 2.5);
+        weights[i] += (target - weights[i]) * 0.3;
+        if (em.getExpression(name) != null) em.setValue(name, weights[i]);
+      });
 
       blinkAccumRef.current += delta;
       if (blinkAccumRef.current > 3.5) {
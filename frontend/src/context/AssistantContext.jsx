@@ -1,13 +1,36 @@
 import React, { createContext, useContext, useEffect, useState, useCallback, useRef } from 'react';
 import { socket } from '../api/socket';
+import { startCapture, createPlayer } from '../api/browserAudio';
+import { fetchTranscriptSince } from '../api/transcript';
+import { AUDIO_CODECS, decodeAudio } from '../api/audioCodecs';
 
 const AssistantContext = createContext(null);
 
-const DANCE_KEYWORDS = ['танцуй', 'танец', 'потанцуй', 'станцуй', 'dance', 'танцевать', 'пляши'];
+// Подсказки анимаций приходят с сервера (backend/cues.py); ниже этой уверенности — игнорируем
+const CUE_MIN_CONFIDENCE = 0.6;
+// Дельты транскрипции копятся и попадают в messages одним обновлением раз в столько мс
+const TRANSCRIPT_FLUSH_MS = 50;
 
 const STORAGE_KEY_INPUT = 'kana_audio_input_device';
 const STORAGE_KEY_OUTPUT = 'kana_audio_output_device';
 const STORAGE_KEY_NOISE = 'kana_noise_suppression';
+const STORAGE_KEY_BROWSER_AUDIO = 'kana_browser_audio';
+const AUDIO_FRAME_HEADER_SIZE = 16;
+
+// Один новый массив на пачку дельт, а не на каждый токен
+function appendDeltas(prev, deltas) {
+  const next = prev.slice();
+  for (const { sender, text } of deltas) {
+    const lastMessage = next[next.length - 1];
+    // Если последнее сообщение от того же отправителя, дописываем его
+    if (lastMessage && lastMessage.sender === sender) {
+      next[next.length - 1] = { sender, text: lastMessage.text + text };
+    } else {
+      next.push({ sender, text });
+    }
+  }
+  return next;
+}
 
 function getStoredAudioSettings() {
   try {
@@ -19,9 +42,10 @@ function getStoredAudioSettings() {
       inputDevice: input && typeof input === 'object' ? { index: input.index, name: input.name } : { index: null, name: '' },
       outputDevice: output && typeof output === 'object' ? { index: output.index, name: output.name } : { index: null, name: '' },
       noiseSuppression: localStorage.getItem(STORAGE_KEY_NOISE) !== 'false',
+      browserAudio: localStorage.getItem(STORAGE_KEY_BROWSER_AUDIO) === 'true',
     };
   } catch {
-    return { inputDevice: { index: null, name: '' }, outputDevice: { index: null, name: '' }, noiseSuppression: true };
+    return { inputDevice: { index: null, name: '' }, outputDevice: { index: null, name: '' }, noiseSuppression: true, browserAudio: false };
   }
 }
 
@@ -32,78 +56,169 @@ export function AssistantProvider({ children }) {
   const [isListening, setIsListening] = useState(false);
   const [isMuted, setIsMuted] = useState(true);
   const [error, setError] = useState(null);
-  const [audioLevel, setAudioLevel] = useState(0);
   const [isAssistantSpeaking, setIsAssistantSpeaking] = useState(false);
   const [audioSettings, setAudioSettings] = useState(getStoredAudioSettings);
   const [sentenceEnded, setSentenceEnded] = useState(false);
   const [danceRequested, setDanceRequested] = useState(false);
+  const [animationCue, setAnimationCue] = useState(null);
   const updateTimeoutRef = useRef(null);
+  const pendingDeltasRef = useRef([]);
+  // Ключ сессии, номер последней записи истории и сколько сообщений чата ей соответствует:
+  // после переподключения хвост чата заменяется пропущенным с сервера
+  const transcriptRef = useRef({ session: null, lastId: 0, settled: 0 });
   const audioLevelRef = useRef(0);
+  // Кадры lipsync с сервера: аватар читает их в useFrame, без перерисовки React на каждый кадр
+  const lipSyncRef = useRef({ level: 0, visemes: null });
   const wasAssistantSpeakingRef = useRef(false);
+  const audioFormatRef = useRef(null);
+  const browserAudioRef = useRef(false);
+  const stopCaptureRef = useRef(null);
+  const playerRef = useRef(null);
+  const isMutedRef = useRef(true);
   const SPEAKING_THRESHOLD = 0.02;
   const SMOOTHING = 0.35;
 
   useEffect(() => {
-    socket.on('connect', () => setConnectionStatus('connected'));
+    isMutedRef.current = isMuted;
+  }, [isMuted]);
+
+  const stopBrowserAudio = useCallback(() => {
+    if (stopCaptureRef.current) {
+      stopCaptureRef.current();
+      stopCaptureRef.current = null;
+    }
+    if (playerRef.current) {
+      playerRef.current.close();
+      playerRef.current = null;
+    }
+  }, []);
+
+  const startBrowserAudio = useCallback(async () => {
+    if (stopCaptureRef.current) return;
+    const pending = () => {};
+    stopCaptureRef.current = pending;
+    try {
+      const stop = await startCapture((frame) => {
+        if (!isMutedRef.current) socket.emit('audio_input', frame);
+      });
+      // Пока спрашивали доступ к микрофону, сессию могли остановить
+      if (stopCaptureRef.current !== pending || !browserAudioRef.current) {
+        stop();
+        return;
+      }
+      stopCaptureRef.current = stop;
+    } catch (e) {
+      if (stopCaptureRef.current === pending) stopCaptureRef.current = null;
+      setError(`Микрофон браузера недоступен: ${e.message || e}`);
+    }
+  }, []);
+
+  useEffect(() => {
+    socket.on('connect', () => {
+      setConnectionStatus('connected');
+      const { session, lastId } = transcriptRef.current;
+      if (!session) return;
+      fetchTranscriptSince(session, lastId)
+        .then((missed) => {
+          if (!missed) return;
+          const turns = missed.turns.map(({ sender, text }) => ({ sender, text }));
+          const partial = missed.partial.map(({ sender, text }) => ({ sender, text }));
+          setMessages((prev) => {
+            // Недописанные до обрыва реплики — в записях целиком
+            const next = [...prev.slice(0, transcriptRef.current.settled), ...turns];
+            transcriptRef.current = { session, lastId: missed.lastId, settled: next.length };
+            return [...next, ...partial];
+          });
+        })
+        .catch(() => {});
+    });
     socket.on('disconnect', () => setConnectionStatus('disconnected'));
     socket.on('status', (data) => {
       setStatusMessage(data?.msg || '');
-      if (data?.msg === 'KANA Started') setIsListening(true);
-      if (data?.msg === 'KANA Stopped') setIsListening(false);
+      if (data?.msg === 'KANA Started') {
+        setIsListening(true);
+        if (browserAudioRef.current) startBrowserAudio();
+      }
+      if (data?.msg === 'KANA Stopped') {
+        setIsListening(false);
+        stopBrowserAudio();
+      }
     });
+    const flushTranscription = () => {
+      updateTimeoutRef.current = null;
+      const deltas = pendingDeltasRef.current;
+      pendingDeltasRef.current = [];
+      if (deltas.length) setMessages((prev) => appendDeltas(prev, deltas));
+    };
     socket.on('transcription', (data) => {
       if (!data?.sender || !data?.text) return;
-      
-      // Очищаем предыдущий таймер
+      pendingDeltasRef.current.push({ sender: data.sender, text: data.text });
+      if (!updateTimeoutRef.current) {
+        updateTimeoutRef.current = setTimeout(flushTranscription, TRANSCRIPT_FLUSH_MS);
+      }
+    });
+    socket.on('transcript_session', (info) => {
+      if (!info?.session) return;
+      setMessages((prev) => {
+        transcriptRef.current = { session: info.session, lastId: info.last_id ?? 0, settled: prev.length };
+        return prev;
+      });
+    });
+    socket.on('transcript_turn', (record) => {
+      if (!record?.id) return;
+      // Пачки реплики пришли раньше записи: применяем их и запоминаем границу
       if (updateTimeoutRef.current) {
         clearTimeout(updateTimeoutRef.current);
+        flushTranscription();
       }
-      
-      // Detect dance keywords in user messages
-      if (data.sender === 'User') {
-        const lower = data.text.toLowerCase();
-        if (DANCE_KEYWORDS.some((k) => lower.includes(k))) {
-          setDanceRequested(true);
-        }
-      }
-      
+      transcriptRef.current.lastId = record.id;
       setMessages((prev) => {
-        const lastMessage = prev[prev.length - 1];
-        
-        // Если последнее сообщение от того же отправителя, обновляем его
-        if (lastMessage && lastMessage.sender === data.sender) {
-          return [...prev.slice(0, -1), { 
-            sender: data.sender, 
-            text: lastMessage.text + data.text 
-          }];
-        }
-        
-        // Иначе добавляем новое сообщение
-        return [...prev, { sender: data.sender, text: data.text }];
+        transcriptRef.current.settled = prev.length;
+        return prev;
       });
-      
-      // Устанавливаем таймер для финализации сообщения (если нет новых обновлений 500мс)
-      updateTimeoutRef.current = setTimeout(() => {
-        // Можно добавить логику для финализации, если нужно
-        updateTimeoutRef.current = null;
-      }, 1000);
     });
-    socket.on('audio_data', (payload) => {
-      const raw = payload?.data;
-      if (!raw || !Array.isArray(raw) || raw.length < 2) return;
-      const bytes = new Uint8Array(raw);
-      const samples = new Int16Array(bytes.buffer);
-      let sum = 0;
-      for (let i = 0; i < samples.length; i++) {
-        const n = samples[i] / 32768;
-        sum += n * n;
+    socket.on('animation_cue', (cue) => {
+      if (!cue?.cue || cue.confidence < CUE_MIN_CONFIDENCE) return;
+      // Просьба потанцевать — от пользователя; остальные подсказки — эмоции самой KANA
+      if (cue.cue === 'dance') {
+        if (cue.sender === 'User') setDanceRequested(true);
+      } else if (cue.sender === 'KANA') {
+        setAnimationCue(cue);
+      }
+    });
+    socket.on('audio_format', (format) => {
+      audioFormatRef.current = format || null;
+    });
+    socket.on('audio_data', (payload, ack) => {
+      // Подтверждение доставки: по нему сервер придерживает аудио для медленного канала
+      if (typeof ack === 'function') ack();
+      let samples;
+      if (payload instanceof ArrayBuffer) {
+        // Бинарный кадр: заголовок (seq, sample_rate, timestamp) + PCM int16 или сжатый кадр (codec)
+        const headerSize = audioFormatRef.current?.header_size ?? AUDIO_FRAME_HEADER_SIZE;
+        if (payload.byteLength < headerSize + 2) return;
+        samples = decodeAudio(audioFormatRef.current?.codec, payload, headerSize);
+        if (!samples) return;
+      } else {
+        const raw = payload?.data;
+        if (!raw || !Array.isArray(raw) || raw.length < 2) return;
+        const bytes = new Uint8Array(raw);
+        samples = new Int16Array(bytes.buffer);
+      }
+      if (browserAudioRef.current) {
+        const rate = audioFormatRef.current?.sample_rate ?? 24000;
+        if (!playerRef.current) playerRef.current = createPlayer(rate);
+        playerRef.current.play(samples);
       }
-      const rms = Math.sqrt(sum / samples.length);
-      const normalized = Math.min(1, rms * 4);
-      const smoothed = audioLevelRef.current * (1 - SMOOTHING) + normalized * SMOOTHING;
+    });
+    socket.on('lipsync', (frame) => {
+      // Огибающая и веса визем уже посчитаны сервером и идут в такт воспроизведению
+      const level = frame?.level ?? 0;
+      lipSyncRef.current = { level, visemes: frame?.visemes ?? null };
+      // Нулевой кадр сервер шлёт, когда речь закончилась, — сразу считаем, что KANA замолчала
+      const smoothed = level === 0 ? 0 : audioLevelRef.current * (1 - SMOOTHING) + level * SMOOTHING;
       audioLevelRef.current = smoothed;
-      setAudioLevel(smoothed);
-      
+
       const isSpeakingNow = smoothed > SPEAKING_THRESHOLD;
       setIsAssistantSpeaking(isSpeakingNow);
       
@@ -113,6 +228,14 @@ export function AssistantProvider({ children }) {
       }
       wasAssistantSpeakingRef.current = isSpeakingNow;
     });
+    socket.on('interrupted', () => {
+      // Ответ прерван: сервер уже сбросил очередь аудио, гасим lip-sync сразу
+      if (playerRef.current) playerRef.current.flush();
+      audioLevelRef.current = 0;
+      lipSyncRef.current = { level: 0, visemes: null };
+      wasAssistantSpeakingRef.current = false;
+      setIsAssistantSpeaking(false);
+    });
     socket.on('error', (data) => setError(data?.msg || 'Error'));
 
     return () => {
@@ -123,16 +246,38 @@ export function AssistantProvider({ children }) {
       socket.off('disconnect');
       socket.off('status');
       socket.off('transcription');
+      socket.off('transcript_session');
+      socket.off('transcript_turn');
+      socket.off('animation_cue');
+      socket.off('audio_format');
       socket.off('audio_data');
+      socket.off('lipsync');
+      socket.off('interrupted');
       socket.off('error');
+      stopBrowserAudio();
     };
-  }, []);
+  }, [startBrowserAudio, stopBrowserAudio]);
 
   const startAudio = useCallback((deviceOverrides) => {
     setError(null);
     const input = deviceOverrides?.inputDevice ?? audioSettings.inputDevice;
     const output = deviceOverrides?.outputDevice ?? audioSettings.outputDevice;
-    const payload = { muted: isMuted };
+    const browserAudio = deviceOverrides?.browserAudio ?? audioSettings.browserAudio;
+    const payload = {
+      muted: isMuted,
+      // PCM нужен, только если звук играет браузер; аватару хватает событий lipsync
+      audio_transport: browserAudio ? 'binary' : 'none',
+      audio_codecs: AUDIO_CODECS,
+      audio_ack: true,
+      noise_suppression: deviceOverrides?.noiseSuppression ?? audioSettings.noiseSuppression,
+    };
+    browserAudioRef.current = browserAudio;
+    if (browserAudio) {
+      payload.audio_input = 'browser';
+      payload.audio_output = 'browser';
+    } else {
+      stopBrowserAudio();
+    }
     if (input?.index != null) {
       payload.device_index = input.index;
     } else if (input?.name) {
@@ -144,7 +289,7 @@ export function AssistantProvider({ children }) {
       payload.output_device_name = output.name;
     }
     socket.emit('start_audio', payload);
-  }, [isMuted, audioSettings]);
+  }, [isMuted, audioSettings, stopBrowserAudio]);
 
   const stopAudio = useCallback(() => {
     socket.emit('stop_audio');
@@ -159,6 +304,14 @@ export function AssistantProvider({ children }) {
 
   const sendText = useCallback((text) => {
     if (!text?.trim()) return;
+    if (updateTimeoutRef.current) {
+      // Сначала досылаем накопленные дельты, чтобы порядок сообщений сохранился
+      clearTimeout(updateTimeoutRef.current);
+      updateTimeoutRef.current = null;
+      const deltas = pendingDeltasRef.current;
+      pendingDeltasRef.current = [];
+      setMessages((prev) => appendDeltas(prev, deltas));
+    }
     setMessages((prev) => [...prev, { sender: 'User', text: text.trim() }]);
     socket.emit('user_input', { text: text.trim() });
   }, []);
@@ -166,6 +319,7 @@ export function AssistantProvider({ children }) {
   const clearError = useCallback(() => setError(null), []);
   const clearSentenceEnded = useCallback(() => setSentenceEnded(false), []);
   const clearDanceRequested = useCallback(() => setDanceRequested(false), []);
+  const clearAnimationCue = useCallback(() => setAnimationCue(null), []);
 
   const value = {
     connectionStatus,
@@ -174,7 +328,7 @@ export function AssistantProvider({ children }) {
     isListening,
     isMuted,
     error,
-    audioLevel,
+    lipSyncRef,
     isAssistantSpeaking,
     audioSettings,
     setAudioSettings,
@@ -182,6 +336,8 @@ export function AssistantProvider({ children }) {
     clearSentenceEnded,
     danceRequested,
     clearDanceRequested,
+    animationCue,
+    clearAnimationCue,
     startAudio,
     stopAudio,
     toggleMute,